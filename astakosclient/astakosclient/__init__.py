@@ -44,7 +44,8 @@ from copy import copy
 
 import simplejson
 from astakosclient.utils import \
-    retry_dec, scheme_to_class, parse_request, check_input, join_urls
+    retry_dec, scheme_to_class, parse_request, check_input, join_urls, \
+    columns_to_quotas
 from astakosclient.errors import \
     AstakosClientException, Unauthorized, BadRequest, NotFound, Forbidden, \
     NoUserName, NoUUID, BadValue, QuotaLimit, InvalidResponse, NoEndpoints
@@ -542,22 +543,74 @@ class AstakosClient(object):
 
     # ----------------------------------
     # do a GET to ``API_SERVICE_QUOTAS``
-    def service_get_quotas(self, user=None):
+    def service_get_quotas(self, user=None, resources=None):
         """Get all quotas for resources associated with the service
 
         Keyword arguments:
-        user    -- optionally, the uuid of a specific user
+        user        -- optionally, the uuid of a specific user
+        resources   -- optionally, a list of resources to get quotas for
 
         In case of success return a dict of dicts of dicts with current quotas
         for all users, or of a specified user, if user argument is set.
         Otherwise raise an AstakosClientException
 
         """
-        query = self.api_service_quotas
+        params = []
         if user is not None:
-            query += "?user=" + user
+            params.append(("user", user))
+        for resource in resources or []:
+            params.append(("resource", resource))
+        query = self.api_service_quotas
+        if params:
+            query += "?" + urllib.urlencode(params)
         return self._call_astakos(query)
 
+    def service_get_quotas_page(self, marker=None, limit=None,
+                                resources=None):
+        """Get the quotas of a page of users, ordered by user
+
+        Keyword arguments:
+        marker      -- the uuid of the last user of the previous page
+        limit       -- the maximum number of users in the page
+        resources   -- optionally, a list of resources to get quotas for
+
+        In case of success return a tuple with a dict of dicts of dicts with
+        the current quotas of the users of the page, and the marker of the
+        next page, which is None for the last page. Quotas are transferred
+        in the compact columnar encoding.
+        Otherwise raise an AstakosClientException
+
+        """
+        params = [("encoding", "columnar")]
+        if marker is not None:
+            params.append(("marker", marker))
+        if limit is not None:
+            params.append(("limit", limit))
+        for resource in resources or []:
+            params.append(("resource", resource))
+        query = self.api_service_quotas + "?" + urllib.urlencode(params)
+        result = self._call_astakos(query)
+        return columns_to_quotas(result["quotas"]), result["next_marker"]
+
+    def service_iter_quotas(self, limit=None, resources=None):
+        """Iterate over the quotas of all users, ordered by user
+
+        Keyword arguments:
+        limit       -- the maximum number of users to fetch per request
+        resources   -- optionally, a list of resources to get quotas for
+
+        Yield (user, quotas) pairs, fetching the quotas one page at a time.
+
+        """
+        marker = None
+        while True:
+            quotas, marker = self.service_get_quotas_page(
+                marker=marker, limit=limit, resources=resources)
+            for user in sorted(quotas):
+                yield user, quotas[user]
+            if marker is None:
+                return
+
     # ----------------------------------
     # do a GET to ``API_SERVICE_PROJECT_QUOTAS``
     def service_get_project_quotas(self, project=None):
@@ -120,3 +120,20 @@ def check_input(function_name, logger, **kwargs):
 def join_urls(url_a, url_b):
     """Join_urls from synnefo.lib"""
     return url_a.rstrip("/") + "/" + url_b.lstrip("/")
+
+
+QUOTA_VALUES = ["limit", "usage", "pending",
+                "project_limit", "project_usage", "project_pending"]
+
+
+def columns_to_quotas(columns):
+    """Decode quotas from the columnar encoding of service_quotas"""
+    quotas = {}
+    rows = zip(columns["holder"], columns["source"], columns["resource"],
+               *[columns[value] for value in QUOTA_VALUES])
+    for row in rows:
+        holder, source, resource = row[:3]
+        user_quotas = quotas.setdefault(holder, {})
+        source_quotas = user_quotas.setdefault(source, {})
+        source_quotas[resource] = dict(zip(QUOTA_VALUES, row[3:]))
+    return quotas
@@ -33,10 +33,12 @@
 # interpreted as representing official policies, either expressed
 # or implied, of GRNET S.A.
 
+from collections import OrderedDict
 from cStringIO import StringIO
 from errno import (EACCES, EBADF, EINVAL, EISDIR, EIO, ENOENT, ENOTDIR,
                    ENOTEMPTY)
 from getpass import getuser
+from json import loads
 from stat import S_IFDIR, S_IFREG
 from sys import argv
 from time import time
@@ -51,11 +53,23 @@ from pithos.tools.lib.util import get_user, get_auth, get_url
 
 epoch = int(time())
 
+# Seconds for which attributes, hashmaps and directory listings are trusted.
+CACHE_TTL = 2
+# Maximum number of data blocks kept in memory.
+BLOCK_CACHE_SIZE = 32
+
 
 class StoreFS(Operations):
-    def __init__(self, verbose=False):
+    def __init__(self, verbose=False, cache_ttl=CACHE_TTL,
+                 block_cache_size=BLOCK_CACHE_SIZE):
         self.verbose = verbose
         self.client = OOS_Client(get_url(), get_auth(), get_user())
+        self.cache_ttl = cache_ttl
+        self.block_cache_size = block_cache_size
+        self.meta_cache = {}
+        self.list_cache = {}
+        self.hashmap_cache = {}
+        self.block_cache = OrderedDict()
 
     def __call__(self, op, path, *args):
         container, sep, object = path[1:].partition('/')
@@ -89,18 +103,100 @@ class StoreFS(Operations):
             if self.verbose:
                 print '<-', op, repr(ret)
 
+    def _cache_get(self, cache, key):
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time():
+            del cache[key]
+            return None
+        return value
+
+    def _cache_put(self, cache, key, value):
+        if self.cache_ttl > 0:
+            cache[key] = (time() + self.cache_ttl, value)
+        return value
+
+    def _invalidate(self, container, object=''):
+        """Drop cached state that a change to the given path may affect."""
+
+        for key in self.meta_cache.keys():
+            if key[0] == container and key[1] in ('', object):
+                del self.meta_cache[key]
+        self.hashmap_cache.pop((container, object), None)
+        # Listings are cheap to refetch; do not try to be clever about
+        # which ones contain the path.
+        self.list_cache.clear()
+
     def _get_container_meta(self, container, **kwargs):
+        key = (container, '', tuple(sorted(kwargs.items())))
+        meta = self._cache_get(self.meta_cache, key)
+        if meta is not None:
+            return meta
         try:
-            return self.client.retrieve_container_metadata(container, **kwargs)
+            meta = self.client.retrieve_container_metadata(container, **kwargs)
         except Fault:
             raise FuseOSError(ENOENT)
+        return self._cache_put(self.meta_cache, key, meta)
 
     def _get_object_meta(self, container, object, **kwargs):
+        key = (container, object, tuple(sorted(kwargs.items())))
+        meta = self._cache_get(self.meta_cache, key)
+        if meta is not None:
+            return meta
         try:
-            return self.client.retrieve_object_metadata(container, object,
+            meta = self.client.retrieve_object_metadata(container, object,
                                                         **kwargs)
         except Fault:
             raise FuseOSError(ENOENT)
+        return self._cache_put(self.meta_cache, key, meta)
+
+    def _list_objects(self, container, prefix):
+        key = (container, prefix)
+        objects = self._cache_get(self.list_cache, key)
+        if objects is not None:
+            return objects
+        objects = self.client.list_objects(container, delimiter='/',
+                                           prefix=prefix) or []
+        return self._cache_put(self.list_cache, key, objects)
+
+    def _get_object_hashmap(self, container, object):
+        key = (container, object)
+        hashmap = self._cache_get(self.hashmap_cache, key)
+        if hashmap is not None:
+            return hashmap
+        try:
+            status, headers, data = self.client.request_object(
+                container, object, format='json', params={'hashmap': None})
+        except Fault:
+            raise FuseOSError(ENOENT)
+        hashmap = loads(data)
+        # Block reads are pinned to the version this hashmap describes.
+        hashmap['etag'] = headers.get('etag')
+        return self._cache_put(self.hashmap_cache, key, hashmap)
+
+    def _get_block(self, container, object, hashmap, index):
+        """Return the index'th block of an object, fetching it with a
+           ranged GET unless an identical block is cached.
+        """
+
+        bs = hashmap['block_size']
+        start = index * bs
+        end = min(start + bs, hashmap['bytes']) - 1
+        # Block hashes ignore trailing zeros, so blocks that differ only in
+        # their length share a hash.
+        key = (hashmap['hashes'][index], end - start + 1)
+        block = self.block_cache.pop(key, None)
+        if block is None:
+            headers = {'range': 'bytes=%d-%d' % (start, end)}
+            if hashmap['etag']:
+                headers['if_match'] = hashmap['etag']
+            block = self.client.retrieve_object(container, object, **headers)
+            if len(self.block_cache) >= self.block_cache_size:
+                self.block_cache.popitem(last=False)
+        self.block_cache[key] = block
+        return block
 
     # Global
     def statfs(self, path):
@@ -156,9 +252,11 @@ class StoreFS(Operations):
     # Container Level
     def container_chmod(self, container, mode):
         self.client.update_container_metadata(container, mode=str(mode))
+        self._invalidate(container)
 
     def container_chown(self, container, uid, gid):
         self.client.update_container_metadata(container, uid=uid, gid=gid)
+        self._invalidate(container)
 
     def container_getattr(self, container, fh=None):
         meta = self._get_container_meta(container)
@@ -189,15 +287,17 @@ class StoreFS(Operations):
     def container_mkdir(self, container, mode):
         mode = str(mode & 0777)
         self.client.create_container(container, mode=mode)
+        self._invalidate(container)
 
     def container_readdir(self, container, fh):
-        objects = self.client.list_objects(container, delimiter='/', prefix='')
+        objects = self._list_objects(container, '')
         files = [o for o in objects if not o.endswith('/')]
         return ['.', '..'] + files
 
     def container_removexattr(self, container, name):
         attr = 'xattr-' + name
         self.client.delete_container_metadata(container, [attr])
+        self._invalidate(container)
 
     def container_rename(self, container, path):
         new_container, sep, new_object = path[1:].partition('/')
@@ -205,25 +305,32 @@ class StoreFS(Operations):
             raise FuseOSError(EINVAL)
         self.client.delete_container(container)
         self.client.create_container(new_container)
+        self._invalidate(container)
+        self._invalidate(new_container)
 
     def container_rmdir(self, container):
         try:
             self.client.delete_container(container)
         except Fault:
             raise FuseOSError(ENOENT)
+        finally:
+            self._invalidate(container)
 
     def container_setxattr(self, container, name, value, options, position=0):
         attr = 'xattr-' + name
         meta = {attr: value}
         self.client.update_container_metadata(container, **meta)
+        self._invalidate(container)
 
     # Object Level
     def object_chmod(self, container, object, mode):
         self.client.update_object_metadata(container, object, mode=str(mode))
+        self._invalidate(container, object)
 
     def object_chown(self, container, uid, gid):
         self.client.update_object_metadata(container, object,
                                            uid=str(uid), gid=str(gid))
+        self._invalidate(container, object)
 
     def object_create(self, container, object, mode, fi=None):
         mode &= 0777
@@ -231,6 +338,7 @@ class StoreFS(Operations):
                                   f=None,
                                   content_type='application/octet-stream',
                                   mode=str(mode))
+        self._invalidate(container, object)
         return 0
 
     def object_getattr(self, container, object, fh=None):
@@ -272,47 +380,80 @@ class StoreFS(Operations):
         mode = str(mode & 0777)
         self.client.create_directory_marker(container, object)
         self.client.update_object_metadata(container, object, mode=mode)
+        self._invalidate(container, object)
 
     def object_read(self, container, object, nbyte, offset, fh):
-        data = self.client.retrieve_object(container, object)
-        return data[offset:offset + nbyte]
+        try:
+            return self._read_blocks(container, object, nbyte, offset)
+        except Fault, e:
+            if e.status != 412:
+                raise FuseOSError(EIO)
+        # The object changed after its hashmap was fetched; read it again
+        # using the current one.
+        self._invalidate(container, object)
+        try:
+            return self._read_blocks(container, object, nbyte, offset)
+        except Fault:
+            raise FuseOSError(EIO)
+
+    def _read_blocks(self, container, object, nbyte, offset):
+        hashmap = self._get_object_hashmap(container, object)
+        size = hashmap['bytes']
+        bs = hashmap['block_size']
+        end = min(offset + nbyte, size)
+        if offset >= end:
+            return ''
+
+        data = []
+        for index in xrange(offset // bs, (end - 1) // bs + 1):
+            block = self._get_block(container, object, hashmap, index)
+            start = index * bs
+            data.append(block[max(offset - start, 0):end - start])
+        return ''.join(data)
 
     def object_readdir(self, container, object, fh):
-        objects = self.client.list_objects(container, delimiter='/',
-                                           prefix=object)
+        objects = self._list_objects(container, object)
         files = [o.rpartition('/')[2] for o in objects if not o.endswith('/')]
         return ['.', '..'] + files
 
     def object_removexattr(self, container, object, name):
         attr = 'xattr-' + name
         self.client.delete_object_metadata(container, object, [attr])
+        self._invalidate(container, object)
 
     def object_rename(self, container, object, path):
         new_container, sep, new_object = path[1:].partition('/')
         if not new_container or not new_object:
             raise FuseOSError(EINVAL)
         self.client.move_object(container, object, new_container, new_object)
+        self._invalidate(container, object)
+        self._invalidate(new_container, new_object)
 
     def object_rmdir(self, container, object):
         self.client.delete_object(container, object)
+        self._invalidate(container, object)
 
     def object_setxattr(self, container, object, name, value, options,
                         position=0):
         attr = 'xattr-' + name
         meta = {attr: value}
         self.client.update_object_metadata(container, object, **meta)
+        self._invalidate(container, object)
 
     def object_truncate(self, container, object, length, fh=None):
         data = self.client.retrieve_object(container, object)
         f = StringIO(data[:length])
         self.client.update_object(container, object, f)
+        self._invalidate(container, object)
 
     def object_unlink(self, container, object):
         self.client.delete_object(container, object)
+        self._invalidate(container, object)
 
     def object_write(self, container, object, data, offset, fh):
         f = StringIO(data)
         self.client.update_object(container, object, f, offset=offset)
+        self._invalidate(container, object)
         return len(data)
 
 
@@ -44,6 +44,8 @@ import socket
 import urllib
 import datetime
 
+from objpool.http import PooledHTTPConnection
+
 ERROR_CODES = {304: 'Not Modified',
                400: 'Bad Request',
                401: 'Unauthorized',
@@ -69,14 +71,20 @@ class Fault(Exception):
 
 
 class Client(object):
-    def __init__(self, url, token, account, verbose=False, debug=False):
-        """`url` can also include a port, e.g '127.0.0.1:8000'."""
+    def __init__(self, url, token, account, verbose=False, debug=False,
+                 pool_size=None):
+        """`url` can also include a port, e.g '127.0.0.1:8000'.
+
+           If `pool_size` is given, requests reuse up to that many
+           persistent connections, so the client can be shared by threads.
+        """
 
         self.url = url
         self.account = account
         self.verbose = verbose or debug
         self.debug = debug
         self.token = token
+        self.pool_size = pool_size
 
     def _req(self, method, path, body=None, headers=None, format='text',
              params=None):
@@ -84,13 +92,6 @@ class Client(object):
         params = params or {}
 
         p = urlparse(self.url)
-        if p.scheme == 'http':
-            conn = HTTPConnection(p.netloc)
-        elif p.scheme == 'https':
-            conn = HTTPSConnection(p.netloc)
-        else:
-            raise Exception('Unknown URL scheme')
-
         full_path = _prepare_path(p.path + path, format, params)
 
         kwargs = {}
@@ -103,6 +104,20 @@ class Client(object):
         kwargs['headers'].setdefault('content-length', len(body)
                                      if body else 0)
 
+        if self.pool_size:
+            with PooledHTTPConnection(p.netloc, p.scheme,
+                                      size=self.pool_size) as conn:
+                conn.request(method, full_path, **kwargs)
+                resp = conn.getresponse()
+                return _handle_response(resp, self.verbose, self.debug)
+
+        if p.scheme == 'http':
+            conn = HTTPConnection(p.netloc)
+        elif p.scheme == 'https':
+            conn = HTTPSConnection(p.netloc)
+        else:
+            raise Exception('Unknown URL scheme')
+
         #print '#', method, full_path, kwargs
         #t1 = datetime.datetime.utcnow()
         conn.request(method, full_path, **kwargs)
@@ -393,7 +408,8 @@ class OOS_Client(Client):
         if not params:
             params = {}
         params.update({'hashmap': None})
-        return self.retrieve_object(container, object, params, format, account, **headers)
+        return self.retrieve_object(container, object, format=format,
+                                    params=params, account=account, **headers)
 
     def create_directory_marker(self, container, object, account=None):
         """creates a dierectory marker"""
@@ -35,10 +35,18 @@ import hashlib
 import os
 
 from binascii import hexlify
+from collections import deque
+from multiprocessing import cpu_count
+from multiprocessing.dummy import Pool as ThreadPool
+from stat import S_ISREG
 
 from progress.bar import IncrementalBar
 
 
+# Number of threads hashing the blocks of a file.
+HASH_WORKERS = cpu_count()
+
+
 def file_read_iterator(fp, size=1024):
     while True:
         data = fp.read(size)
@@ -47,6 +55,51 @@ def file_read_iterator(fp, size=1024):
         yield data
 
 
+def _hash_block(block, blockhash):
+    h = hashlib.new(blockhash)
+    h.update(block.rstrip('\x00'))
+    return h.digest()
+
+
+def hash_blocks(fp, blocksize, blockhash, workers=HASH_WORKERS):
+    """Yield, in order, the hash of each block of the file open as `fp`.
+
+       The blocks of regular files are read sequentially and hashed by up
+       to `workers` threads (hashlib releases the GIL while hashing), with
+       at most twice as many blocks as workers held in memory. Other files,
+       e.g. pipes, are hashed sequentially. The file is read rather than
+       mapped, so that truncating it meanwhile cannot crash the process.
+    """
+
+    try:
+        st = os.fstat(fp.fileno())
+    except (AttributeError, EnvironmentError):
+        st = None
+    blocks = file_read_iterator(fp, blocksize)
+    if (workers < 2 or st is None or not S_ISREG(st.st_mode) or
+            st.st_size <= blocksize):
+        for block in blocks:
+            yield _hash_block(block, blockhash)
+        return
+
+    pool = ThreadPool(workers)
+    pending = deque()
+    try:
+        for block in blocks:
+            pending.append(pool.apply_async(_hash_block, (block, blockhash)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+
 class HashMap(list):
 
     def __init__(self, blocksize, blockhash):
@@ -77,18 +130,21 @@ class HashMap(list):
             h = [self._hash_raw(h[x] + h[x + 1]) for x in range(0, len(h), 2)]
         return h[0]
 
-    def load(self, fp):
-        self.size = 0
+    def load(self, fp, workers=HASH_WORKERS, progress=True):
         file_size = os.fstat(fp.fileno()).st_size
-        nblocks = 1 + (file_size - 1) // self.blocksize
-        bar = IncrementalBar('Computing', max=nblocks)
-        bar.suffix = '%(percent).1f%% - %(eta)ds'
-        for block in bar.iter(file_read_iterator(fp, self.blocksize)):
-            self.append(self._hash_block(block))
-            self.size += len(block)
+        blocks = hash_blocks(fp, self.blocksize, self.blockhash, workers)
+        if progress:
+            nblocks = 1 + (file_size - 1) // self.blocksize
+            bar = IncrementalBar('Computing', max=nblocks)
+            bar.suffix = '%(percent).1f%% - %(eta)ds'
+            blocks = bar.iter(blocks)
+        self.extend(blocks)
+        self.size = file_size
 
 
-def merkle(path, blocksize=4194304, blockhash='sha256'):
+def merkle(path, blocksize=4194304, blockhash='sha256',
+           workers=HASH_WORKERS, progress=True):
     hashes = HashMap(blocksize, blockhash)
-    hashes.load(open(path))
+    with open(path) as fp:
+        hashes.load(fp, workers, progress)
     return hexlify(hashes.hash())
@@ -36,23 +36,117 @@ import types
 import json
 
 from hashmap import HashMap
-from binascii import hexlify, unhexlify
+from binascii import hexlify
 from cStringIO import StringIO
 from client import Fault
+from hashlib import md5
+from multiprocessing.dummy import Pool as ThreadPool
+from os.path import abspath, exists, expanduser, isdir, join
+from time import time
 
 from progress.bar import IncrementalBar
 
 
-def upload(client, path, container, prefix, name=None, mimetype=None):
+# Number of blocks transferred concurrently.
+TRANSFER_WORKERS = 8
+# Where the state of interrupted transfers is kept.
+STATE_DIR = expanduser('~/.pithos/transfers')
+# Minimum number of seconds between saving the state of a download.
+STATE_SAVE_INTERVAL = 5
+
+
+def _state_path(*key):
+    name = md5('\n'.join(str(k) for k in key)).hexdigest()
+    return join(STATE_DIR, name + '.json')
+
+
+def _load_state(path):
+    try:
+        with open(path) as fp:
+            return json.load(fp)
+    except (IOError, ValueError):
+        return None
+
+
+def _save_state(path, state):
+    # Resuming is best effort, a transfer must not fail because of it.
+    try:
+        if not isdir(STATE_DIR):
+            os.makedirs(STATE_DIR)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as fp:
+            json.dump(state, fp)
+        os.rename(tmp, path)
+    except (IOError, OSError):
+        pass
+
+
+def _remove_state(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _file_stat(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime]
+
+
+def _imap(func, items, workers):
+    """Apply `func` to `items` using up to `workers` threads.
+
+       Results are yielded in completion order.
+    """
+
+    if workers < 2 or len(items) < 2:
+        for item in items:
+            yield func(item)
+        return
+
+    pool = ThreadPool(min(len(items), workers))
+    try:
+        for result in pool.imap_unordered(func, items):
+            yield result
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+
+def _file_hashes(path, blocksize, blockhash):
+    """Return the hex block hashes of a file.
+
+       The hashes are kept as resume state until the upload completes, so
+       that retrying an interrupted upload does not read the file again.
+    """
+
+    state_path = _state_path('upload', abspath(path), blocksize, blockhash)
+    state = _load_state(state_path)
+    stat = _file_stat(path)
+    if state and state.get('stat') == stat:
+        return state['hashes'], state_path
+
+    hashes = HashMap(blocksize, blockhash)
+    hashes.load(open(path))
+    hashes = [hexlify(x) for x in hashes]
+    _save_state(state_path, {'stat': stat, 'hashes': hashes})
+    return hashes, state_path
+
+
+def upload(client, path, container, prefix, name=None, mimetype=None,
+           workers=TRANSFER_WORKERS):
 
     meta = client.retrieve_container_metadata(container)
     blocksize = int(meta['x-container-block-size'])
     blockhash = meta['x-container-block-hash']
 
     size = os.path.getsize(path)
-    hashes = HashMap(blocksize, blockhash)
-    hashes.load(open(path))
-    map = {'bytes': size, 'hashes': [hexlify(x) for x in hashes]}
+    hashes, state_path = _file_hashes(path, blocksize, blockhash)
+    map = {'bytes': size, 'hashes': hashes}
 
     objectname = name if name else os.path.split(path)[-1]
     object = prefix + objectname
@@ -64,6 +158,7 @@ def upload(client, path, container, prefix, name=None, mimetype=None):
         if fault.status != 409:
             raise
     else:
+        _remove_state(state_path)
         return v
 
     if isinstance(fault.data, types.StringType):
@@ -74,21 +169,29 @@ def upload(client, path, container, prefix, name=None, mimetype=None):
     if '' in missing:
         del missing[missing.index(''):]
 
+    offsets = {}
+    for i, hash in enumerate(hashes):
+        offsets.setdefault(hash, i * blocksize)
+    missing = [h for h in set(missing) if h in offsets]
+
+    def send(hash):
+        with open(path) as fp:
+            fp.seek(offsets[hash])
+            block = fp.read(blocksize)
+        client.update_container_data(container, StringIO(block))
+
     bar = IncrementalBar('Uploading', max=len(missing))
     bar.suffix = '%(percent).1f%% - %(eta)ds'
-    with open(path) as fp:
-        for hash in missing:
-            offset = hashes.index(unhexlify(hash)) * blocksize
-            fp.seek(offset)
-            block = fp.read(blocksize)
-            client.update_container_data(container, StringIO(block))
-            bar.next()
+    for _ in _imap(send, missing, workers):
+        bar.next()
     bar.finish()
 
-    return client.create_object_by_hashmap(container, object, map, **kwargs)
+    v = client.create_object_by_hashmap(container, object, map, **kwargs)
+    _remove_state(state_path)
+    return v
 
 
-def download(client, container, object, path):
+def download(client, container, object, path, workers=TRANSFER_WORKERS):
 
     res = client.retrieve_object_hashmap(container, object)
     blocksize = int(res['block_size'])
@@ -96,25 +199,58 @@ def download(client, container, object, path):
     bytes = res['bytes']
     map = res['hashes']
 
-    if os.path.exists(path):
+    state_path = _state_path('download', client.url, client.account,
+                             container, object, abspath(path))
+    state = _load_state(state_path)
+    if (state and state['hashes'] == map and exists(path) and
+            state['stat'] == _file_stat(path)):
+        done = set(state['done'])
+    elif exists(path):
         h = HashMap(blocksize, blockhash)
         h.load(open(path))
-        hashes = [hexlify(x) for x in h]
+        done = set(i for i, x in enumerate(h[:len(map)])
+                   if hexlify(x) == map[i])
     else:
         open(path, 'w').close()     # Create an empty file
-        hashes = []
-
-    with open(path, 'a+') as fp:
-        if bytes != 0:
-            for i, h in enumerate(map):
-                if i < len(hashes) and h == hashes[i]:
-                    continue
-                start = i * blocksize
-                end = '' if i == len(map) - 1 else ((i + 1) * blocksize) - 1
-                data = client.retrieve_object(
-                    container, object, range='bytes=%s-%s' % (start, end))
-                if i != len(map) - 1:
-                    data += (blocksize - len(data)) * '\x00'
-                fp.seek(start)
-                fp.write(data)
+        done = set()
+
+    # Fetch each distinct block once and write it wherever it appears.
+    pending = {}
+    if bytes != 0:
+        for i, h in enumerate(map):
+            if i not in done:
+                pending.setdefault(h, []).append(i)
+
+    def fetch(hash):
+        start = pending[hash][0] * blocksize
+        end = min(start + blocksize, bytes) - 1
+        data = client.retrieve_object(
+            container, object, range='bytes=%s-%s' % (start, end))
+        return hash, data
+
+    def save(fp):
+        fp.flush()
+        _save_state(state_path, {'hashes': map, 'done': sorted(done),
+                                 'stat': _file_stat(path)})
+
+    bar = IncrementalBar('Downloading', max=len(pending))
+    bar.suffix = '%(percent).1f%% - %(eta)ds'
+    with open(path, 'r+b') as fp:
+        saved = time()
+        try:
+            for hash, data in _imap(fetch, pending.keys(), workers):
+                data += (blocksize - len(data)) * '\x00'
+                for i in pending[hash]:
+                    fp.seek(i * blocksize)
+                    fp.write(data)
+                    done.add(i)
+                bar.next()
+                if time() - saved > STATE_SAVE_INTERVAL:
+                    save(fp)
+                    saved = time()
+        except:
+            save(fp)
+            raise
         fp.truncate(bytes)
+    bar.finish()
+    _remove_state(state_path)
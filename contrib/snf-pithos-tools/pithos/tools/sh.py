@@ -43,7 +43,7 @@ from django.core.validators import email_re
 
 from pithos.tools.lib.client import Pithos_Client, Fault
 from pithos.tools.lib.util import get_user, get_auth, get_url
-from pithos.tools.lib.transfer import upload, download
+from pithos.tools.lib.transfer import upload, download, TRANSFER_WORKERS
 
 import json
 import logging
@@ -781,9 +781,15 @@ class Send(Command):
     syntax = '<file> <container>[/<prefix>]'
     description = 'upload file to container (using prefix)'
 
+    def add_options(self, parser):
+        parser.add_option('--workers', action='store', type='int',
+                          dest='workers', default=TRANSFER_WORKERS,
+                          help='number of blocks to upload concurrently')
+
     def execute(self, file, path):
         container, sep, prefix = path.partition('/')
-        upload(self.client, file, container, prefix)
+        self.client.pool_size = self.workers
+        upload(self.client, file, container, prefix, workers=self.workers)
 
 
 @cli_command('receive')
@@ -791,9 +797,15 @@ class Receive(Command):
     syntax = '<container>/<object> <file>'
     description = 'download object to file'
 
+    def add_options(self, parser):
+        parser.add_option('--workers', action='store', type='int',
+                          dest='workers', default=TRANSFER_WORKERS,
+                          help='number of blocks to download concurrently')
+
     def execute(self, path, file):
         container, sep, object = path.partition('/')
-        download(self.client, container, object, file)
+        self.client.pool_size = self.workers
+        download(self.client, container, object, file, workers=self.workers)
 
 
 def print_usage():
@@ -37,13 +37,14 @@ import os
 import sqlite3
 import sys
 
-from os.path import exists, expanduser, isdir, isfile, join, split
+from multiprocessing.dummy import Pool as ThreadPool
+from os.path import dirname, exists, expanduser, isdir, isfile, join, split
 from shutil import copyfile
 from time import time
 
-from pithos.tools.lib.transfer import download, upload
+from pithos.tools.lib.transfer import download, upload, TRANSFER_WORKERS
 from pithos.tools.lib.client import Pithos_Client, Fault
-from pithos.tools.lib.hashmap import merkle
+from pithos.tools.lib.hashmap import merkle, HASH_WORKERS
 from pithos.tools.lib.util import get_user, get_auth, get_url
 
 
@@ -56,8 +57,24 @@ SQL_CREATE_FILES_TABLE = '''CREATE TABLE IF NOT EXISTS files (
                                 hash TEXT,
                                 timestamp INTEGER)'''
 
+SQL_CREATE_HASHES_TABLE = '''CREATE TABLE IF NOT EXISTS hashes (
+                                 path TEXT PRIMARY KEY,
+                                 inode INTEGER,
+                                 size INTEGER,
+                                 mtime REAL,
+                                 hash TEXT)'''
 
-client = Pithos_Client(get_url(), get_auth(), get_user())
+# Size of the blocks merkle() hashes separately.
+BLOCK_SIZE = 4194304
+# Files modified less than this many seconds ago may still change without
+# their mtime changing, so their hash is not cached.
+RACY_INTERVAL = 2
+# Maximum number of objects returned by a single listing request.
+LISTING_LIMIT = 10000
+
+
+client = Pithos_Client(get_url(), get_auth(), get_user(),
+                       pool_size=TRANSFER_WORKERS)
 
 
 def _makedirs(path):
@@ -73,14 +90,104 @@ class State(object):
         self.container = container
         self.trashdir = join(syncdir, TRASH_DIR)
         self.deleted_dirs = set()
+        self.remote = None
 
         _makedirs(self.trashdir)
 
         dbpath = join(SETTINGS_DIR, 'sync.db')
         self.conn = sqlite3.connect(dbpath)
         self.conn.execute(SQL_CREATE_FILES_TABLE)
+        self.conn.execute(SQL_CREATE_HASHES_TABLE)
         self.conn.commit()
 
+    def _stat(self, path):
+        st = os.stat(join(self.syncdir, path))
+        return st.st_ino, st.st_size, st.st_mtime
+
+    def _cached_hash(self, path, stat):
+        sql = 'SELECT inode, size, mtime, hash FROM hashes WHERE path = ?'
+        ret = self.conn.execute(sql, (path,)).fetchone()
+        if ret and tuple(ret[:3]) == stat:
+            return ret[3]
+        return None
+
+    def _cache_hash(self, path, stat, hash):
+        if time() - stat[2] < RACY_INTERVAL:
+            return
+        sql = ('INSERT OR REPLACE INTO hashes (path, inode, size, mtime, hash) '
+               'VALUES (?, ?, ?, ?, ?)')
+        self.conn.execute(sql, (path,) + stat + (hash,))
+
+    def file_hash(self, path):
+        """Return the hash of a local file, computing it only if the file
+           changed since it was last hashed."""
+
+        stat = self._stat(path)
+        hash = self._cached_hash(path, stat)
+        if hash is None:
+            hash = merkle(join(self.syncdir, path))
+            self._cache_hash(path, stat, hash)
+            self.conn.commit()
+        return hash
+
+    def hash_files(self, paths):
+        """Hash in parallel the local files that changed since they were
+           last hashed, so that `current_hash` finds them in the cache."""
+
+        small, large = [], []
+        for path in paths:
+            if not isfile(join(self.syncdir, path)):
+                continue
+            stat = self._stat(path)
+            if self._cached_hash(path, stat) is None:
+                if stat[1] > BLOCK_SIZE:
+                    large.append((path, stat))
+                else:
+                    small.append((path, stat))
+
+        # Large files are hashed one at a time, merkle spreads their
+        # blocks over HASH_WORKERS threads.
+        for path, stat in large:
+            self._cache_hash(path, stat, merkle(join(self.syncdir, path)))
+
+        def hash(item):
+            path, stat = item
+            fullpath = join(self.syncdir, path)
+            return path, stat, merkle(fullpath, workers=1, progress=False)
+
+        # Small files are hashed in parallel with each other. The database
+        # connection must only be used by this thread.
+        if small:
+            pool = ThreadPool(min(len(small), HASH_WORKERS))
+            try:
+                for path, stat, hash in pool.imap_unordered(hash, small):
+                    self._cache_hash(path, stat, hash)
+            finally:
+                pool.close()
+                pool.join()
+        self.conn.commit()
+
+    def load_remote(self):
+        """Fetch the hashes of all remote objects with a container listing,
+           to be returned by `remote_hash`."""
+
+        self.remote = {}
+        marker = None
+        while True:
+            objects = client.list_objects(self.container, format='json',
+                                          limit=LISTING_LIMIT, marker=marker)
+            for object in objects:
+                if 'subdir' in object:
+                    continue
+                type = object['content_type'].split(';', 1)[0].strip()
+                if type == 'application/directory':
+                    self.remote[object['name']] = 'DIR'
+                else:
+                    self.remote[object['name']] = object['x_object_hash']
+            if len(objects) < LISTING_LIMIT:
+                break
+            marker = objects[-1]['name']
+
     def current_hash(self, path):
         """Return the hash of the file as it exists now in the filesystem"""
 
@@ -91,11 +198,13 @@ class State(object):
             return 'DEL'
         if isdir(fullpath):
             return 'DIR'
-        return merkle(fullpath)
+        return self.file_hash(path)
 
     def delete_inactive(self, timestamp):
         sql = 'DELETE FROM files WHERE timestamp != ?'
         self.conn.execute(sql, (timestamp,))
+        sql = 'DELETE FROM hashes WHERE path NOT IN (SELECT path FROM files)'
+        self.conn.execute(sql)
         self.conn.commit()
 
     def download(self, path, hash):
@@ -144,6 +253,13 @@ class State(object):
     def remote_hash(self, path):
         """Return the hash of the file according to the server"""
 
+        if self.remote is not None:
+            return self.remote.get(path, 'DEL')
+        return self.retrieve_remote_hash(path)
+
+    def retrieve_remote_hash(self, path):
+        """Return the hash of the file as it exists now in the server"""
+
         try:
             meta = client.retrieve_object_metadata(self.container, path)
         except Fault:
@@ -218,7 +334,7 @@ class State(object):
             return
 
         if isfile(fullpath):
-            hash = merkle(fullpath)
+            hash = self.file_hash(path)
             trashpath = join(self.trashdir, hash)
             os.rename(fullpath, trashpath)
         else:
@@ -237,8 +353,10 @@ class State(object):
             print 'Uploading %s...' % path
             upload(client, fullpath, self.container, prefix, name)
 
-        remote = self.remote_hash(path)
+        remote = self.retrieve_remote_hash(path)
         assert remote == hash, "Uploaded file does not match hash"
+        if self.remote is not None:
+            self.remote[path] = remote
         self.save(path, hash)
 
 
@@ -263,9 +381,13 @@ def sync(path, state):
             state.resolve_conflict(path, remote)
 
 
-def walk(dir, container):
+def walk(dir, remote):
     """Iterates on the files of the hierarchy created by merging the files
-       in `dir` and the objects in `container`."""
+       in `dir` and the `remote` objects, as loaded by `State.load_remote`."""
+
+    children = {}
+    for name, hash in remote.iteritems():
+        children.setdefault(dirname(name), []).append((name, hash))
 
     pending = ['']
 
@@ -287,12 +409,8 @@ def walk(dir, container):
                 else:
                     files.add(path)
 
-        for object in client.list_objects(container, format='json',
-                                          prefix=root, delimiter='/'):
-            if 'subdir' in object:
-                continue
-            name = object['name']
-            if object['content_type'].split(';', 1)[0].strip() == 'application/directory':
+        for name, hash in children.get(root, []):
+            if hash == 'DIR':
                 dirs.add(name)
             else:
                 files.add(name)
@@ -314,9 +432,12 @@ def main():
     client.create_container(container)
 
     state = State(syncdir, container)
+    state.load_remote()
+    paths = list(walk(syncdir, state.remote))
+    state.hash_files(paths)
 
     now = int(time())
-    for path in walk(syncdir, container):
+    for path in paths:
         print 'Syncing', path
         sync(path, state)
         state.touch(path, now)
@@ -43,7 +43,7 @@ from django.core.cache import cache
 from astakos.im import settings
 from astakos.im import register
 from astakos.im.quotas import get_user_quotas, service_get_quotas, \
-    service_get_project_quotas, project_ref
+    service_get_quotas_page, service_get_project_quotas, project_ref
 
 import astakos.quotaholder_app.exception as qh_exception
 import astakos.quotaholder_app.callpoint as qh
@@ -73,17 +73,68 @@ def quotas(request):
     return json_response(result)
 
 
+QUOTA_COLUMNS = ["holder", "source", "resource",
+                 "limit", "usage", "pending",
+                 "project_limit", "project_usage", "project_pending"]
+
+
+def quotas_to_columns(quotas):
+    """Encode a quotas dict as a dict of columns, sorted by holder.
+
+    Each column is a list with one value per holder/source/resource triple,
+    which avoids repeating the keys of the values for every holding.
+
+    """
+    columns = dict((column, []) for column in QUOTA_COLUMNS)
+    for holder in sorted(quotas):
+        for source, source_quotas in sorted(quotas[holder].iteritems()):
+            for resource, values in sorted(source_quotas.iteritems()):
+                columns["holder"].append(holder)
+                columns["source"].append(source)
+                columns["resource"].append(resource)
+                for column in QUOTA_COLUMNS[3:]:
+                    columns[column].append(values[column])
+    return columns
+
+
 @api.api_method(http_method='GET', token_required=True, user_required=False)
 @component_from_token
 def service_quotas(request):
     user = request.GET.get('user')
     users = [user] if user is not None else None
-    result = service_get_quotas(request.component_instance, users=users)
-
-    if user is not None and result == {}:
-        raise ItemNotFound("No such user '%s'" % user)
-
-    return json_response(result)
+    resources = request.GET.getlist('resource') or None
+    encoding = request.GET.get('encoding')
+    if encoding not in [None, 'columnar']:
+        raise BadRequest("Unknown encoding '%s'" % encoding)
+    encode = quotas_to_columns if encoding == 'columnar' else lambda q: q
+
+    marker = request.GET.get('marker')
+    limit = request.GET.get('limit')
+    if marker is None and limit is None:
+        result = service_get_quotas(request.component_instance, users=users,
+                                    resources=resources)
+
+        if user is not None and result == {}:
+            raise ItemNotFound("No such user '%s'" % user)
+
+        return json_response(encode(result))
+
+    max_limit = settings.SERVICE_QUOTAS_MAX_LIMIT
+    if limit is None:
+        limit = max_limit
+    else:
+        try:
+            limit = int(limit)
+            assert limit > 0
+        except (ValueError, AssertionError):
+            raise BadRequest("Invalid limit '%s'" % limit)
+        limit = min(limit, max_limit)
+
+    result, next_marker = service_get_quotas_page(
+        request.component_instance, limit, marker=marker, users=users,
+        resources=resources)
+    return json_response({"quotas": encode(result),
+                          "next_marker": next_marker})
 
 
 @api.api_method(http_method='GET', token_required=True, user_required=False)
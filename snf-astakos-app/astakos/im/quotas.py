@@ -132,18 +132,45 @@ def get_user_quotas(user, resources=None, sources=None):
     return quotas.get(user.uuid, {})
 
 
-def service_get_quotas(component, users=None):
+def get_component_resources(component, resources=None):
     name_values = Service.objects.filter(
         component=component).values_list('name')
     service_names = [t for (t,) in name_values]
-    resources = Resource.objects.filter(service_origin__in=service_names)
-    resource_names = [r.name for r in resources]
+    rs = Resource.objects.filter(service_origin__in=service_names)
+    if resources is not None:
+        rs = rs.filter(name__in=resources)
+    return [r.name for r in rs]
+
+
+def service_get_quotas(component, users=None, resources=None):
+    resource_names = get_component_resources(component, resources)
     astakosusers = AstakosUser.objects.verified()
     if users is not None:
         astakosusers = astakosusers.filter(uuid__in=users)
     return get_users_quotas(astakosusers, resources=resource_names)
 
 
+def service_get_quotas_page(component, limit, marker=None, users=None,
+                            resources=None):
+    """Get the quotas of a page of users, ordered by UUID.
+
+    Return the quotas of up to 'limit' verified users with UUID greater than
+    'marker', along with the marker of the next page, which is None if there
+    are no more users.
+
+    """
+    resource_names = get_component_resources(component, resources)
+    astakosusers = AstakosUser.objects.verified().order_by("uuid")
+    if users is not None:
+        astakosusers = astakosusers.filter(uuid__in=users)
+    if marker is not None:
+        astakosusers = astakosusers.filter(uuid__gt=marker)
+    uuids = list(astakosusers.values_list("uuid", flat=True)[:limit + 1])
+    next_marker = uuids[limit - 1] if len(uuids) > limit else None
+    page = AstakosUser.objects.filter(uuid__in=uuids[:limit])
+    return get_users_quotas(page, resources=resource_names), next_marker
+
+
 def mk_limits_dict(counters):
     quota = QuotaDict()
     for (holder, source, resource), (limit, _, _) in counters.iteritems():
@@ -290,10 +317,22 @@ def list_user_quotas(users, qhflt=None):
     return qh_quotas
 
 
+QH_SYNC_BATCH_SIZE = 100
+
+
 def qh_sync_projects(projects, resource=None):
-    p_quota, u_quota = astakos_project_quotas(projects, resource=resource)
-    p_quota.update(u_quota)
-    set_quota(p_quota, resource=resource)
+    """Sync the quotas of the given projects and their members.
+
+    Projects are synced in batches of QH_SYNC_BATCH_SIZE, so that only the
+    quotas of a batch are computed at a time.
+
+    """
+    projects = list(projects)
+    for i in xrange(0, len(projects), QH_SYNC_BATCH_SIZE):
+        batch = projects[i:i + QH_SYNC_BATCH_SIZE]
+        p_quota, u_quota = astakos_project_quotas(batch, resource=resource)
+        p_quota.update(u_quota)
+        set_quota(p_quota, resource=resource)
 
 
 def qh_sync_project(project):
@@ -325,8 +364,9 @@ def pick_limit_scheme(project, resource):
 
 
 def qh_sync_new_resource(resource):
-    projects = Project.objects.filter(state__in=Project.INITIALIZED_STATES).\
-        select_for_update()
+    projects = list(
+        Project.objects.filter(state__in=Project.INITIALIZED_STATES).
+        select_for_update())
 
     entries = []
     for project in projects:
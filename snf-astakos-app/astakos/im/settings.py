@@ -253,3 +253,7 @@ ENDPOINT_CACHE_TIMEOUT = getattr(settings,
 RESOURCE_CACHE_TIMEOUT = getattr(settings,
                                  'ASTAKOS_RESOURCE_CACHE_TIMEOUT',
                                  60)
+
+SERVICE_QUOTAS_MAX_LIMIT = getattr(settings,
+                                   'ASTAKOS_SERVICE_QUOTAS_MAX_LIMIT',
+                                   1000)
@@ -137,6 +137,36 @@ class QuotaAPITest(TestCase):
         body = json.loads(r.content)
         assertIn(user.uuid, body)
 
+        # paginated service quotas
+        all_quotas = body
+        paged_quotas = {}
+        marker = None
+        while True:
+            url = u('service_quotas?limit=1')
+            if marker is not None:
+                url += '&marker=' + marker
+            r = client.get(url, **s1_headers)
+            self.assertEqual(r.status_code, 200)
+            body = json.loads(r.content)
+            self.assertTrue(len(body["quotas"]) <= 1)
+            paged_quotas.update(body["quotas"])
+            marker = body["next_marker"]
+            if marker is None:
+                break
+        self.assertEqual(paged_quotas, all_quotas)
+
+        r = client.get(u('service_quotas?limit=0'), **s1_headers)
+        self.assertEqual(r.status_code, 400)
+
+        r = client.get(u('service_quotas?user=%s&resource=%s&'
+                         'encoding=columnar' %
+                         (user.uuid, resource11['name'])), **s1_headers)
+        self.assertEqual(r.status_code, 200)
+        body = json.loads(r.content)
+        self.assertEqual(set(body["holder"]), set([user.uuid]))
+        self.assertEqual(set(body["resource"]), set([resource11['name']]))
+        self.assertEqual(len(body["usage"]), len(body["holder"]))
+
         r = client.get(u('commissions'), **s1_headers)
         self.assertEqual(r.status_code, 200)
         body = json.loads(r.content)
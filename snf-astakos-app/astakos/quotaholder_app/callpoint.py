@@ -82,7 +82,7 @@ def delete_quota(keys):
                                resource=resource).delete()
 
 
-def _get_holdings_for_update(holding_keys, resource=None, delete=False):
+def _get_holdings_for_update(holding_keys, resource=None):
     flt = Q(resource=resource) if resource is not None else Q()
     holders = set(holder for (holder, source, resource) in holding_keys)
     objs = Holding.objects.filter(flt, holder__in=holders).order_by('pk')
@@ -90,17 +90,10 @@ def _get_holdings_for_update(holding_keys, resource=None, delete=False):
 
     keys = set(holding_keys)
     holdings = {}
-    put_back = []
     for h in hs:
         key = h.holder, h.source, h.resource
         if key in keys:
             holdings[key] = h
-        else:
-            put_back.append(h)
-
-    if delete:
-        objs.delete()
-        Holding.objects.bulk_create(put_back)
     return holdings
 
 
@@ -113,30 +106,56 @@ def _mkProvision(key, quantity):
             }
 
 
+SET_QUOTA_BATCH_SIZE = 1000
+
+
 def set_quota(quotas, resource=None):
-    holding_keys = [key for (key, limit) in quotas]
-    holdings = _get_holdings_for_update(
-        holding_keys, resource=resource, delete=True)
+    """Set the limit of the given holdings.
 
-    new_holdings = {}
+    Only the holdings whose limit changes are updated and the missing ones
+    are created; all other holdings are left untouched. Holdings are locked
+    and updated in batches of SET_QUOTA_BATCH_SIZE holders.
+
+    """
+    limits = {}
     for key, limit in quotas:
-        holder, source, res = key
-        if resource is not None and resource != res:
+        if resource is not None and resource != key[2]:
             continue
-        h = Holding(holder=holder,
-                    source=source,
-                    resource=res,
-                    limit=limit)
+        limits[key] = limit
+
+    by_holder = _partition_by(lambda key: key[0], limits.iterkeys())
+    holders = sorted(by_holder.keys())
+    for i in xrange(0, len(holders), SET_QUOTA_BATCH_SIZE):
+        keys = []
+        for holder in holders[i:i + SET_QUOTA_BATCH_SIZE]:
+            keys.extend(by_holder[holder])
+        _set_quota_batch([(key, limits[key]) for key in keys],
+                         resource=resource)
+
+
+def _set_quota_batch(quotas, resource=None):
+    holdings = _get_holdings_for_update([key for key, _ in quotas],
+                                        resource=resource)
+    changed = {}
+    new_holdings = []
+    for key, limit in quotas:
         try:
-            h_old = holdings[key]
-            h.usage_min = h_old.usage_min
-            h.usage_max = h_old.usage_max
-            h.id = h_old.id
+            h = holdings[key]
         except KeyError:
-            pass
-        new_holdings[key] = h
-
-    Holding.objects.bulk_create(new_holdings.values())
+            holder, source, res = key
+            new_holdings.append(Holding(holder=holder,
+                                        source=source,
+                                        resource=res,
+                                        limit=limit))
+            continue
+        if h.limit != limit:
+            changed.setdefault(limit, []).append(h.id)
+
+    # Group the updates by limit, since most holdings share a few limits
+    for limit, ids in changed.iteritems():
+        Holding.objects.filter(id__in=ids).update(limit=limit)
+    if new_holdings:
+        Holding.objects.bulk_create(new_holdings)
 
 
 def _merge_same_keys(provisions):
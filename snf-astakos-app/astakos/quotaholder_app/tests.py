@@ -264,3 +264,33 @@ class QuotaholderTest(TestCase):
         r = qh.get_quota(holders=[holder])
         self.assertEqual(r, {(holder, source, resource1): (limit2, 1, 1),
                              (holder, source, resource2): (22, 2, 2)})
+
+    def test_040_set_only_changed(self):
+        source = 'system'
+        resource1 = 'r1'
+        resource2 = 'r2'
+        holders = ['h%s' % i for i in range(5)]
+        qh.set_quota([((h, source, resource1), 10) for h in holders])
+        ids = dict((h.holder, h.id) for h in models.Holding.objects.all())
+
+        batch_size = qh.SET_QUOTA_BATCH_SIZE
+        qh.SET_QUOTA_BATCH_SIZE = 2
+        try:
+            qh.set_quota([((holders[0], source, resource1), 10),
+                          ((holders[1], source, resource1), 20),
+                          ((holders[2], source, resource2), 30),
+                          ((holders[3], source, resource1), 40)],
+                         resource=resource1)
+        finally:
+            qh.SET_QUOTA_BATCH_SIZE = batch_size
+
+        r = qh.get_quota(holders=holders)
+        self.assertEqual(r, {(holders[0], source, resource1): (10, 0, 0),
+                             (holders[1], source, resource1): (20, 0, 0),
+                             (holders[2], source, resource1): (10, 0, 0),
+                             (holders[3], source, resource1): (40, 0, 0),
+                             (holders[4], source, resource1): (10, 0, 0)})
+        # Existing holdings are updated in place
+        self.assertEqual(
+            dict((h.holder, h.id) for h in models.Holding.objects.all()),
+            ids)
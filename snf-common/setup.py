@@ -63,6 +63,7 @@ EXTRAS_REQUIRES = {
 }
 
 TESTS_REQUIRES = [
+    'mock',
 ]
 
 setup(
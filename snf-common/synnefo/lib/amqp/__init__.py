@@ -44,8 +44,10 @@ from synnefo import settings
 
 if settings.AMQP_BACKEND == 'puka':
     from amqp_puka import AMQPPukaClient as Client
+    from amqp_puka import AMQPPukaPublisher as Publisher
 elif settings.AMQP_BACKEND == 'haigha':
     from amqp_haigha import AMQPHaighaClient as Client
+    Publisher = None
 else:
     raise Exception('Unknown Backend %s' % settings.AMQP_BACKEND)
 
@@ -59,3 +61,17 @@ class AMQPClient(object):
     """
     def __new__(cls, *args, **kwargs):
         return Client(*args, **kwargs)
+
+
+class AMQPPublisher(object):
+    """
+    AMQP client for publishing messages over multiple connections.
+
+    This class will create an object of AMQPPukaPublisher. It is not
+    supported by the haigha AMQP_BACKEND.
+    """
+    def __new__(cls, *args, **kwargs):
+        if Publisher is None:
+            raise NotImplementedError("AMQPPublisher is not supported by"
+                                      " backend %s" % settings.AMQP_BACKEND)
+        return Publisher(*args, **kwargs)
@@ -46,7 +46,8 @@ from puka import Client
 from puka import spec_exceptions
 import socket
 from socket import error as socket_error
-from time import sleep
+from time import sleep, time
+from zlib import crc32
 from random import shuffle
 from functools import wraps
 from synnefo.lib.ordereddict import OrderedDict
@@ -94,6 +95,8 @@ class AMQPPukaClient(object):
         self.channel = None
         self.consumers = {}
         self.unacked = OrderedDict()
+        self.publish_times = {}
+        self.stats = PublishStats()
         self.unsend = OrderedDict()
         self.consume_promises = []
         self.exchanges = []
@@ -148,6 +151,7 @@ class AMQPPukaClient(object):
         # to the connection object
         self.consume_promises = []
 
+        self.publish_times.clear()
         if self.unacked:
             self._resend_unacked_messages()
 
@@ -242,7 +246,9 @@ class AMQPPukaClient(object):
         self.flush_buffer()
 
         if self.confirms and len(self.unacked) >= self.confirm_buffer:
-            self.get_confirms()
+            # Keep at most 'confirm_buffer' messages in flight, without
+            # waiting for all of them to be confirmed
+            self.collect_confirms(self.confirm_buffer - 1)
 
     @reconnect_decorator
     def basic_publish_multi(self, exchange, routing_key, bodies):
@@ -258,6 +264,32 @@ class AMQPPukaClient(object):
         if self.confirms:
             self.get_confirms()
 
+    @reconnect_decorator
+    def basic_publish_batch(self, exchange, messages, wait=True):
+        """Publish a batch of messages and wait for their confirmations.
+
+        @type messages: list of tuples
+        @param messages: (routing_key, body) pairs to publish
+        @param wait: whether to wait for the confirmations of all messages.
+            If False, only the messages exceeding 'confirm_buffer' are
+            waited for and get_confirms must be called later.
+
+        """
+        for routing_key, body in messages:
+            self.unsend[body] = (exchange, routing_key)
+
+        for routing_key, body in messages:
+            self._publish(exchange, routing_key, body)
+            self.unsend.pop(body)
+
+        self.flush_buffer()
+
+        if self.confirms:
+            if wait:
+                self.get_confirms()
+            else:
+                self.collect_confirms(self.confirm_buffer)
+
     def _publish(self, exchange, routing_key, body, headers={}):
         # Persisent messages by default!
         headers['delivery_mode'] = 2
@@ -267,6 +299,8 @@ class AMQPPukaClient(object):
 
         if self.confirms:
             self.unacked[promise] = (exchange, routing_key, body)
+            self.publish_times[promise] = time()
+        self.stats.published(exchange)
 
         return promise
 
@@ -275,11 +309,43 @@ class AMQPPukaClient(object):
         while self.client.needs_write():
             self.client.on_write()
 
-    @reconnect_decorator
     def get_confirms(self):
-        for promise in self.unacked.keys():
+        """Wait for the confirmations of all published messages."""
+        self.collect_confirms(0)
+
+    @reconnect_decorator
+    def collect_confirms(self, max_unacked=0):
+        """Collect publish confirmations.
+
+        Confirmations that have already arrived are collected without
+        blocking. Then, wait for the oldest unconfirmed messages until at most
+        'max_unacked' messages remain unconfirmed.
+
+        """
+        # Process any pending network events without blocking
+        self.client.wait([], timeout=0)
+        ready = self.client.promises.ready
+        for promise in [p for p in self.unacked.keys() if p in ready]:
+            self._confirm(promise)
+
+        while len(self.unacked) > max_unacked:
+            self._confirm(next(iter(self.unacked)))
+
+    def _confirm(self, promise):
+        try:
             self.client.wait(promise)
-            self.unacked.pop(promise)
+        except spec_exceptions.AMQPSoftError as e:
+            # The broker rejected the message, e.g. because the exchange does
+            # not exist. The channel has been reopened, so do not resend it.
+            exchange, routing_key, body = self.unacked.pop(promise)
+            self.publish_times.pop(promise, None)
+            self.stats.failed(exchange)
+            self.log.error("Failed to publish message %s to exchange %s with"
+                           " routing key %s: %r", body, exchange, routing_key,
+                           e)
+            return
+        exchange = self.unacked.pop(promise)[0]
+        self.stats.confirmed(exchange, self.publish_times.pop(promise, None))
 
     @reconnect_decorator
     def _resend_unacked_messages(self):
@@ -423,5 +489,140 @@ class AMQPPukaClient(object):
                 self.client.basic_cancel(promise)
 
 
+class AMQPPukaPublisher(object):
+    """
+    AMQP client for publishing messages over multiple connections.
+
+    Messages are spread over 'connections' AMQPPukaClient objects, each one
+    with its own connection to the brokers. Each message is published with a
+    key, e.g. the name of the object it refers to, which defaults to its
+    routing key. Messages with the same key are always published over the
+    same connection, in order to preserve their order. Each connection keeps
+    up to 'confirm_buffer' unconfirmed messages in flight.
+
+    """
+    def __init__(self, hosts=settings.AMQP_HOSTS, connections=2,
+                 max_retries=30, confirms=True, confirm_buffer=100,
+                 logger=None):
+        assert(connections > 0), "connections must be positive"
+        self.stats = PublishStats()
+        self.clients = []
+        for _ in range(connections):
+            # Each client shuffles its own copy of the hosts, so that the
+            # connections are spread over the brokers
+            client = AMQPPukaClient(hosts=list(hosts),
+                                    max_retries=max_retries,
+                                    confirms=confirms,
+                                    confirm_buffer=confirm_buffer,
+                                    logger=logger)
+            client.stats = self.stats
+            self.clients.append(client)
+
+    def _get_client(self, key):
+        return self.clients[crc32(key) % len(self.clients)]
+
+    def connect(self):
+        for client in self.clients:
+            client.connect()
+
+    def exchange_declare(self, exchange, type='direct'):
+        for client in self.clients:
+            client.exchange_declare(exchange, type)
+
+    def basic_publish(self, exchange, routing_key, body, headers={},
+                      key=None):
+        """Publish a message with a specific routing key """
+        if key is None:
+            key = routing_key
+        client = self._get_client(key)
+        client.basic_publish(exchange, routing_key, body, headers)
+
+    def basic_publish_batch(self, exchange, messages, wait=True):
+        """Publish a batch of messages and wait for their confirmations.
+
+        The messages are first sent over all connections, and then the
+        confirmations are collected from each connection.
+
+        @type messages: list of tuples
+        @param messages: (routing_key, body, key) tuples to publish
+        @param wait: whether to wait for the confirmations of all messages.
+            If False, get_confirms must be called later, e.g. once for
+            several batches.
+
+        """
+        batches = OrderedDict()
+        for routing_key, body, key in messages:
+            client = self._get_client(key)
+            batches.setdefault(client, []).append((routing_key, body))
+
+        for client, batch in batches.items():
+            client.basic_publish_batch(exchange, batch, wait=False)
+
+        if wait:
+            for client in batches.keys():
+                if client.confirms:
+                    client.get_confirms()
+
+    def get_confirms(self):
+        for client in self.clients:
+            if client.confirms:
+                client.get_confirms()
+
+    def get_stats(self):
+        """Return publishing rate and confirm latency per exchange."""
+        return self.stats.as_dict()
+
+    def close(self):
+        for client in self.clients:
+            client.close()
+
+
+class PublishStats(object):
+    """Publishing statistics per exchange.
+
+    Track the number of published, confirmed and failed messages and the
+    latency of publish confirmations for each exchange.
+
+    """
+    def __init__(self):
+        self.start = time()
+        self.exchanges = {}
+
+    def _get(self, exchange):
+        return self.exchanges.setdefault(exchange, {"published": 0,
+                                                    "confirmed": 0,
+                                                    "failed": 0,
+                                                    "latency": 0.0,
+                                                    "max_latency": 0.0})
+
+    def published(self, exchange):
+        self._get(exchange)["published"] += 1
+
+    def confirmed(self, exchange, publish_time=None):
+        stats = self._get(exchange)
+        stats["confirmed"] += 1
+        if publish_time is not None:
+            latency = time() - publish_time
+            stats["latency"] += latency
+            stats["max_latency"] = max(stats["max_latency"], latency)
+
+    def failed(self, exchange):
+        self._get(exchange)["failed"] += 1
+
+    def as_dict(self):
+        elapsed = max(time() - self.start, 1e-6)
+        result = {}
+        for exchange, stats in self.exchanges.items():
+            confirmed = stats["confirmed"]
+            avg_latency = stats["latency"] / confirmed if confirmed else 0.0
+            result[exchange] = {"published": stats["published"],
+                                "confirmed": confirmed,
+                                "failed": stats["failed"],
+                                "rate": stats["published"] / elapsed,
+                                "avg_latency": avg_latency,
+                                "max_latency": stats["max_latency"]}
+        return result
+
+
 class AMQPConnectionError(Exception):
     pass
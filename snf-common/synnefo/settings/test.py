@@ -21,6 +21,9 @@ LOGGING_SETUP['handlers']['console']['level'] = \
 
 LOGIN_URL = 'http://host:port/'
 
+# Tests change the mocked RAPI responses between calls
+GANETI_RAPI_CACHE_TIMEOUT = 0
+
 
 SOUTH_TESTS_MIGRATE = bool(int(os.environ.get('SOUTH_TESTS_MIGRATE', True)))
 SNF_TEST_USE_POSTGRES = bool(int(os.environ.get('SNF_TEST_USE_POSTGRES',
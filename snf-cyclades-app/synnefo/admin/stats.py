@@ -39,12 +39,14 @@ import datetime
 from collections import defaultdict  # , OrderedDict
 from copy import copy
 from django.conf import settings
-from django.db.models import Count, Sum
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
 
 from snf_django.lib.astakos import UserCache
 from synnefo.db.models import VirtualMachine, Network, Backend
 from synnefo.plankton.backend import PlanktonBackend
 from synnefo.logic import backend as backend_mod
+from synnefo.logic.rapi_pool import map_concurrently
 
 
 def get_cyclades_stats(backend=None, clusters=True, servers=True,
@@ -63,6 +65,58 @@ def get_cyclades_stats(backend=None, clusters=True, servers=True,
     return stats
 
 
+STATS_SECTIONS = ("clusters", "servers", "resources", "networks", "images")
+
+
+def _stats_cache_key(backend, section):
+    # Image statistics are always computed for all backends
+    if backend is None or section == "images":
+        backend_id = None
+    else:
+        backend_id = backend.id
+    return "cyclades:admin_stats:%s:%s" % (section, backend_id)
+
+
+def get_cached_cyclades_stats(backend=None, clusters=True, servers=True,
+                              resources=True, networks=True, images=True,
+                              refresh=False):
+    """Return a snapshot of the Cyclades statistics.
+
+    The statistics are expensive to compute, since they query all backends
+    and the image service. Each section of the statistics is stored in the
+    cache for CYCLADES_STATS_CACHE_TIMEOUT seconds and is served from there
+    until it expires, whichever other sections are requested with it. With
+    'refresh', the requested sections are always recomputed and stored,
+    which allows a periodic job to keep them warm. The reported datetime is
+    the one of the oldest section.
+
+    """
+    flags = (clusters, servers, resources, networks, images)
+    timeout = settings.CYCLADES_STATS_CACHE_TIMEOUT
+    if timeout <= 0:
+        return get_cyclades_stats(backend, *flags)
+
+    sections = [s for s, flag in zip(STATS_SECTIONS, flags) if flag]
+    keys = dict((s, _stats_cache_key(backend, s)) for s in sections)
+    cached = {} if refresh else cache.get_many(keys.values())
+    missing = [s for s in sections if keys[s] not in cached]
+    if missing:
+        now = datetime.datetime.now()
+        computed = get_cyclades_stats(
+            backend, *[s in missing for s in STATS_SECTIONS])
+        computed = dict((keys[s], (now, computed[s])) for s in missing)
+        cache.set_many(computed, timeout)
+        cached.update(computed)
+
+    stats = {}
+    for section in sections:
+        stats[section] = cached[keys[section]][1]
+    dates = [cached[keys[s]][0] for s in sections] or \
+        [datetime.datetime.now()]
+    stats["datetime"] = min(dates).strftime("%c")
+    return stats
+
+
 def get_cluster_stats(backend):
     total = Backend.objects.all()
     stats = {"total": total.count(),
@@ -123,8 +177,11 @@ def get_images_stats(backend=None):
     total_servers = _get_total_servers(backend=backend)
     active_servers = total_servers.filter(deleted=False)
 
-    active_servers_images = active_servers.values("imageid", "userid")\
-                                          .annotate(number=Count("imageid"))
+    # One row per image. Any owner of a server is allowed to access the
+    # image, so a single user is enough to fetch it from the image service.
+    active_servers_images = active_servers.values("imageid")\
+                                          .annotate(number=Count("id"),
+                                                    userid=Max("userid"))
 
     image_cache = ImageCache()
     image_stats = defaultdict(int)
@@ -157,6 +214,12 @@ def group_by_resource(objects, resource):
 
 
 def get_ip_stats():
+    """Return the total and free public IPv4 addresses.
+
+    Segmented IP pools are counted from the saved free counts of their
+    chunks. Pools stored as a single map are still decoded as a whole.
+
+    """
     total, free = 0, 0,
     for network in Network.objects.filter(public=True, deleted=False):
         try:
@@ -180,7 +243,7 @@ def get_backend_stats(backend=None):
         if backend.offline:
             return {}
         backends = [backend]
-    [backend_mod.update_backend_resources(b) for b in backends]
+    update_backends_resources(backends)
     resources = {}
     for attr in ("dfree", "dtotal", "mfree", "mtotal", "ctotal"):
         resources[attr] = 0
@@ -193,6 +256,20 @@ def get_backend_stats(backend=None):
             "disk_template": {"free": 0, "total": 0}}
 
 
+def update_backends_resources(backends):
+    """Update the resources of the backends, querying them concurrently.
+
+    Only the RAPI calls are issued from the worker threads. The results are
+    stored in the DB from the calling thread.
+
+    """
+    backends = list(backends)
+    results = map_concurrently(backend_mod.get_physical_resources, backends,
+                               workers=settings.CYCLADES_STATS_WORKERS)
+    for b, resources in zip(backends, results):
+        backend_mod.update_backend_resources(b, resources)
+
+
 class ImageCache(object):
     def __init__(self):
         self.images = {}
@@ -82,8 +82,8 @@ def get_cyclades_stats(request):
         if include_images is not None:
             images = include_images
 
-    _stats = stats.get_cyclades_stats(backend=backend, clusters=True,
-                                      servers=True, resources=True,
-                                      networks=True, images=images)
+    _stats = stats.get_cached_cyclades_stats(backend=backend, clusters=True,
+                                             servers=True, resources=True,
+                                             networks=True, images=images)
     data = json.dumps(_stats)
     return http.HttpResponse(data, status=200, content_type='application/json')
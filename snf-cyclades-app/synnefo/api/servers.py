@@ -31,13 +31,18 @@
 # interpreted as representing official policies, either expressed
 # or implied, of GRNET S.A.
 
+from hashlib import md5
+
 from django.conf import settings
 from django.conf.urls import patterns
 
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Max
 from django.http import HttpResponse
 from django.template.loader import render_to_string
 from django.utils import simplejson as json
+from django.utils.http import parse_etags, quote_etag
 
 from snf_django.lib import api
 from snf_django.lib.api import faults, utils
@@ -345,8 +350,17 @@ def list_servers(request, detail=False):
 
     user_vms = utils.filter_modified_since(request, objects=user_vms)
 
-    servers_dict = [vm_to_dict(server, detail)
-                    for server in user_vms.order_by('id')]
+    # Use the stamps of the servers to build the ETag of the response and to
+    # skip serialization if the client has an up-to-date listing
+    stamps = get_server_stamps(user_vms)
+    etag = md5(repr((detail, request.serialization,
+                     request.GET.get("changes-since"), stamps))).hexdigest()
+    if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+        response = HttpResponse(status=304)
+        response["ETag"] = quote_etag(etag)
+        return response
+
+    servers_dict = servers_to_dicts(user_vms, stamps, detail)
 
     if request.serialization == 'xml':
         data = render_to_string('list_servers.xml', {
@@ -355,7 +369,59 @@ def list_servers(request, detail=False):
     else:
         data = json.dumps({'servers': servers_dict})
 
-    return HttpResponse(data, status=200)
+    response = HttpResponse(data, status=200)
+    response["ETag"] = quote_etag(etag)
+    return response
+
+
+def get_server_stamps(vms):
+    """Return a list of (id, stamp) tuples for the VMs, ordered by id.
+
+    The stamp of a VM changes every time that the VM, one of its NICs or one
+    of their IP addresses is updated.
+
+    """
+    vms = vms.annotate(nics_updated=Max("nics__updated"),
+                       ips_updated=Max("nics__ips__updated"))
+    vms = vms.values_list("id", "updated", "nics_updated", "ips_updated")
+    return [(vm_id, "%s/%s/%s" % (updated, nics_updated, ips_updated))
+            for vm_id, updated, nics_updated, ips_updated
+            in vms.order_by("id")]
+
+
+def servers_to_dicts(vms, stamps, detail=False):
+    """Render VMs to dictionaries, ordered by id.
+
+    Detailed renders are cached for CYCLADES_SERVERS_CACHE_TIMEOUT seconds,
+    keyed by the stamp of each VM, so that only new or modified VMs are
+    fetched from the DB and rendered.
+
+    """
+    timeout = settings.CYCLADES_SERVERS_CACHE_TIMEOUT
+    if not detail or timeout <= 0:
+        return [vm_to_dict(vm, detail) for vm in vms.order_by("id")]
+
+    keys = dict((vm_id, "cyclades:server:%s:%s" %
+                 (vm_id, md5(stamp).hexdigest()))
+                for vm_id, stamp in stamps)
+    cached = cache.get_many(keys.values())
+    rendered = dict((vm_id, cached[key]) for vm_id, key in keys.items()
+                    if key in cached)
+
+    missing = [vm_id for vm_id in keys if vm_id not in rendered]
+    if missing:
+        new = {}
+        # Stamps of the fetched VMs, which may have been modified meanwhile
+        new_stamps = dict(get_server_stamps(vms.filter(id__in=missing)))
+        for vm in vms.filter(id__in=missing):
+            rendered[vm.id] = vm_to_dict(vm, detail)
+            if vm.id in new_stamps:
+                key = "cyclades:server:%s:%s" % \
+                    (vm.id, md5(new_stamps[vm.id]).hexdigest())
+                new[key] = rendered[vm.id]
+        cache.set_many(new, timeout)
+
+    return [rendered[vm_id] for vm_id, _ in stamps if vm_id in rendered]
 
 
 @api.api_method(http_method='POST', user_required=True, logger=log)
@@ -120,6 +120,42 @@ class ServerAPITest(ComputeAPITest):
             self.assertEqual(api_vm['status'], get_rsapi_state(db_vm))
             self.assertSuccess(response)
 
+    def test_server_list_etag(self):
+        """Test conditional server listing and cached server details."""
+        user = self.user2
+        response = self.myget('servers/detail', user)
+        self.assertSuccess(response)
+        etag = response["ETag"]
+        servers = json.loads(response.content)['servers']
+        self.assertEqual(len(servers), 2)
+
+        response = self.myget('servers/detail', user,
+                              HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # The ETag differs between list and detail
+        response = self.myget('servers', user, HTTP_IF_NONE_MATCH=etag)
+        self.assertSuccess(response)
+
+        # Modifying a server changes the ETag and its cached details
+        self.vm2.name = "new_name"
+        self.vm2.save()
+        response = self.myget('servers/detail', user,
+                              HTTP_IF_NONE_MATCH=etag)
+        self.assertSuccess(response)
+        self.assertNotEqual(response["ETag"], etag)
+        servers = json.loads(response.content)['servers']
+        names = dict((s["id"], s["name"]) for s in servers)
+        self.assertEqual(names[self.vm2.id], "new_name")
+        self.assertEqual(names[self.vm4.id], self.vm4.name)
+
+        # Adding a NIC changes the ETag
+        etag = response["ETag"]
+        mfactory.NetworkInterfaceFactory(machine=self.vm4)
+        response = self.myget('servers/detail', user,
+                              HTTP_IF_NONE_MATCH=etag)
+        self.assertSuccess(response)
+        self.assertNotEqual(response["ETag"], etag)
+
     def test_server_detail(self):
         """Test if a server details are returned."""
         db_vm = self.vm2
@@ -16,6 +16,16 @@ POLL_LIMIT = 3600
 # Astakos groups that have access to '/admin' views.
 ADMIN_STATS_PERMITTED_GROUPS = ["admin-stats"]
 
+# Number of seconds to cache the statistics served by the '/admin' views.
+# A periodic 'snf-manage stats-cyclades --images True' run refreshes all
+# the cached statistics, which requires a cache backend shared between
+# processes (e.g. memcached). Set to 0 to disable caching.
+CYCLADES_STATS_CACHE_TIMEOUT = 300
+
+# Maximum number of backends to query concurrently when collecting
+# statistics.
+CYCLADES_STATS_WORKERS = 8
+
 #
 # Network Configuration
 #
@@ -63,6 +73,12 @@ API_ENABLED_NETWORK_FLAVORS = ['MAC_FILTERED']
 # filtering packets via ebtables.
 DEFAULT_MAC_FILTERED_BRIDGE = 'prv0'
 
+# Number of values stored in each chunk of newly created IP, MAC prefix and
+# bridge pools. Allocating or releasing a value loads, locks and rewrites only
+# the chunk that contains it. Must be a multiple of 8. Set to 0 to store new
+# pools as a single map. Existing pools are not affected.
+POOL_CHUNK_SIZE = 4096
+
 
 # Firewalling. Firewall tags should contain '%d' to be filled with the NIC
 # ID.
@@ -126,6 +142,12 @@ CYCLADES_SERVICE_TOKEN = ''
 # the id of the VM.
 CYCLADES_SERVERS_FQDN = 'snf-%(id)s.vm.example.synnefo.org'
 
+# Number of seconds to cache the rendered details of each server, used when
+# listing servers. The cached details of a server are invalidated when the
+# server, its NICs or their IP addresses are updated. Set to 0 to disable
+# caching.
+CYCLADES_SERVERS_CACHE_TIMEOUT = 300
+
 # Description of applied port forwarding rules (DNAT) for Cyclades VMs. This
 # setting contains a mapping from the port of each VM to a tuple contaning the
 # destination IP/hostname and the new port: (host, port). Instead of a tuple a
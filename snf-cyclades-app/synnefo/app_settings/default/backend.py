@@ -42,6 +42,21 @@ BACKEND_ALLOCATOR_MODULE = "synnefo.logic.allocators.default_allocator"
 # Refresh backend statistics timeout, in minutes, used in backend allocation
 BACKEND_REFRESH_MIN = 15
 
+# Maximum number of concurrent RAPI requests to each Ganeti backend. This is
+# the size of the pool of RAPI clients, and their HTTP connections, that is
+# kept for each backend.
+GANETI_RAPI_POOL_SIZE = 8
+
+# Maximum number of threads used to issue RAPI requests concurrently, e.g.
+# when reconciling or collecting statistics from many backends.
+GANETI_RAPI_WORKERS = 8
+
+# Number of seconds to cache the bulk listings of the instances and nodes of a
+# Ganeti backend. Concurrent identical listings are always issued once. Job
+# listings and the ones of the reconciler are never cached. Set to 0 to
+# disable caching.
+GANETI_RAPI_CACHE_TIMEOUT = 5
+
 # Maximum number of NICs per Ganeti instance. This value must be less or equal
 # than 'max:nic-count' option of Ganeti's ipolicy.
 GANETI_MAX_NICS_PER_INSTANCE = 8
@@ -17,5 +17,13 @@ DEFAULT_DISK_FORMAT = 'diskdump'
 ALLOWED_CONTAINER_FORMATS = ('aki', 'ari', 'ami', 'bare', 'ovf')
 DEFAULT_CONTAINER_FORMAT = 'bare'
 
+# Number of seconds to cache image lists. Set to 0 to disable caching.
+IMAGE_LIST_CACHE_TIMEOUT = 10
+# The Django cache to keep the image lists in, e.g.
+# "memcached://127.0.0.1:11211/". It must be shared by all Cyclades
+# processes, so that permission changes made by one of them are seen by the
+# rest. None uses the default Django cache.
+IMAGE_LIST_CACHE_BACKEND = None
+
 # The owner of the images that will be marked as "system images" by the UI
 SYSTEM_IMAGES_OWNER = 'okeanos'
@@ -870,6 +870,9 @@ class PoolTable(models.Model):
     # Optional Fields
     base = models.CharField(null=True, max_length=32)
     offset = models.IntegerField(null=True)
+    # Number of values per chunk for segmented pools. Zero means that the
+    # pool is stored as a single map in available_map/reserved_map.
+    chunk_size = models.IntegerField(null=False, default=0)
 
     class Meta:
         abstract = True
@@ -877,7 +880,11 @@ class PoolTable(models.Model):
     @classmethod
     def get_pool(cls):
         try:
-            pool_row = cls.objects.select_for_update().get()
+            pool_row = cls.objects.get()
+            if not pool_row.chunk_size or not pool_row.chunks.exists():
+                # Segmented pools lock only the chunks that they use, unless
+                # their chunks have not been created yet
+                pool_row = cls.objects.select_for_update().get(id=pool_row.id)
             return pool_row.pool
         except cls.DoesNotExist:
             raise pools.EmptyPool
@@ -886,6 +893,40 @@ class PoolTable(models.Model):
     def pool(self):
         return self.manager(self)
 
+    def get_chunks(self, indexes=None, lock=True):
+        chunks = self.chunks.order_by("index")
+        if indexes is not None:
+            chunks = chunks.filter(index__in=indexes)
+        if lock:
+            chunks = chunks.select_for_update()
+        return list(chunks)
+
+    def get_free_chunk_indexes(self, exclude=()):
+        chunks = self.chunks.filter(free__gt=0)
+        if exclude:
+            chunks = chunks.exclude(index__in=exclude)
+        return list(chunks.order_by("index").values_list("index", flat=True))
+
+    def count_free(self, exclude=()):
+        chunks = self.chunks.all()
+        if exclude:
+            chunks = chunks.exclude(index__in=exclude)
+        return chunks.aggregate(free=models.Sum("free"))["free"] or 0
+
+    def new_chunk(self, index):
+        return self.chunks.model(pool=self, index=index)
+
+
+class PoolChunk(models.Model):
+    """A segment of a PoolTable with 'chunk_size' values."""
+    index = models.IntegerField(null=False)
+    available_map = models.TextField(default="", null=False)
+    reserved_map = models.TextField(default="", null=False)
+    free = models.IntegerField(null=False, default=0)
+
+    class Meta:
+        abstract = True
+
 
 class BridgePoolTable(PoolTable):
     manager = pools.BridgePool
@@ -894,6 +935,14 @@ class BridgePoolTable(PoolTable):
         return u"<BridgePool id:%s>" % self.id
 
 
+class BridgePoolChunk(PoolChunk):
+    pool = models.ForeignKey(BridgePoolTable, related_name="chunks",
+                             null=False, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ("pool", "index")
+
+
 class MacPrefixPoolTable(PoolTable):
     manager = pools.MacPrefixPool
 
@@ -901,6 +950,14 @@ class MacPrefixPoolTable(PoolTable):
         return u"<MACPrefixPool id:%s>" % self.id
 
 
+class MacPrefixPoolChunk(PoolChunk):
+    pool = models.ForeignKey(MacPrefixPoolTable, related_name="chunks",
+                             null=False, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ("pool", "index")
+
+
 class IPPoolTable(PoolTable):
     manager = pools.IPPool
 
@@ -912,6 +969,14 @@ class IPPoolTable(PoolTable):
         return u"<IPv4AdressPool, Subnet: %s>" % self.subnet_id
 
 
+class IPPoolChunk(PoolChunk):
+    pool = models.ForeignKey(IPPoolTable, related_name="chunks",
+                             null=False, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ("pool", "index")
+
+
 @contextmanager
 def pooled_rapi_client(obj):
         if isinstance(obj, (VirtualMachine, BackendNetwork)):
@@ -46,6 +46,24 @@ class PoolManager(object):
     two string attributes (available_map and reserved_map) and the size of the
     pool.
 
+    If the object has a non-zero 'chunk_size' attribute, the bitarray is
+    stored segmented in chunks of 'chunk_size' values. Chunks are loaded
+    lazily and only the modified chunks are written back on save(), so that
+    getting or releasing a value costs O(chunk_size) instead of O(pool_size).
+    Segmented pool objects must implement the following methods:
+      * get_chunks(indexes=None, lock=True): Return the chunk objects with the
+        given indexes (or all chunks), ordered by index and optionally locked.
+      * get_free_chunk_indexes(exclude=()): Return the indexes of the chunks
+        that have available values, as last saved.
+      * count_free(exclude=()): Return the number of available values of the
+        chunks, as last saved.
+      * new_chunk(index): Return a new, unsaved chunk object.
+    Chunk objects have the 'index', 'available_map', 'reserved_map' and 'free'
+    attributes, and the save() and delete() methods. The whole-pool views
+    (pool, available, reserved, count_*, to_01) do not lock the chunks that
+    are not already loaded. Call load() to lock all the chunks, before
+    checking or updating the whole pool.
+
     Subclasses of PoolManager must implement value_to_index and index_to_value
     method's in order to denote how the value will be mapped to the index in
     the bitarray.
@@ -57,19 +75,59 @@ class PoolManager(object):
     def __init__(self, pool_table):
         self.pool_table = pool_table
         self.pool_size = pool_table.size
-        if pool_table.available_map:
+        self.chunk_size = getattr(pool_table, "chunk_size", None) or 0
+        # Whether the pool was just created, and must be initialized
+        self.created = False
+        if self.chunk_size:
+            assert(self.chunk_size % 8 == 0)
+            self.chunks = {}
+            self.dirty_chunks = set()
+            self.deleted_chunks = []
+            self._saved_size = self.pool_size
+            if not pool_table.get_chunks(indexes=[0], lock=False):
+                for index in xrange(self._chunk_count()):
+                    self._new_chunk(index)
+                self.created = True
+        elif pool_table.available_map:
             self.available = _bitarray_from_string(pool_table.available_map)
             self.reserved = _bitarray_from_string(pool_table.reserved_map)
         else:
             self.available = self._create_empty_pool(self.pool_size)
             self.reserved = self._create_empty_pool(self.pool_size)
             self.add_padding(self.pool_size)
+            self.created = True
 
     def _create_empty_pool(self, size):
         ba = bitarray(size)
         ba.setall(AVAILABLE)
         return ba
 
+    def _get_available(self):
+        if self.chunk_size:
+            return self._join_chunks(1)
+        return self._available
+
+    def _set_available(self, available):
+        if self.chunk_size:
+            self._split_chunks(1, available)
+        else:
+            self._available = available
+
+    available = property(_get_available, _set_available)
+
+    def _get_reserved(self):
+        if self.chunk_size:
+            return self._join_chunks(2)
+        return self._reserved
+
+    def _set_reserved(self, reserved):
+        if self.chunk_size:
+            self._split_chunks(2, reserved)
+        else:
+            self._reserved = reserved
+
+    reserved = property(_get_reserved, _set_reserved)
+
     def add_padding(self, pool_size):
         bits = find_padding(pool_size)
         self.available.extend([UNAVAILABLE] * bits)
@@ -87,13 +145,10 @@ class PoolManager(object):
     def get(self, value=None):
         """Get a value from the pool."""
         if value is None:
-            if self.empty():
+            values = self.get_many(1)
+            if not values:
                 raise EmptyPool
-            # Get the first available index
-            index = int(self.pool.index(AVAILABLE))
-            assert(index < self.pool_size)
-            self._reserve(index)
-            return self.index_to_value(index)
+            return values[0]
         else:
             if not self.contains(value):
                 raise InvalidValue("Value %s does not belong to pool." % value)
@@ -103,6 +158,61 @@ class PoolManager(object):
             else:
                 raise ValueNotAvailable("Value %s is not available" % value)
 
+    def get_many(self, count):
+        """Get up to 'count' values from the pool.
+
+        Return the list of reserved values, which is shorter than 'count' if
+        the pool does not have enough available values. The available values
+        are found with a single pass over the pool. Segmented pools prefer the
+        chunks that are already loaded, and then load only as many chunks as
+        needed.
+
+        No index of the first free value is kept: finding it with
+        bitarray.index() is cheap next to decoding the bitmap, and segmented
+        pools already skip the full chunks by their free counts.
+
+        """
+        if self.chunk_size:
+            return self._get_many_from_chunks(count)
+        values = []
+        for index in _find_available(self.pool, count, self.pool_size):
+            self._reserve(index)
+            values.append(self.index_to_value(index))
+        return values
+
+    def _get_many_from_chunks(self, count):
+        values = []
+        for chunk_index in sorted(self.chunks):
+            if len(values) >= count:
+                return values
+            values.extend(self._get_from_chunk(chunk_index,
+                                               count - len(values)))
+        if len(values) >= count:
+            return values
+        # The free counts are only a hint. The chunks are locked and checked
+        # again when they are loaded.
+        free_chunks = self.pool_table.get_free_chunk_indexes(
+            exclude=self.chunks.keys())
+        for chunk_index in free_chunks:
+            self._get_chunk(chunk_index)
+            values.extend(self._get_from_chunk(chunk_index,
+                                               count - len(values)))
+            if len(values) >= count:
+                break
+        return values
+
+    def _get_from_chunk(self, chunk_index, count):
+        _, available, reserved = self.chunks[chunk_index]
+        offset = chunk_index * self.chunk_size
+        values = []
+        for index in _find_available(available & reserved, count,
+                                     available.length()):
+            available[index] = UNAVAILABLE
+            values.append(self.index_to_value(offset + index))
+        if values:
+            self.dirty_chunks.add(chunk_index)
+        return values
+
     def put(self, value, external=False):
         """Return a value to the pool."""
         if value is None:
@@ -121,14 +231,44 @@ class PoolManager(object):
         return True
 
     def save(self, db=True):
-        """Save changes to the DB."""
+        """Save changes to the DB.
+
+        For segmented pools, only the modified chunks are saved and they are
+        always written to the DB. The 'db' argument only controls whether the
+        pool table object is saved, which is needed only after a resize.
+
+        """
+        if self.chunk_size:
+            self._save_chunks()
+            if db and self.pool_table.size != self._saved_size:
+                self.pool_table.save()
+                self._saved_size = self.pool_table.size
+            return
         self.pool_table.available_map = _bitarray_to_string(self.available)
         self.pool_table.reserved_map = _bitarray_to_string(self.reserved)
         if db:
             self.pool_table.save()
 
+    def _save_chunks(self):
+        for chunk in self.deleted_chunks:
+            chunk.delete()
+        self.deleted_chunks = []
+        for chunk_index in sorted(self.dirty_chunks):
+            chunk, available, reserved = self.chunks[chunk_index]
+            chunk.available_map = _bitarray_to_string(available)
+            chunk.reserved_map = _bitarray_to_string(reserved)
+            chunk.free = (available & reserved).count(AVAILABLE)
+            chunk.save()
+        self.dirty_chunks = set()
+
     def empty(self):
         """Return True when pool is empty."""
+        if self.chunk_size:
+            for _, available, reserved in self.chunks.values():
+                if (available & reserved).any():
+                    return False
+            return not self.pool_table.get_free_chunk_indexes(
+                exclude=self.chunks.keys())
         return not self.pool.any()
 
     def size(self):
@@ -136,16 +276,28 @@ class PoolManager(object):
         return self.pool.length()
 
     def _reserve(self, index, external=False):
+        available, reserved, index = self._locate(index, modify=True)
         if external:
-            self.reserved[index] = UNAVAILABLE
+            reserved[index] = UNAVAILABLE
         else:
-            self.available[index] = UNAVAILABLE
+            available[index] = UNAVAILABLE
 
     def _release(self, index, external=False):
+        available, reserved, index = self._locate(index, modify=True)
         if external:
-            self.reserved[index] = AVAILABLE
+            reserved[index] = AVAILABLE
         else:
-            self.available[index] = AVAILABLE
+            available[index] = AVAILABLE
+
+    def _locate(self, index, modify=False):
+        """Return the bitarrays that hold an index and its offset in them."""
+        if not self.chunk_size:
+            return self.available, self.reserved, index
+        chunk_index, index = divmod(index, self.chunk_size)
+        _, available, reserved = self._get_chunk(chunk_index)
+        if modify:
+            self.dirty_chunks.add(chunk_index)
+        return available, reserved, index
 
     def contains(self, value, index=False):
         if index is False:
@@ -153,6 +305,13 @@ class PoolManager(object):
         return index >= 0 and index < self.pool_size
 
     def count_available(self):
+        if self.chunk_size:
+            # Use the saved free counts of the chunks that are not loaded,
+            # instead of decoding them
+            count = sum((available & reserved).count(AVAILABLE)
+                        for _, available, reserved in self.chunks.values())
+            return count + self.pool_table.count_free(
+                exclude=self.chunks.keys())
         return self.pool.count(AVAILABLE)
 
     def count_unavailable(self):
@@ -171,7 +330,8 @@ class PoolManager(object):
             idx = self.value_to_index(value)
         else:
             idx = value
-        return self.pool[idx] == AVAILABLE
+        available, reserved, idx = self._locate(idx)
+        return available[idx] == AVAILABLE and reserved[idx] == AVAILABLE
 
     def is_reserved(self, value, index=False):
         if not self.contains(value, index=index):
@@ -180,7 +340,8 @@ class PoolManager(object):
             idx = self.value_to_index(value)
         else:
             idx = value
-        return self.reserved[idx] == UNAVAILABLE
+        _, reserved, idx = self._locate(idx)
+        return reserved[idx] == UNAVAILABLE
 
     def to_01(self):
         return self.pool[:self.pool_size].to01()
@@ -194,6 +355,7 @@ class PoolManager(object):
 
     def shrink(self, bits_num):
         assert(bits_num >= 0)
+        self.load()
         size = self.pool_size
         tmp = self.available[(size - bits_num): size]
         if tmp.count(UNAVAILABLE):
@@ -203,6 +365,9 @@ class PoolManager(object):
     def resize(self, bits_num):
         if bits_num == 0:
             return
+        if self.chunk_size:
+            self._resize_chunks(bits_num)
+            return
         # Cut old padding
         self.cut_padding(self.pool_size)
         # Do the resize
@@ -217,6 +382,103 @@ class PoolManager(object):
         self.add_padding(self.pool_size)
         self.pool_table.size = self.pool_size
 
+    def _resize_chunks(self, bits_num):
+        self._load_chunks()
+        old_count = self._chunk_count()
+        self.pool_size = self.pool_size + bits_num
+        new_count = self._chunk_count()
+        for chunk_index in xrange(new_count, old_count):
+            chunk, _, _ = self.chunks.pop(chunk_index)
+            self.dirty_chunks.discard(chunk_index)
+            self.deleted_chunks.append(chunk)
+        for chunk_index in xrange(min(old_count, new_count)):
+            _, available, reserved = self.chunks[chunk_index]
+            length = self._chunk_length(chunk_index)
+            if length == available.length():
+                continue
+            elif length > available.length():
+                extra = length - available.length()
+                available.extend([AVAILABLE] * extra)
+                reserved.extend([AVAILABLE] * extra)
+            else:
+                del available[length:]
+                del reserved[length:]
+            self.dirty_chunks.add(chunk_index)
+        for chunk_index in xrange(old_count, new_count):
+            self._new_chunk(chunk_index)
+        self.pool_table.size = self.pool_size
+
+    def _chunk_count(self):
+        return (self.pool_size + self.chunk_size - 1) // self.chunk_size
+
+    def _chunk_length(self, chunk_index):
+        return min(self.chunk_size,
+                   self.pool_size - chunk_index * self.chunk_size)
+
+    def _new_chunk(self, chunk_index):
+        chunk = self.pool_table.new_chunk(chunk_index)
+        length = self._chunk_length(chunk_index)
+        self.chunks[chunk_index] = [chunk, self._create_empty_pool(length),
+                                    self._create_empty_pool(length)]
+        self.dirty_chunks.add(chunk_index)
+
+    def _read_chunk(self, chunk):
+        length = self._chunk_length(chunk.index)
+        available = _bitarray_from_string(chunk.available_map)[:length]
+        reserved = _bitarray_from_string(chunk.reserved_map)[:length]
+        return [chunk, available, reserved]
+
+    def _add_chunk(self, chunk):
+        self.chunks[chunk.index] = self._read_chunk(chunk)
+
+    def _get_chunk(self, chunk_index):
+        if chunk_index not in self.chunks:
+            chunks = self.pool_table.get_chunks(indexes=[chunk_index])
+            if not chunks:
+                raise InvalidValue("Chunk %s does not exist" % chunk_index)
+            self._add_chunk(chunks[0])
+        return self.chunks[chunk_index]
+
+    def load(self):
+        """Load and lock all the chunks of a segmented pool.
+
+        Non-segmented pools are loaded as a whole when they are created.
+
+        """
+        if self.chunk_size:
+            self._load_chunks()
+
+    def _load_chunks(self):
+        """Load all the chunks of the pool."""
+        if len(self.chunks) < self._chunk_count():
+            for chunk in self.pool_table.get_chunks():
+                if chunk.index not in self.chunks:
+                    self._add_chunk(chunk)
+
+    def _join_chunks(self, position):
+        """Join the chunks, reading without locking the ones not loaded."""
+        chunks = dict(self.chunks)
+        if len(chunks) < self._chunk_count():
+            for chunk in self.pool_table.get_chunks(lock=False):
+                if chunk.index not in chunks:
+                    chunks[chunk.index] = self._read_chunk(chunk)
+        joined = bitarray()
+        for chunk_index in xrange(self._chunk_count()):
+            joined.extend(chunks[chunk_index][position])
+        joined.extend([UNAVAILABLE] * find_padding(self.pool_size))
+        return joined
+
+    def _split_chunks(self, position, bits):
+        """Copy a whole-pool bitarray to the chunks that differ from it."""
+        self._load_chunks()
+        for chunk_index in xrange(self._chunk_count()):
+            chunk = self.chunks[chunk_index]
+            offset = chunk_index * self.chunk_size
+            part = bits[offset:offset + self._chunk_length(chunk_index)]
+            if part != chunk[position]:
+                chunk[position] = part
+                self.dirty_chunks.add(chunk_index)
+
     def index_to_value(self, index):
         raise NotImplementedError
 
@@ -244,6 +506,22 @@ def find_padding(size):
     return extra and (8 - extra) or 0
 
 
+def _find_available(pool, count, limit):
+    """Return up to 'count' indexes of available values below 'limit'."""
+    indexes = []
+    index = 0
+    while len(indexes) < count:
+        try:
+            index = int(pool.index(AVAILABLE, index))
+        except ValueError:
+            break
+        if index >= limit:
+            break
+        indexes.append(index)
+        index += 1
+    return indexes
+
+
 def bitarray_to_01(bitarray_):
     return bitarray_.to01()
 
@@ -277,9 +555,8 @@ class BridgePool(PoolManager):
 
 class MacPrefixPool(PoolManager):
     def __init__(self, pool_table):
-        do_init = False if pool_table.available_map else True
         super(MacPrefixPool, self).__init__(pool_table)
-        if do_init:
+        if self.created:
             for i in xrange(1, self.pool_size):
                 if not self.validate_mac(self.index_to_value(i)):
                     self._reserve(i, external=True)
@@ -310,12 +587,8 @@ class IPPool(PoolManager):
         self.net = ipaddr.IPNetwork(subnet.cidr)
         self.offset = pool_table.offset
         self.base = pool_table.base
-        if pool_table.available_map:
-            initialized_pool = True
-        else:
-            initialized_pool = False
         super(IPPool, self).__init__(pool_table)
-        if not initialized_pool:
+        if self.created:
             self.check_pool_integrity()
 
     def check_pool_integrity(self):
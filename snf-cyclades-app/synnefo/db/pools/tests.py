@@ -51,6 +51,48 @@ class DummyObject():
         pass
 
 
+class DummyChunk():
+    def __init__(self, chunks, index):
+        self.chunks = chunks
+        self.index = index
+        self.available_map = ''
+        self.reserved_map = ''
+        self.free = 0
+        self.saves = 0
+
+    def save(self):
+        self.chunks[self.index] = self
+        self.saves += 1
+
+    def delete(self):
+        del self.chunks[self.index]
+
+
+class DummySegmentedObject(DummyObject):
+    def __init__(self, size, chunk_size):
+        DummyObject.__init__(self, size)
+        self.chunk_size = chunk_size
+        self.chunks = {}
+        self.locked = set()
+
+    def get_chunks(self, indexes=None, lock=True):
+        if indexes is None:
+            indexes = self.chunks.keys()
+        if lock:
+            self.locked.update(i for i in indexes if i in self.chunks)
+        return [self.chunks[i] for i in sorted(indexes) if i in self.chunks]
+
+    def get_free_chunk_indexes(self, exclude=()):
+        return [i for i in sorted(self.chunks)
+                if self.chunks[i].free and i not in exclude]
+
+    def count_free(self, exclude=()):
+        return sum(c.free for i, c in self.chunks.items() if i not in exclude)
+
+    def new_chunk(self, index):
+        return DummyChunk(self.chunks, index)
+
+
 class DummyPool(PoolManager):
     def value_to_index(self, index):
         return index
@@ -87,6 +129,18 @@ class PoolManagerTestCase(TestCase):
         self.assertEqual(pool.empty(), True)
         self.assertRaises(EmptyPool, pool.get)
 
+    def test_get_many(self):
+        obj = DummyObject(42)
+        pool = DummyPool(obj)
+        pool.reserve(1, external=True)
+        pool.reserve(3)
+        self.assertEqual(pool.get_many(3), [0, 2, 4])
+        self.assertEqual(pool.get(), 5)
+        values = pool.get_many(100)
+        self.assertEqual(values, range(6, 42))
+        self.assertEqual(pool.empty(), True)
+        self.assertEqual(pool.get_many(1), [])
+
     def test_reserved_value(self):
         obj = DummyObject(42)
         pool = DummyPool(obj)
@@ -157,6 +211,97 @@ class PoolManagerTestCase(TestCase):
         self.assertEqual(pool.count_unreserved(), 9)
 
 
+class SegmentedPoolTestCase(TestCase):
+    def test_created_pool(self):
+        obj = DummySegmentedObject(42, 16)
+        pool = DummyPool(obj)
+        self.assertEqual(pool.to_01(), '1' * 42)
+        self.assertEqual(pool.available, bitarray('1' * 42 + '0' * 6))
+        pool.save()
+        self.assertEqual(sorted(obj.chunks), [0, 1, 2])
+        self.assertEqual([c.free for c in obj.get_chunks()], [16, 16, 10])
+
+    def test_save_only_modified_chunks(self):
+        obj = DummySegmentedObject(42, 16)
+        DummyPool(obj).save()
+        pool = DummyPool(obj)
+        self.assertEqual(pool.get(20), 20)
+        self.assertEqual(pool.chunks.keys(), [1])
+        pool.save()
+        self.assertEqual([c.saves for c in obj.get_chunks()], [1, 2, 1])
+        self.assertEqual(obj.chunks[1].free, 15)
+        pool = DummyPool(obj)
+        self.assertEqual(pool.is_available(20), False)
+        self.assertEqual(pool.is_available(21), True)
+
+    def test_get_many(self):
+        obj = DummySegmentedObject(42, 16)
+        pool = DummyPool(obj)
+        pool.reserve(1, external=True)
+        pool.reserve(3)
+        self.assertEqual(pool.get_many(3), [0, 2, 4])
+        self.assertEqual(pool.get(), 5)
+        pool.save()
+        pool = DummyPool(obj)
+        values = pool.get_many(100)
+        self.assertEqual(values, range(6, 42))
+        self.assertEqual(pool.empty(), True)
+        self.assertEqual(pool.get_many(1), [])
+        self.assertRaises(EmptyPool, pool.get)
+        pool.save()
+        self.assertEqual(obj.get_free_chunk_indexes(), [])
+        pool = DummyPool(obj)
+        pool.put(33)
+        self.assertEqual(pool.empty(), False)
+        self.assertEqual(pool.get(), 33)
+
+    def test_resize(self):
+        obj = DummySegmentedObject(42, 16)
+        pool = DummyPool(obj)
+        pool.extend(7)
+        self.assertEqual(pool.to_01(), '1' * 49)
+        pool.save()
+        self.assertEqual(sorted(obj.chunks), [0, 1, 2, 3])
+        self.assertEqual(obj.size, 49)
+        pool = DummyPool(obj)
+        pool.shrink(20)
+        pool.save()
+        self.assertEqual(sorted(obj.chunks), [0, 1])
+        pool = DummyPool(obj)
+        self.assertEqual(pool.to_01(), '1' * 29)
+        self.assertEqual(pool.count_available(), 29)
+        self.assertEqual(pool.size(), 32)
+
+    def test_views_do_not_lock(self):
+        obj = DummySegmentedObject(42, 16)
+        DummyPool(obj).save()
+        pool = DummyPool(obj)
+        pool.get(20)
+        self.assertEqual(obj.locked, set([1]))
+        self.assertEqual(pool.count_available(), 41)
+        self.assertEqual(pool.chunks.keys(), [1])
+        self.assertEqual(pool.to_01(), '1' * 20 + '0' + '1' * 21)
+        self.assertEqual(obj.locked, set([1]))
+        self.assertEqual(pool.chunks.keys(), [1])
+        pool.load()
+        self.assertEqual(obj.locked, set([0, 1, 2]))
+
+    def test_set_available(self):
+        obj = DummySegmentedObject(42, 16)
+        DummyPool(obj).save()
+        pool = DummyPool(obj)
+        available = pool.available
+        available[3] = False
+        available[40] = False
+        pool.available = available
+        self.assertEqual(pool.dirty_chunks, set([0, 2]))
+        pool.save()
+        self.assertEqual([c.saves for c in obj.get_chunks()], [2, 1, 2])
+        pool = DummyPool(obj)
+        self.assertEqual(pool.to_01(), '1' * 3 + '0' + '1' * 36 + '01')
+        self.assertEqual(pool.count_available(), 40)
+
+
 class HelpersTestCase(TestCase):
     def test_find_padding(self):
         self.assertEqual(find_padding(1), 7)
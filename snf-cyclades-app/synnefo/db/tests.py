@@ -237,6 +237,24 @@ class BridgePoolTest(TestCase):
         mfact.BridgePoolTableFactory()
         self.assertRaises(MultipleObjectsReturned, BridgePoolTable.get_pool)
 
+    def test_segmented_pool(self):
+        pool_row = mfact.BridgePoolTableFactory(size=20, chunk_size=8)
+        with patch("synnefo.db.models.BridgePoolTable.objects") as objects:
+            objects.get.return_value = pool_row
+            objects.select_for_update.return_value.get.return_value = \
+                pool_row
+            # The pool row is locked until the chunks of the pool exist
+            BridgePoolTable.get_pool().save()
+            self.assertTrue(objects.select_for_update.called)
+            objects.select_for_update.reset_mock()
+            pool = BridgePoolTable.get_pool()
+            self.assertFalse(objects.select_for_update.called)
+        self.assertEqual([c.index for c in pool_row.get_chunks(lock=False)],
+                         [0, 1, 2])
+        self.assertEqual(pool.get(), "snf-link-1")
+        pool.save()
+        self.assertEqual(pool_row.count_free(), 19)
+
 
 class AESTest(TestCase):
     def test_encrypt_decrtypt(self):
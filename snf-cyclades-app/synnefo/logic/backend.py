@@ -30,6 +30,9 @@
 # documentation are those of the authors and should not be
 # interpreted as representing official policies, either expressed
 # or implied, of GRNET S.A.
+import Queue
+import threading
+
 from django.conf import settings
 from django.db import transaction
 from datetime import datetime, timedelta
@@ -43,6 +46,7 @@ from synnefo import quotas
 from synnefo.api.util import release_resource
 from synnefo.util.mac2eui64 import mac2eui64
 from synnefo.logic import rapi
+from synnefo.logic.rapi_pool import cached_call, map_concurrently
 
 from logging import getLogger
 log = getLogger(__name__)
@@ -1002,19 +1006,34 @@ def set_firewall_profile(vm, profile, nic):
     return None
 
 
-def get_instances(backend, bulk=True):
-    with pooled_rapi_client(backend) as c:
-        return c.GetInstances(bulk=bulk)
+def _cached_rapi_call(backend, method, bulk, cache=True):
+    """Issue a listing RAPI call, shared with identical concurrent calls.
 
+    Bulk listings are also cached for GANETI_RAPI_CACHE_TIMEOUT seconds. If
+    'cache' is False, the call is always issued and its result is not shared.
+
+    """
+    def call():
+        with pooled_rapi_client(backend) as c:
+            return getattr(c, method)(bulk=bulk)
+    if not cache:
+        return call()
+    key = (backend.id, backend.hash, method, bulk)
+    timeout = settings.GANETI_RAPI_CACHE_TIMEOUT if bulk else 0
+    return cached_call(key, call, timeout)
 
-def get_nodes(backend, bulk=True):
-    with pooled_rapi_client(backend) as c:
-        return c.GetNodes(bulk=bulk)
+
+def get_instances(backend, bulk=True, cache=True):
+    return _cached_rapi_call(backend, "GetInstances", bulk, cache)
+
+
+def get_nodes(backend, bulk=True, cache=True):
+    return _cached_rapi_call(backend, "GetNodes", bulk, cache)
 
 
 def get_jobs(backend, bulk=True):
-    with pooled_rapi_client(backend) as c:
-        return c.GetJobs(bulk=bulk)
+    # Job listings are never cached, since jobs change status constantly
+    return _cached_rapi_call(backend, "GetJobs", bulk, cache=False)
 
 
 def get_physical_resources(backend):
@@ -1109,6 +1128,44 @@ def create_network_synced(network, backend):
     return result
 
 
+def create_networks_synced(networks, backend):
+    """Create and connect many networks to a backend.
+
+    The jobs of all networks are waited for at once. Return a dictionary
+    mapping each network to the (status, error) of its first failed job, or
+    to ('success', None).
+
+    """
+    results = dict((network, (rapi.JOB_STATUS_SUCCESS, None))
+                   for network in networks)
+    waiter = JobWaiter()
+    try:
+        for network in networks:
+            job = _create_network(network, backend)
+            waiter.add(backend, job, key=network)
+        created = []
+        for network, status, error in waiter:
+            if status == rapi.JOB_STATUS_SUCCESS:
+                created.append(network)
+            else:
+                results[network] = (status, error)
+
+        with pooled_rapi_client(backend) as client:
+            groups = client.GetGroups()
+            for network in created:
+                for group in groups:
+                    job = client.ConnectNetwork(network.backend_id, group,
+                                                network.mode, network.link)
+                    waiter.add(backend, job, key=network)
+        for network, status, error in waiter:
+            if status != rapi.JOB_STATUS_SUCCESS and \
+                    results[network][0] == rapi.JOB_STATUS_SUCCESS:
+                results[network] = (status, error)
+    finally:
+        waiter.close()
+    return results
+
+
 def _create_network_synced(network, backend):
     with pooled_rapi_client(backend) as client:
         job = _create_network(network, backend)
@@ -1128,21 +1185,172 @@ def connect_network_synced(network, backend):
     return result
 
 
-def wait_for_job(client, jobid):
-    result = client.WaitForJobChange(jobid, ['status', 'opresult'], None, None)
-    status = result['job_info'][0]
-    while status not in rapi.JOB_STATUS_FINALIZED:
-        result = client.WaitForJobChange(jobid, ['status', 'opresult'],
-                                         [result], None)
-        status = result['job_info'][0]
+def _wait_for_job_change(client, jobid, result=None):
+    """Wait for a change of the status of a job.
+
+    Return the new result of WaitForJobChange, given the previous one. RAPI
+    returns None if the job has not changed before its wait timeout expires,
+    in which case the previous result is returned.
 
+    """
+    if result is None:
+        prev_job_info, prev_log_serial = None, None
+    else:
+        prev_job_info = result['job_info']
+        log_entries = result.get('log_entries') or []
+        prev_log_serial = max([entry[0] for entry in log_entries] or [None])
+    new_result = client.WaitForJobChange(jobid, ['status', 'opresult'],
+                                         prev_job_info, prev_log_serial)
+    if new_result is None:
+        return result
+    if result is not None and not new_result.get('log_entries'):
+        # Keep the serial of the last seen log entry
+        new_result['log_entries'] = result.get('log_entries')
+    return new_result
+
+
+def _job_result(job_info):
+    status = job_info[0]
     if status == rapi.JOB_STATUS_SUCCESS:
         return (status, None)
     else:
-        error = result['job_info'][1]
+        error = job_info[1]
         return (status, error)
 
 
+def wait_for_job(client, jobid):
+    result = None
+    while result is None or \
+            result['job_info'][0] not in rapi.JOB_STATUS_FINALIZED:
+        result = _wait_for_job_change(client, jobid, result)
+    return _job_result(result['job_info'])
+
+
+class JobWaiter(object):
+    """Wait for many Ganeti jobs at once, by polling their backends.
+
+    Jobs are added with 'add' and their results are returned by 'wait' as
+    soon as they are finalized, in the order they finish. A single thread
+    polls the status of the pending jobs of each backend, at most 'workers'
+    backends concurrently. Polls start every 'interval' seconds, and back
+    off up to 'max_interval' seconds while no job finishes.
+
+    """
+    def __init__(self, workers=None, interval=2, max_interval=30):
+        if workers is None:
+            workers = settings.GANETI_RAPI_WORKERS
+        self.workers = workers
+        self.interval = interval
+        self.max_interval = max_interval
+        self.delay = interval
+        self.thread = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        # Backend ID -> (backend, {job ID: key})
+        self.pending = {}
+        self.finished = Queue.Queue()
+        self.count = 0
+
+    def add(self, backend, job_id, key=None):
+        """Wait for job 'job_id' of 'backend'.
+
+        The 'key' is returned together with the result of the job, and
+        defaults to the job ID. The backend object is used from the polling
+        thread and must not need any DB queries.
+
+        """
+        if key is None:
+            key = job_id
+        with self.lock:
+            _, jobs = self.pending.setdefault(backend.id, (backend, {}))
+            jobs[int(job_id)] = key
+            self.delay = self.interval
+        self.count += 1
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._poll)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def __len__(self):
+        """Return the number of jobs that have not been returned yet."""
+        return self.count
+
+    def wait(self, timeout=None):
+        """Return the (key, status, error) of the next finalized job.
+
+        Return None if there are no jobs or if 'timeout' expires.
+
+        """
+        if not self.count:
+            return None
+        try:
+            # Queue.get without a timeout cannot be interrupted
+            result = self.finished.get(timeout=timeout or 2 ** 31)
+        except Queue.Empty:
+            return None
+        self.count -= 1
+        return result
+
+    def __iter__(self):
+        while self.count:
+            yield self.wait()
+
+    def close(self):
+        """Stop the polling thread, abandoning any pending jobs."""
+        self.stopped.set()
+        with self.lock:
+            self.pending = {}
+
+    def _poll(self):
+        while not self.stopped.wait(self.delay):
+            with self.lock:
+                backends = [(backend, jobs.keys())
+                            for backend, jobs in self.pending.values()
+                            if jobs]
+            finished = 0
+            if backends:
+                finished = sum(map_concurrently(self._poll_backend, backends,
+                                                self.workers))
+            with self.lock:
+                if finished:
+                    self.delay = self.interval
+                else:
+                    self.delay = min(self.delay * 2, self.max_interval)
+
+    def _poll_backend(self, item):
+        """Query the status of the given jobs of a backend.
+
+        Return the number of jobs that were finalized.
+
+        """
+        backend, job_ids = item
+        finished = 0
+        try:
+            with pooled_rapi_client(backend) as client:
+                for job_id in job_ids:
+                    job_info = client.GetJobStatus(job_id)
+                    if job_info["status"] in rapi.JOB_STATUS_FINALIZED:
+                        status, error = _job_result([job_info["status"],
+                                                     job_info["opresult"]])
+                        self._finish(backend, job_id, status, error)
+                        finished += 1
+        except Exception as e:
+            log.error("Error while polling the jobs of backend %s: %s",
+                      backend, e)
+            for job_id in job_ids:
+                self._finish(backend, job_id, rapi.JOB_STATUS_ERROR, str(e))
+            finished = len(job_ids)
+        return finished
+
+    def _finish(self, backend, job_id, status, error):
+        with self.lock:
+            _, jobs = self.pending.get(backend.id, (None, {}))
+            if job_id not in jobs:
+                return
+            key = jobs.pop(job_id)
+        self.finished.put((key, status, error))
+
+
 def create_job_dependencies(job_ids=[], job_states=None):
     """Transform a list of job IDs to Ganeti 'depends' attribute."""
     if job_states is None:
@@ -50,12 +50,9 @@ class BackendAllocator():
         """Allocate a vm of the specified flavor to a backend.
 
         Warning!!: An explicit commit is required after calling this function,
-        in order to release the locks acquired by the get_available_backends
-        function.
+        in order to release the lock acquired on the selected backend.
 
         """
-
-        backend = None
         backend = get_backend_for_user(userid)
         if backend:
             return backend
@@ -77,6 +74,9 @@ class BackendAllocator():
         # Find the best backend to host the vm, based on the allocation
         # strategy
         backend = self.strategy_mod.allocate(available_backends, vm)
+        if backend is None:
+            log.warning("No backend can host VM %r", vm)
+            return None
 
         log.info("Allocated VM %r, in backend %s", vm, backend)
 
@@ -97,6 +97,10 @@ def get_available_backends(flavor):
     the backends that do not have an available public IPv4 address are
     excluded.
 
+    The backends are not locked, since only the backends that will be selected
+    need to be updated. The resources of the backends that are older than
+    BACKEND_REFRESH_MIN are refreshed before the allocation.
+
     """
     disk_template = flavor.disk_template
     # Ganeti knows only the 'ext' disk template, but the flavors disk template
@@ -104,8 +108,7 @@ def get_available_backends(flavor):
     if disk_template.startswith("ext_"):
         disk_template = "ext"
 
-    backends = Backend.objects.select_for_update().filter(offline=False,
-                                                          drained=False)
+    backends = Backend.objects.filter(offline=False, drained=False)
     # Update the disk_templates if there are empty.
     [backend_mod.update_backend_disk_templates(b)
      for b in backends if not b.disk_templates]
@@ -134,15 +137,17 @@ def reduce_backend_resources(backend, vm):
     Reduce the free resources of the backend by the size of the of the vm that
     will host. This is an underestimation of the backend capabilities.
 
-    """
-
-    new_mfree = backend.mfree - vm['ram']
-    new_dfree = backend.dfree - vm['disk']
-    backend.mfree = 0 if new_mfree < 0 else new_mfree
-    backend.dfree = 0 if new_dfree < 0 else new_dfree
-    backend.pinst_cnt += 1
+    The backend is locked and refetched, in order to not overwrite concurrent
+    updates of its resources.
 
-    backend.save()
+    """
+    db_backend = Backend.objects.select_for_update().get(id=backend.id)
+    new_mfree = db_backend.mfree - vm['ram']
+    new_dfree = db_backend.dfree - vm['disk']
+    db_backend.mfree = 0 if new_mfree < 0 else new_mfree
+    db_backend.dfree = 0 if new_dfree < 0 else new_dfree
+    db_backend.pinst_cnt += 1
+    db_backend.save()
 
 
 def refresh_backends_stats(backends):
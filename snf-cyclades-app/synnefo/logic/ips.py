@@ -32,9 +32,10 @@
 # or implied, of GRNET S.A.
 
 import logging
+from random import shuffle
 
 from snf_django.lib.api import faults
-from django.db import transaction
+from django.db import connection, transaction, DatabaseError
 from synnefo import quotas
 from synnefo.db import pools
 from synnefo.db.models import (IPPoolTable, IPAddress, Network)
@@ -109,9 +110,22 @@ def allocate_public_ip(userid, floating_ip=False, backend=None, networks=None):
     be used.
 
     """
+    return allocate_public_ips(userid, 1, floating_ip=floating_ip,
+                               backend=backend, networks=networks)[0]
 
-    ip_pool_rows = IPPoolTable.objects.select_for_update()\
-        .prefetch_related("subnet__network")\
+
+def allocate_public_ips(userid, count, floating_ip=False, backend=None,
+                        networks=None):
+    """Try to allocate 'count' public or floating IP addresses.
+
+    Same as 'allocate_public_ip', but allocates a batch of addresses, locking
+    each pool only once. The pools are tried in random order and, where the
+    database supports it, pools that are locked by concurrent allocations are
+    skipped and only used if the rest of the pools are full. This way
+    concurrent allocations do not serialize on the same pool rows.
+
+    """
+    ip_pool_rows = IPPoolTable.objects\
         .filter(subnet__deleted=False)\
         .filter(subnet__network__deleted=False)\
         .filter(subnet__network__public=True)\
@@ -124,22 +138,72 @@ def allocate_public_ip(userid, floating_ip=False, backend=None, networks=None):
     if backend is not None:
         ip_pool_rows = ip_pool_rows\
             .filter(subnet__network__backend_networks__backend=backend)
+    pool_ids = list(ip_pool_rows.values_list("id", flat=True).distinct())
+    shuffle(pool_ids)
 
-    try:
-        return allocate_ip_from_pools(ip_pool_rows, userid,
-                                      floating_ip=floating_ip)
-    except pools.EmptyPool:
-        ip_type = "floating" if floating_ip else "public"
-        log_msg = "Failed to allocate a %s IP. Reason:" % ip_type
-        if ip_pool_rows:
-            log_msg += " No network exists."
-        else:
-            log_msg += " All network are full."
-        if backend is not None:
-            log_msg += " Backend: %s" % backend
-        log.error(log_msg)
-        exception_msg = "Cannot allocate a %s IP address." % ip_type
-        raise faults.Conflict(exception_msg)
+    ipaddresses = []
+    for pool_row in lock_pool_rows(IPPoolTable, pool_ids):
+        pool = pool_row.pool
+        values = pool.get_many(count - len(ipaddresses))
+        if not values:
+            continue
+        pool.save()
+        subnet = pool_row.subnet
+        for value in values:
+            ipaddress = IPAddress.objects.create(subnet=subnet,
+                                                 network=subnet.network,
+                                                 userid=userid,
+                                                 address=value,
+                                                 floating_ip=floating_ip,
+                                                 ipversion=4)
+            ipaddresses.append(ipaddress)
+        if len(ipaddresses) == count:
+            return ipaddresses
+
+    ip_type = "floating" if floating_ip else "public"
+    log_msg = "Failed to allocate %s %s IP(s). Reason:" % (count, ip_type)
+    if not pool_ids:
+        log_msg += " No network exists."
+    else:
+        log_msg += " All network are full."
+    if backend is not None:
+        log_msg += " Backend: %s" % backend
+    log.error(log_msg)
+    exception_msg = "Cannot allocate a %s IP address." % ip_type
+    raise faults.Conflict(exception_msg)
+
+
+def lock_pool_rows(model, pool_ids):
+    """Lock and yield the pool rows with the given ids, one at a time.
+
+    If the database supports 'NOWAIT' locks, the rows that are already locked
+    by other transactions are skipped, and are locked (waiting for the other
+    transactions) only after all the other rows have been yielded.
+
+    """
+    skipped = pool_ids
+    if connection.features.has_select_for_update_nowait:
+        skipped = []
+        for pool_id in pool_ids:
+            sid = transaction.savepoint()
+            try:
+                pool_row = model.objects.select_for_update(nowait=True)\
+                                        .get(id=pool_id)
+            except DatabaseError:
+                transaction.savepoint_rollback(sid)
+                skipped.append(pool_id)
+                continue
+            except model.DoesNotExist:
+                transaction.savepoint_commit(sid)
+                continue
+            transaction.savepoint_commit(sid)
+            yield pool_row
+
+    for pool_id in skipped:
+        try:
+            yield model.objects.select_for_update().get(id=pool_id)
+        except model.DoesNotExist:
+            continue
 
 
 @transaction.commit_on_success
@@ -139,18 +139,13 @@ def create_backend(clustername, port, username, password, hypervisor=None,
 
         for net in networks:
             net.create_backend_network(backend)
-            result = backend_mod.create_network_synced(net, backend)
-            if result[0] != "success":
+        # Create and connect all networks, waiting for their jobs at once
+        results = backend_mod.create_networks_synced(networks, backend)
+        for net in networks:
+            status, error = results[net]
+            if status != "success":
                 stream.write('\nError Creating Network %s: %s\n' %
-                             (net.backend_id, result[1]))
-            else:
-                stream.write('Successfully created Network: %s\n' %
-                             net.backend_id)
-            result = backend_mod.connect_network_synced(network=net,
-                                                        backend=backend)
-            if result[0] != "success":
-                stream.write('\nError Connecting Network %s: %s\n' %
-                             (net.backend_id, result[1]))
+                             (net.backend_id, error))
             else:
-                stream.write('Successfully connected Network: %s\n' %
-                             net.backend_id)
+                stream.write('Successfully created and connected Network:'
+                             ' %s\n' % net.backend_id)
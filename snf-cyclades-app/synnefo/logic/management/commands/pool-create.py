@@ -31,6 +31,7 @@
 # interpreted as representing official policies, either expressed
 # or implied, of GRNET S.A.
 
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from optparse import make_option
 from synnefo.db.utils import validate_mac
@@ -84,8 +85,12 @@ class Command(BaseCommand):
         if pool_table.objects.exists():
             raise CommandError("Pool of type %s already exists" % type_)
 
-        pool_table.objects.create(available_map="",
-                                  reserved_map="",
-                                  size=size,
-                                  base=base,
-                                  offset=offset)
+        pool_row = pool_table.objects.create(
+            available_map="",
+            reserved_map="",
+            size=size,
+            base=base,
+            offset=offset,
+            chunk_size=settings.POOL_CHUNK_SIZE)
+        # Initialize the pool, creating all the chunks of segmented pools
+        pool_row.pool.save()
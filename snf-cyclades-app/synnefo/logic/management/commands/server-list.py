@@ -135,9 +135,12 @@ class Command(ListCommand):
 
     def handle_db_objects(self, rows, *args, **kwargs):
         if "image.name" in self.fields:
-            icache = ImageCache()
+            # Called once for each chunk of servers. Keep the image names
+            # across chunks.
+            if not hasattr(self, "icache"):
+                self.icache = ImageCache()
             for vm in rows:
-                vm.image = icache.get_image(vm.imageid, vm.userid)
+                vm.image = self.icache.get_image(vm.imageid, vm.userid)
 
 
 class ImageCache(object):
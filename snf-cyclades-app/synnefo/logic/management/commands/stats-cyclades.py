@@ -82,6 +82,12 @@ class Command(SynnefoCommand):
                     metavar="True|False",
                     choices=["True", "False"],
                     help="Include statistics about images."),
+        make_option("--cached",
+                    dest="cached",
+                    default=False,
+                    action="store_true",
+                    help="Show the cached statistics snapshot, if it has not"
+                         " expired, instead of computing them."),
     )
 
     def handle(self, *args, **options):
@@ -96,8 +102,12 @@ class Command(SynnefoCommand):
         networks = parse_bool(options["networks"])
         images = parse_bool(options["images"])
 
-        stats = statistics.get_cyclades_stats(backend, clusters, servers,
-                                              resources, networks, images)
+        # Computed statistics always refresh the cached sections, so that
+        # running this command periodically keeps the '/admin' views warm.
+        # The views also include the image statistics.
+        stats = statistics.get_cached_cyclades_stats(
+            backend, clusters, servers, resources, networks, images,
+            refresh=not options["cached"])
 
         output_format = options["output_format"]
         if output_format == "json":
@@ -191,6 +191,8 @@ class GanetiRapiClient(object): # pylint: disable=R0904
       raise Error("Specified password without username")
 
     self._auth = (username, password)
+    # Reuse HTTP connections (keep-alive) across the requests of this client
+    self._session = requests.Session()
 
   def _SendRequest(self, method, path, query, content):
     """Sends an HTTP request.
@@ -231,7 +233,7 @@ class GanetiRapiClient(object): # pylint: disable=R0904
     self._logger.debug("Sending request %s %s (query=%r) (content=%r)",
                        method, url, query, encoded_content)
 
-    req_method = getattr(requests, method.lower())
+    req_method = getattr(self._session, method.lower())
     r = req_method(url, auth=self._auth, headers=headers, params=query,
                    data=encoded_content, verify=False)
 
@@ -31,6 +31,11 @@
 # interpreted as representing official policies, either expressed
 # or implied, of GRNET S.A.
 
+import threading
+from time import time
+from multiprocessing.dummy import Pool as ThreadPool
+
+from django.conf import settings
 from objpool import ObjectPool
 from synnefo.logic.rapi import GanetiRapiClient
 
@@ -39,7 +44,12 @@ log = getLogger(__name__)
 
 _pools = {}
 _hashes = {}
-pool_size = 8
+_pools_lock = threading.Lock()
+
+# Results of cached RAPI calls and calls that are in progress
+_cache = {}
+_inflight = {}
+_cache_lock = threading.Lock()
 
 
 class GanetiRapiClientPool(ObjectPool):
@@ -77,16 +87,21 @@ def get_rapi_client(backend_id, backend_hash, host, port, user, passwd):
         raise ValueError(m % "port")
 
     # does the pool need to be created?
-    if backend_hash not in _pools:
-        log.debug("GET: No Pool. Creating new for host %s", host)
-        pool = GanetiRapiClientPool(host, port, user, passwd, pool_size)
-        _pools[backend_hash] = pool
-        # Delete Pool for old backend_hash
-        if backend_id in _hashes:
-            del _pools[_hashes[backend_id]]
-        _hashes[backend_id] = backend_hash
-
-    obj = _pools[backend_hash].pool_get()
+    with _pools_lock:
+        if backend_hash not in _pools:
+            log.debug("GET: No Pool. Creating new for host %s", host)
+            # The size of the pool limits the concurrent requests to the
+            # backend, since getting a client blocks when the pool is empty.
+            pool = GanetiRapiClientPool(host, port, user, passwd,
+                                        settings.GANETI_RAPI_POOL_SIZE)
+            _pools[backend_hash] = pool
+            # Delete Pool for old backend_hash
+            if backend_id in _hashes:
+                del _pools[_hashes[backend_id]]
+            _hashes[backend_id] = backend_hash
+        pool = _pools[backend_hash]
+
+    obj = pool.pool_get()
     log.debug("GET: Got object %r from pool", obj)
     return obj
 
@@ -98,3 +113,71 @@ def put_rapi_client(client):
         log.debug("PUT: client %r does not have a pool", client)
         return
     pool.pool_put(client)
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def cached_call(key, func, timeout=0):
+    """Call 'func' once for concurrent calls with the same 'key'.
+
+    Callers that arrive while a call with the same key is in progress wait
+    for it and get its result, instead of issuing a duplicate request. If
+    'timeout' is positive, the result is also cached for 'timeout' seconds.
+
+    The result is shared between the callers and must not be modified.
+
+    """
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] > time():
+            return cached[1]
+        call = _inflight.get(key)
+        owner = call is None
+        if owner:
+            call = _inflight[key] = _Call()
+
+    if not owner:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = func()
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _cache_lock:
+            del _inflight[key]
+            if call.error is None and timeout > 0:
+                _cache[key] = (time() + timeout, call.result)
+        call.done.set()
+    return call.result
+
+
+def map_concurrently(func, items, workers=None):
+    """Apply 'func' to each of 'items' from a pool of threads.
+
+    Return the results in the order of 'items'. If any call fails, the
+    exception is raised after all calls have finished. The number of
+    concurrent requests to each backend is still bounded by the size of its
+    pool of RAPI clients.
+
+    """
+    items = list(items)
+    if len(items) < 2:
+        return map(func, items)
+    if workers is None:
+        workers = settings.GANETI_RAPI_WORKERS
+    pool = ThreadPool(min(len(items), workers))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
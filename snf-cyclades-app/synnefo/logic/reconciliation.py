@@ -61,6 +61,7 @@ from django.conf import settings
 import logging
 import itertools
 import bitarray
+from copy import copy
 from datetime import datetime, timedelta
 
 from django.db import transaction
@@ -70,6 +71,7 @@ from synnefo.db.models import (Backend, VirtualMachine, Flavor,
                                MacPrefixPoolTable)
 from synnefo.db import pools
 from synnefo.logic import utils, rapi, backend as backend_mod
+from synnefo.logic.rapi_pool import map_concurrently
 from synnefo.lib.utils import merge_time
 
 logger = logging.getLogger()
@@ -103,11 +105,12 @@ class BackendReconciler(object):
         self.db_servers_keys = set(self.db_servers.keys())
         log.debug("Got servers info from database.")
 
-        self.gnt_servers = get_ganeti_servers(backend)
+        # Get the instances and the jobs of the backend concurrently
+        self.gnt_servers, self.gnt_jobs = \
+            map_concurrently(lambda get: get(backend),
+                             [get_ganeti_servers, get_ganeti_jobs])
         self.gnt_servers_keys = set(self.gnt_servers.keys())
         log.debug("Got servers info from Ganeti backend.")
-
-        self.gnt_jobs = get_ganeti_jobs(backend)
         log.debug("Got jobs from Ganeti backend")
 
         self.stale_servers = self.reconcile_stale_servers()
@@ -419,7 +422,7 @@ def get_database_servers(backend):
 
 
 def get_ganeti_servers(backend):
-    gnt_instances = backend_mod.get_instances(backend)
+    gnt_instances = backend_mod.get_instances(backend, cache=False)
     # Filter out non-synnefo instances
     snf_backend_prefix = settings.BACKEND_PREFIX_ID
     gnt_instances = filter(lambda i: i["name"].startswith(snf_backend_prefix),
@@ -757,11 +760,14 @@ def check_unique_values(objects, field, logger):
 
 
 def check_pool_consistent(pool, pool_class, used_values, fix, logger):
+    # Lock all the chunks of segmented pools, so that no values may be
+    # reserved or released while checking them
+    pool.load()
     dummy_pool = create_empty_pool(pool, pool_class)
     [dummy_pool.reserve(value) for value in used_values]
-    if dummy_pool.available != pool.available:
-        msg = "'%s' is not consistent!\nPool: %s\nUsed: %s"
-        pool_diff = dummy_pool.available ^ pool.available
+    available = pool.available
+    if dummy_pool.available != available:
+        pool_diff = dummy_pool.available ^ available
         for index in pool_diff.itersearch(bitarray.bitarray("1")):
             value = pool.index_to_value(int(index))
             msg = "%s is incosistent! Value '%s' is %s but should be %s."
@@ -770,15 +776,23 @@ def check_pool_consistent(pool, pool_class, used_values, fix, logger):
                 or "unavailable"
             logger.error(msg, pool, value, value1, value2)
         if fix:
+            # Segmented pools write back only the chunks that differ
             pool.available = dummy_pool.available
             pool.save()
             logger.info("Fixed available map of pool '%s'", pool)
 
 
 def create_empty_pool(pool, pool_class):
-    pool_row = pool.pool_table
+    """Create an empty, in-memory copy of a pool.
+
+    The copy is never segmented, so that it neither reads nor locks the
+    chunks of the pool.
+
+    """
+    pool_row = copy(pool.pool_table)
     pool_row.available_map = ""
     pool_row.reserved_map = ""
+    pool_row.chunk_size = 0
     return pool_class(pool_row)
 
 
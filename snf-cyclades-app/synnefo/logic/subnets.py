@@ -214,8 +214,13 @@ def _create_ip_pool(pool, cidr, subnet):
     size = int(pool[1]) - int(pool[0]) + 1
     base = str(cidr)
     offset = int(pool[0]) - int(cidr.network)
-    return IPPoolTable.objects.create(size=size, offset=offset,
-                                      base=base, subnet=subnet)
+    pool_row = IPPoolTable.objects.create(size=size, offset=offset,
+                                          base=base, subnet=subnet,
+                                          chunk_size=settings.POOL_CHUNK_SIZE)
+    # Create all the chunks of the pool now, instead of on its first use,
+    # where concurrent allocations would try to create them twice
+    pool_row.pool.save()
+    return pool_row
 
 
 def check_number_of_subnets(network, version):
@@ -31,11 +31,16 @@
 # interpreted as representing official policies, either expressed
 # or implied, of GRNET S.A.
 
+import threading
+import time
+
 from django.test import TestCase
 
 from synnefo.logic import rapi_pool
+from synnefo.logic.backend import JobWaiter
+from synnefo.db import models_factory as mfactory
 
-from mock import patch
+from mock import patch, Mock
 
 
 @patch('synnefo.logic.rapi_pool.GanetiRapiClient', spec=True)
@@ -81,3 +86,108 @@ class GanetiRapiPoolTest(TestCase):
         cl._pool = None
         rapi_pool.put_rapi_client(cl)
         self.assertTrue(cl not in rapi_pool._pools.values())
+
+
+class CachedCallTest(TestCase):
+    def setUp(self):
+        rapi_pool._cache.clear()
+        rapi_pool._inflight.clear()
+
+    def tearDown(self):
+        rapi_pool._cache.clear()
+        rapi_pool._inflight.clear()
+
+    def test_coalesce(self):
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def func():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return "result"
+
+        results = []
+        call = lambda: results.append(rapi_pool.cached_call("key1", func))
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        threads[0].start()
+        started.wait()
+        [t.start() for t in threads[1:]]
+        # Wait for the other callers to block on the in-progress call
+        time.sleep(0.1)
+        release.set()
+        [t.join() for t in threads]
+        self.assertEqual(results, ["result"] * 3)
+        self.assertEqual(len(calls), 1)
+        # Without a timeout the result is not cached
+        rapi_pool.cached_call("key1", func)
+        self.assertEqual(len(calls), 2)
+
+    def test_cache_timeout(self):
+        func = Mock(return_value=[1, 2])
+        self.assertEqual(rapi_pool.cached_call("key2", func, 60), [1, 2])
+        self.assertEqual(rapi_pool.cached_call("key2", func, 60), [1, 2])
+        self.assertEqual(func.call_count, 1)
+
+    def test_error(self):
+        func = Mock(side_effect=ValueError)
+        self.assertRaises(ValueError, rapi_pool.cached_call, "key3", func, 60)
+        self.assertRaises(ValueError, rapi_pool.cached_call, "key3", func, 60)
+        self.assertEqual(func.call_count, 2)
+        self.assertFalse("key3" in rapi_pool._inflight)
+
+    def test_map_concurrently(self):
+        res = rapi_pool.map_concurrently(lambda x: x * 2, range(10),
+                                         workers=3)
+        self.assertEqual(res, range(0, 20, 2))
+        self.assertEqual(rapi_pool.map_concurrently(str, []), [])
+
+
+@patch('synnefo.logic.rapi_pool.GanetiRapiClient')
+class JobWaiterTest(TestCase):
+    def test_wait_many(self, rclient):
+        # Job 1 finishes at the second poll, job 2 fails and job 4 never
+        # finishes
+        polls = {1: ["running", "success"], 2: ["error"], 3: ["success"],
+                 4: ["queued"]}
+
+        def get_job_status(job_id):
+            statuses = polls[job_id]
+            status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+            return {"status": status, "opresult": ["msg"]}
+
+        client = rclient.return_value
+        client.GetJobStatus.side_effect = get_job_status
+        backend = mfactory.BackendFactory()
+        waiter = JobWaiter(workers=2, interval=0.01)
+        for job_id in [1, 2, 3, 4]:
+            waiter.add(backend, job_id, key="job%s" % job_id)
+        self.assertEqual(len(waiter), 4)
+        results = sorted(waiter.wait() for _ in range(3))
+        self.assertEqual(results, [("job1", "success", None),
+                                   ("job2", "error", ["msg"]),
+                                   ("job3", "success", None)])
+        self.assertEqual(len(waiter), 1)
+        self.assertEqual(waiter.wait(timeout=0.1), None)
+        waiter.close()
+        # Only the pending jobs are polled, and never the whole job list
+        self.assertFalse(client.GetJobs.called)
+        calls = [c[1][0] for c in client.GetJobStatus.mock_calls]
+        self.assertEqual((calls.count(1), calls.count(2), calls.count(3)),
+                         (2, 1, 1))
+        self.assertTrue(calls.count(4) > 2)
+        # Polling backs off while no job finishes
+        self.assertTrue(waiter.delay > waiter.interval)
+
+    def test_error(self, rclient):
+        rclient.return_value.GetJobStatus.side_effect = \
+            Exception("Unavailable")
+        backend = mfactory.BackendFactory()
+        waiter = JobWaiter(interval=0.01)
+        waiter.add(backend, 1)
+        waiter.add(backend, 2)
+        results = sorted(waiter)
+        waiter.close()
+        self.assertEqual(results, [(1, "error", "Unavailable"),
+                                   (2, "error", "Unavailable")])
@@ -32,9 +32,10 @@
 from django.test import TransactionTestCase
 #from snf_django.utils.testing import mocked_quotaholder
 from synnefo.logic import servers
+from synnefo.logic.backend_allocator import BackendAllocator
 from synnefo import quotas
 from synnefo.db import models_factory as mfactory, models
-from mock import patch
+from mock import patch, Mock
 
 from snf_django.lib.api import faults
 from snf_django.utils.testing import mocked_quotaholder, override_settings
@@ -274,3 +275,37 @@ class ServerCommandTest(TransactionTestCase):
             servers.reboot(vm)
             self.assertEqual(vm.task, "REBOOT")
             self.assertEqual(vm.task_job_id, 3)
+
+
+class BackendAllocatorTest(TransactionTestCase):
+    def test_allocate(self):
+        flavor = mfactory.FlavorFactory(ram=1024, disk=10,
+                                        disk_template="plain")
+        b1 = mfactory.BackendFactory(mfree=4096, pinst_cnt=0)
+        b2 = mfactory.BackendFactory(mfree=2048, pinst_cnt=0)
+        mfactory.BackendFactory(mfree=8192, pinst_cnt=0, drained=True)
+        allocator = BackendAllocator()
+        backends = [allocator.allocate("test", flavor) for _ in range(3)]
+        # VMs are spread to backends based on the reduced resources
+        self.assertEqual(sorted(b.id for b in backends),
+                         [b1.id, b1.id, b2.id])
+        b1 = models.Backend.objects.get(id=b1.id)
+        b2 = models.Backend.objects.get(id=b2.id)
+        self.assertEqual((b1.mfree, b1.pinst_cnt), (2048, 2))
+        self.assertEqual((b2.mfree, b2.pinst_cnt), (1024, 1))
+
+    def test_no_backends(self):
+        flavor = mfactory.FlavorFactory(disk_template="plain")
+        mfactory.BackendFactory(offline=True)
+        allocator = BackendAllocator()
+        self.assertEqual(allocator.allocate("test", flavor), None)
+
+    def test_strategy_no_backend(self):
+        flavor = mfactory.FlavorFactory(disk_template="plain")
+        backend = mfactory.BackendFactory(pinst_cnt=0)
+        allocator = BackendAllocator()
+        allocator.strategy_mod = Mock()
+        allocator.strategy_mod.allocate.return_value = None
+        self.assertEqual(allocator.allocate("test", flavor), None)
+        backend = models.Backend.objects.get(id=backend.id)
+        self.assertEqual(backend.pinst_cnt, 0)
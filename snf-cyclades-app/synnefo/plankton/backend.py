@@ -56,11 +56,13 @@ import logging
 import os
 
 from time import time, gmtime, strftime
+from hashlib import md5
 from functools import wraps
 from operator import itemgetter
 from collections import namedtuple
 
 from django.conf import settings
+from django.core.cache import cache, get_cache
 from django.utils import importlib
 from pithos.backends.base import NotAllowedError, VersionNotExists, QuotaError
 from synnefo.util.text import uenc
@@ -82,6 +84,14 @@ PLANKTON_META = ('container_format', 'disk_format', 'name',
 MAX_META_KEY_LENGTH = 128 - len(PLANKTON_DOMAIN) - len(PROPERTY_PREFIX)
 MAX_META_VALUE_LENGTH = 256
 
+# Cache key of the counter that invalidates all cached image lists
+IMAGE_LIST_GENERATION_KEY = "plankton:images:generation"
+
+if settings.IMAGE_LIST_CACHE_BACKEND:
+    image_list_cache = get_cache(settings.IMAGE_LIST_CACHE_BACKEND)
+else:
+    image_list_cache = cache
+
 from pithos.backends.util import PithosBackendPool
 _pithos_backend_pool = \
     PithosBackendPool(
@@ -336,6 +346,7 @@ class PlanktonBackend(object):
         account, container, path = location
         self.backend.update_object_permissions(self.user, account, container,
                                                path, permissions)
+        invalidate_image_lists()
         logger.debug("User '%s' updated image '%s' permissions: '%s'",
                      self.user, uuid, permissions)
 
@@ -413,50 +424,96 @@ class PlanktonBackend(object):
     # List functions
     def _list_images(self, user=None, filters=None, params=None):
         filters = filters or {}
+        params = params or {}
+
+        # Push down to Pithos the size range and the metadata filters that can
+        # be expressed as filter terms. The rest are applied on the results.
+        filterq = []
+        size_range = (filters.get('size_min'), None)
+        if filters.get('size_max') is not None:
+            # Pithos size range excludes the upper limit
+            size_range = (size_range[0], filters['size_max'] + 1)
+        post_filters = {}
+        for key, val in filters.items():
+            if key in ('size_min', 'size_max'):
+                continue
+            if key in PLANKTON_META and val and val == val.strip():
+                filterq.append(u"%s%s=%s" % (PLANKTON_PREFIX, key, val))
+            else:
+                post_filters[key] = val
 
-        # TODO: Use filters
-        # # Fix keys
-        # keys = [PLANKTON_PREFIX + 'name']
-        # size_range = (None, None)
-        # for key, val in filters.items():
-        #     if key == 'size_min':
-        #         size_range = (val, size_range[1])
-        #     elif key == 'size_max':
-        #         size_range = (size_range[0], val)
-        #     else:
-        #         keys.append('%s = %s' % (PLANKTON_PREFIX + key, val))
         _images = self.backend.get_domain_objects(domain=PLANKTON_DOMAIN,
-                                                  user=user)
+                                                  user=user, filterq=filterq,
+                                                  sizeq=size_range)
 
         images = []
         for (location, metadata, permissions) in _images:
             location = Location(*location.split("/", 2))
-            images.append(image_to_dict(location, metadata, permissions))
-
-        if params is None:
-            params = {}
+            image = image_to_dict(location, metadata, permissions)
+            if all(image.get(k) == v for k, v in post_filters.items()):
+                images.append(image)
 
         key = itemgetter(params.get('sort_key', 'created_at'))
         reverse = params.get('sort_dir', 'desc') == 'desc'
         images.sort(key=key, reverse=reverse)
         return images
 
+    def _list_images_cached(self, user=None, filters=None, params=None):
+        """Return the sorted, unpaginated result of _list_images.
+
+        The result is cached for IMAGE_LIST_CACHE_TIMEOUT seconds, keyed on
+        the serial of the latest Pithos version, so that changes of images,
+        or of their metadata, are seen at once, wherever they were made.
+        Permission changes do not create versions, and those made through
+        Plankton invalidate all cached lists instead.
+
+        """
+        timeout = settings.IMAGE_LIST_CACHE_TIMEOUT
+        if timeout <= 0:
+            return self._list_images(user=user, filters=filters,
+                                     params=params)
+
+        params = params or {}
+        sort = (params.get('sort_key'), params.get('sort_dir'))
+        generation = image_list_cache.get(IMAGE_LIST_GENERATION_KEY, 0)
+        serial = self.backend.get_latest_serial()
+        key = "plankton:images:%s" % \
+            md5(repr((generation, serial, user,
+                      sorted((filters or {}).items()), sort))).hexdigest()
+        images = image_list_cache.get(key)
+        if images is None:
+            images = self._list_images(user=user, filters=filters,
+                                       params=params)
+            image_list_cache.set(key, images, timeout)
+        return images
+
+    @staticmethod
+    def _paginate(images, params=None):
+        params = params or {}
+        images = paginate_images(images, params.get('marker'),
+                                 params.get('limit'))
+        # Callers modify the returned dicts, do not let them touch the cache
+        return deepcopy(images)
+
     @handle_pithos_backend
     def list_images(self, filters=None, params=None):
-        return self._list_images(user=self.user, filters=filters,
-                                 params=params)
+        images = self._list_images_cached(user=self.user, filters=filters,
+                                          params=params)
+        return self._paginate(images, params)
 
     @handle_pithos_backend
     def list_shared_images(self, member, filters=None, params=None):
-        images = self._list_images(user=self.user, filters=filters,
-                                   params=params)
+        images = self._list_images_cached(user=self.user, filters=filters,
+                                          params=params)
         is_shared = lambda img: not img["is_public"] and img["owner"] == member
-        return filter(is_shared, images)
+        return self._paginate(filter(is_shared, images), params)
 
     @handle_pithos_backend
     def list_public_images(self, filters=None, params=None):
-        images = self._list_images(user=None, filters=filters, params=params)
-        return filter(lambda img: img["is_public"], images)
+        images = self._list_images_cached(user=None, filters=filters,
+                                          params=params)
+        return self._paginate(filter(lambda img: img["is_public"], images),
+                              params)
 
     # # Snapshots
     # def list_snapshots(self, user=None):
@@ -485,6 +542,27 @@ class PlanktonBackend(object):
     #     return self._get_image(image_uuid)
 
 
+def invalidate_image_lists():
+    """Invalidate all cached image lists."""
+    # Outlive the cached lists, so that an expired generation can not bring
+    # back a list cached before the previous invalidation.
+    image_list_cache.set(IMAGE_LIST_GENERATION_KEY, time(),
+                         settings.IMAGE_LIST_CACHE_TIMEOUT + 60)
+
+
+def paginate_images(images, marker=None, limit=None):
+    """Return the images after the one with the 'marker' id, up to 'limit'."""
+    if marker is not None:
+        ids = [image["id"] for image in images]
+        try:
+            images = images[ids.index(marker) + 1:]
+        except ValueError:
+            raise faults.BadRequest("Marker image '%s' not found" % marker)
+    if limit is not None:
+        images = images[:limit]
+    return images
+
+
 def create_url(account, container, name):
     """Create a Pithos URL from the object info"""
     assert "/" not in account, "Invalid account"
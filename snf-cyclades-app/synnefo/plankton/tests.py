@@ -37,10 +37,12 @@ from mock import patch
 from functools import wraps
 from copy import deepcopy
 from decimal import Decimal
+from django.core.cache import cache
 from snf_django.utils.testing import BaseAPITest
 from synnefo.cyclades_settings import cyclades_services
 from synnefo.lib.services import get_service_path
 from synnefo.lib import join_urls
+from synnefo.plankton.backend import invalidate_image_lists
 
 PLANKTON_URL = get_service_path(cyclades_services, 'image',
                                 version='v1.0')
@@ -306,6 +308,77 @@ class PlanktonTest(BaseAPITest):
         except ValueError:
             self.assertTrue(False)
 
+    def test_list_images(self, backend):
+        images = []
+        for i in range(3):
+            meta = {"uuid": "img%d" % i,
+                    "hash": "hash",
+                    "bytes": 42 + i,
+                    "version_timestamp": i,
+                    "plankton:name": "image %d" % i,
+                    "plankton:status": "AVAILABLE"}
+            owner = "other" if i == 2 else "img_owner"
+            images.append(("%s/images/foo%d" % (owner, i), meta,
+                           {"read": ["*"]}))
+        cache.clear()
+        backend().get_domain_objects.return_value = images
+        backend().get_latest_serial.return_value = 1
+        response = self.get(join_urls(IMAGES_URL, "?status=AVAILABLE"
+                                      "&size_max=100&sort_key=size"))
+        self.assertSuccess(response)
+        backend().get_domain_objects.assert_called_once_with(
+            domain="plankton", user="user",
+            filterq=[u"plankton:status=AVAILABLE"], sizeq=(None, 101))
+        res = json.loads(response.content)
+        self.assertEqual([img["id"] for img in res], ["img2", "img1", "img0"])
+
+        # The list is cached, until invalidated
+        response = self.get(join_urls(IMAGES_URL, "?status=AVAILABLE"
+                                      "&size_max=100&sort_key=size&limit=2"))
+        self.assertSuccess(response)
+        self.assertEqual(backend().get_domain_objects.call_count, 1)
+        res = json.loads(response.content)
+        self.assertEqual([img["id"] for img in res], ["img2", "img1"])
+        invalidate_image_lists()
+        response = self.get(join_urls(IMAGES_URL, "?status=AVAILABLE"
+                                      "&size_max=100&sort_key=size"))
+        self.assertSuccess(response)
+        self.assertEqual(backend().get_domain_objects.call_count, 2)
+        # A new Pithos version, wherever it was made, is seen at once
+        backend().get_latest_serial.return_value = 2
+        response = self.get(join_urls(IMAGES_URL, "?status=AVAILABLE"
+                                      "&size_max=100&sort_key=size"))
+        self.assertSuccess(response)
+        self.assertEqual(backend().get_domain_objects.call_count, 3)
+
+        # Values with spaces or operators are pushed down as they are
+        response = self.get(join_urls(IMAGES_URL, "?name=image%20%3E%3D1"))
+        self.assertSuccess(response)
+        backend().get_domain_objects.assert_called_with(
+            domain="plankton", user="user",
+            filterq=[u"plankton:name=image >=1"], sizeq=(None, None))
+
+        # Filters that can not be pushed down to Pithos and pagination
+        response = self.get(join_urls(IMAGES_URL, "?owner=other"))
+        self.assertSuccess(response)
+        res = json.loads(response.content)
+        self.assertEqual([img["id"] for img in res], ["img2"])
+        response = self.get(join_urls(IMAGES_URL, "?sort_key=id&sort_dir=asc"
+                                      "&marker=img0&limit=1"))
+        self.assertSuccess(response)
+        res = json.loads(response.content)
+        self.assertEqual([img["id"] for img in res], ["img1"])
+        # Pagination is applied after filtering on the results
+        response = self.get(join_urls(IMAGES_URL, "?owner=img_owner"
+                                      "&sort_key=size&limit=1"))
+        self.assertSuccess(response)
+        res = json.loads(response.content)
+        self.assertEqual([img["id"] for img in res], ["img1"])
+        response = self.get(join_urls(IMAGES_URL, "?marker=unknown"))
+        self.assertBadRequest(response)
+        response = self.get(join_urls(IMAGES_URL, "?limit=-1"))
+        self.assertBadRequest(response)
+
     def test_list_images_filters_error_1(self, backend):
         response = self.get(join_urls(IMAGES_URL, "?size_max="))
         self.assertBadRequest(response)
@@ -48,9 +48,9 @@ from synnefo.plankton.backend import split_url
 
 
 FILTERS = ('name', 'container_format', 'disk_format', 'status', 'size_min',
-           'size_max')
+           'size_max', 'owner')
 
-PARAMS = ('sort_key', 'sort_dir')
+PARAMS = ('sort_key', 'sort_dir', 'limit', 'marker')
 
 SORT_KEY_OPTIONS = ('id', 'name', 'status', 'size', 'disk_format',
                     'container_format', 'created_at', 'updated_at')
@@ -313,6 +313,13 @@ def list_images(request, detail=False):
         except ValueError:
             raise faults.BadRequest("Malformed request.")
 
+    if 'limit' in params:
+        try:
+            params['limit'] = int(params['limit'])
+            assert(params['limit'] >= 0)
+        except (ValueError, AssertionError):
+            raise faults.BadRequest("Malformed request.")
+
     with PlanktonBackend(request.user_uniq) as backend:
         images = backend.list_images(filters, params)
 
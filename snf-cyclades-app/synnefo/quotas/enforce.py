@@ -32,10 +32,11 @@
 # or implied, of GRNET S.A.
 
 import time
+from collections import deque
 from synnefo.db.models import VirtualMachine, IPAddress, NetworkInterface
 from synnefo.logic import servers
 from synnefo.logic import ips as logic_ips
-from synnefo.logic import backend
+from synnefo.logic import backend, rapi
 
 
 MiB = 2 ** 20
@@ -212,12 +213,21 @@ VM_ACTION = {
 
 
 def apply_to_vm(action, vm_id, shutdown_timeout):
+    """Apply the action to the VM.
+
+    Return the VM and the ID of the job submitted for the action, or None if
+    no job was needed, or (None, None) on failure.
+
+    """
     try:
         vm = VirtualMachine.objects.select_for_update().get(id=vm_id)
-        VM_ACTION[action](vm, shutdown_timeout=shutdown_timeout)
-        return True
+        prev_job_id = vm.task_job_id
+        vm = VM_ACTION[action](vm, shutdown_timeout=shutdown_timeout)
+        # The VM keeps the job of an earlier action, if no job was submitted
+        job_id = vm.task_job_id if vm.task_job_id != prev_job_id else None
+        return vm, job_id
     except BaseException:
-        return False
+        return None, None
 
 
 def allow_operation(backend_id, opcount, maxops):
@@ -231,18 +241,79 @@ def allow_operation(backend_id, opcount, maxops):
 
 
 def perform_vm_actions(actions, opcount, maxops=None, fix=False, options={}):
+    """Apply the actions to the VMs and wait for their Ganeti jobs.
+
+    At most 'maxops' jobs run at the same time on each backend. When a job
+    finishes, the next action for its backend is applied, so that the window
+    of each backend is kept full. 'opcount' holds the running jobs of each
+    backend. Without 'fix', only the first 'maxops' actions of each backend
+    are listed.
+
+    """
     log = []
+    if not fix:
+        for vm_id, (viol_id, state, backend_id, vm_action) in actions.items():
+            if not allow_operation(backend_id, opcount, maxops):
+                continue
+            log.append(("vm", vm_id, state, backend_id, vm_action, viol_id))
+        return log
+
+    results = _apply_vm_actions(actions, opcount, maxops,
+                                options.get("shutdown_timeout"))
     for vm_id, (viol_id, state, backend_id, vm_action) in actions.iteritems():
-        if not allow_operation(backend_id, opcount, maxops):
-            continue
-        data = ("vm", vm_id, state, backend_id, vm_action, viol_id)
-        if fix:
-            r = apply_to_vm(vm_action, vm_id, options.get("shutdown_timeout"))
-            data += ("DONE" if r else "FAILED",)
-        log.append(data)
+        log.append(("vm", vm_id, state, backend_id, vm_action, viol_id,
+                    results[vm_id]))
     return log
 
 
+def _apply_vm_actions(actions, opcount, maxops, shutdown_timeout):
+    results = {}
+    backends = {}
+    waiter = backend.JobWaiter()
+    queue = deque(actions.iteritems())
+    try:
+        while queue:
+            blocked = []
+            while queue:
+                action = queue.popleft()
+                vm_id, (_, _, backend_id, vm_action) = action
+                if not allow_operation(backend_id, opcount, maxops):
+                    blocked.append(action)
+                    continue
+                vm, job_id = apply_to_vm(vm_action, vm_id, shutdown_timeout)
+                if vm is None or job_id is None:
+                    results[vm_id] = "FAILED" if vm is None else "DONE"
+                    _release_operation(backend_id, opcount)
+                    continue
+                backends[vm_id] = backend_id
+                waiter.add(vm.backend, job_id, key=vm_id)
+            queue.extend(blocked)
+
+            if not len(waiter):
+                # No job will finish to make room for the blocked actions
+                for vm_id, _ in queue:
+                    results[vm_id] = "SKIPPED"
+                break
+            # Wait for a job to finish, before applying more actions
+            vm_id, status, _ = waiter.wait()
+            _release_operation(backends[vm_id], opcount)
+            ok = status == rapi.JOB_STATUS_SUCCESS
+            results[vm_id] = "DONE" if ok else "FAILED"
+
+        for vm_id, status, _ in waiter:
+            _release_operation(backends[vm_id], opcount)
+            ok = status == rapi.JOB_STATUS_SUCCESS
+            results[vm_id] = "DONE" if ok else "FAILED"
+    finally:
+        waiter.close()
+    return results
+
+
+def _release_operation(backend_id, opcount):
+    if backend_id in opcount:
+        opcount[backend_id] -= 1
+
+
 def wait_for_ip(ip_id):
     for i in range(100):
         ip = IPAddress.objects.get(id=ip_id)
@@ -273,10 +344,10 @@ def remove_ip(ip_id):
 
 def perform_floating_ip_actions(actions, opcount, maxops=None, fix=False,
                                 options={}):
+    # Floating IPs are removed one by one, waiting for the job that detaches
+    # them from their server. So they never exceed 'maxops'.
     log = []
     for ip_id, (viol_id, state, backend_id, ip_action) in actions.iteritems():
-        if not allow_operation(backend_id, opcount, maxops):
-            continue
         data = ("floating_ip", ip_id, state, backend_id, ip_action, viol_id)
         if ip_action == "REMOVE":
             if fix:
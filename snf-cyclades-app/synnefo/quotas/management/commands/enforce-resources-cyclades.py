@@ -55,7 +55,9 @@ class Command(SynnefoCommand):
 
     command_option_list = (
         make_option("--max-operations",
-                    help="Limit operations per backend."),
+                    help="Limit concurrent operations per backend."
+                         " Server actions wait for their Ganeti jobs and"
+                         " the next action starts when a job finishes."),
         make_option("--users", dest="users",
                     help=("Enforce resources only for the specified list "
                           "of users, e.g uuid1,uuid2")),
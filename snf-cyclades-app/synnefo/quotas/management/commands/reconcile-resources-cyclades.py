@@ -62,48 +62,64 @@ class Command(BaseCommand):
                     default=False,
                     action="store_true",
                     help="Override Astakos quotas. Force Astakos to impose"
-                         " the Cyclades quota, independently of their value.")
+                         " the Cyclades quota, independently of their value."),
+        make_option("--chunk-size",
+                    dest="chunk_size",
+                    default=1000,
+                    type="int",
+                    help="Number of holders to check and fix at a time"
+                         " (default: 1000)"),
     )
 
     def handle(self, *args, **options):
         write = self.stderr.write
         userid = options['userid']
         project = options["project"]
+        chunk_size = options["chunk_size"]
 
-        # Get holdings from Cyclades DB
-        db_holdings = util.get_db_holdings(userid, project)
-        db_project_holdings = util.get_db_project_holdings(project)
+        # Holdings are read sorted by holder from both Cyclades DB and
+        # QuotaHolder, and are checked and fixed in chunks of holders.
+        user_chunks = reconcile.check_users_chunked(
+            self.stderr, quotas.RESOURCES,
+            util.iter_db_holdings(userid, project),
+            util.iter_qh_users_holdings(
+                [userid] if userid is not None else None),
+            chunk_size=chunk_size)
 
-        # Get holdings from QuotaHolder
-        qh_holdings = util.get_qh_users_holdings(
-            [userid] if userid is not None else None)
-        qh_project_holdings = util.get_qh_project_holdings(
-            [project] if project is not None else None)
-
-        unsynced_users, users_pending, users_unknown =\
-            reconcile.check_users(self.stderr, quotas.RESOURCES,
-                                  db_holdings, qh_holdings)
-
-        unsynced_projects, projects_pending, projects_unknown =\
-            reconcile.check_projects(self.stderr, quotas.RESOURCES,
-                                     db_project_holdings, qh_project_holdings)
-        pending_exists = users_pending or projects_pending
-        unknown_exists = users_unknown or projects_unknown
+        project_chunks = reconcile.check_projects_chunked(
+            self.stderr, quotas.RESOURCES,
+            util.iter_db_project_holdings(project),
+            util.iter_qh_project_holdings(
+                [project] if project is not None else None),
+            chunk_size=chunk_size)
 
         headers = ("Type", "Holder", "Source", "Resource",
                    "Database", "Quotaholder")
-        unsynced = unsynced_users + unsynced_projects
-        if unsynced:
-            pprint_table(self.stdout, unsynced, headers)
-            if options["fix"]:
+        unsynced_exists = pending_exists = unknown_exists = False
+        fixed = False
+        for holder_type, chunks in (("user", user_chunks),
+                                    ("project", project_chunks)):
+            for unsynced, pending, unknown in chunks:
+                pending_exists = pending_exists or pending
+                unknown_exists = unknown_exists or unknown
+                if not unsynced:
+                    continue
+                unsynced_exists = True
+                pprint_table(self.stdout, unsynced, headers)
+                if not options["fix"]:
+                    continue
+                if holder_type == "user":
+                    user_provisions = reconcile.create_user_provisions(
+                        unsynced)
+                    project_provisions = {}
+                else:
+                    user_provisions = {}
+                    project_provisions = reconcile.create_project_provisions(
+                        unsynced)
                 qh = quotas.Quotaholder.get()
                 force = options["force"]
                 name = ("client: reconcile-resources-cyclades, time: %s"
                         % datetime.now())
-                user_provisions = reconcile.create_user_provisions(
-                    unsynced_users)
-                project_provisions = reconcile.create_project_provisions(
-                    unsynced_projects)
                 try:
                     qh.issue_commission_generic(
                         user_provisions, project_provisions,
@@ -113,10 +129,13 @@ class Command(BaseCommand):
                     write("Reconciling failed because a limit has been "
                           "reached. Use --force to ignore the check.\n")
                     return
-                write("Fixed unsynced resources\n")
+                fixed = True
+
+        if fixed:
+            write("Fixed unsynced resources\n")
 
         if pending_exists:
             write("Found pending commissions. Run 'snf-manage"
                   " reconcile-commissions-cyclades'\n")
-        elif not (unsynced or unknown_exists):
+        elif not (unsynced_exists or unknown_exists):
             write("Everything in sync.\n")
@@ -36,12 +36,14 @@
 # or implied, of GRNET S.A.
 #
 #
-from mock import patch
+from mock import patch, Mock
+from StringIO import StringIO
 from django.test import TestCase
+from snf_django.utils import reconcile
 from synnefo.db import models_factory as mfactory
 
 from synnefo import quotas
-from synnefo.quotas import util
+from synnefo.quotas import util, enforce
 
 
 class GetDBHoldingsTestCase(TestCase):
@@ -106,6 +108,57 @@ class GetDBHoldingsTestCase(TestCase):
         self.assertEqual(holdings["user2"][None]["cyclades.floating_ip"], 1)
         self.assertEqual(holdings["user3"][None]["cyclades.floating_ip"], 1)
 
+    def test_iter_holdings(self):
+        flavor = mfactory.FlavorFactory(cpu=2, ram=1024, disk=10)
+        for userid in ["user3", "user1", "user2", "user1"]:
+            mfactory.VirtualMachineFactory(flavor=flavor, userid=userid,
+                                           operstate="STARTED")
+        mfactory.NetworkFactory(userid="user4")
+        holdings = util.get_db_holdings()
+        iter_holdings = list(util.iter_db_holdings())
+        self.assertEqual([user for user, _ in iter_holdings],
+                         ["user1", "user2", "user3", "user4"])
+        self.assertEqual(dict(iter_holdings), holdings)
+        self.assertEqual(dict(util.iter_db_holdings(user="user1")),
+                         {"user1": holdings["user1"]})
+
+    def test_iter_holdings_order(self):
+        # The holders are ordered as in Python, whatever the DB collation
+        users = [u"user2", u"User3", u"\u00fcser1", u"user1"]
+        for userid in users:
+            mfactory.NetworkFactory(userid=userid)
+            mfactory.IPv4AddressFactory(userid=userid, floating_ip=True)
+        iter_holdings = list(util.iter_db_holdings())
+        self.assertEqual([user for user, _ in iter_holdings], sorted(users))
+        qh_holdings = [(user, {}) for user in sorted(users)]
+        merged = reconcile.merge_holdings(iter_holdings, qh_holdings)
+        self.assertEqual([user for user, _, _ in merged], sorted(users))
+
+    def test_chunked_reconcile(self):
+        mfactory.NetworkFactory(userid="user1")
+        mfactory.NetworkFactory(userid="user3")
+        db_holdings = util.iter_db_holdings()
+        qh_holdings = [
+            ("user1", {None: {"cyclades.network.private":
+                              {"usage": 1, "pending": 0}}}),
+            ("user2", {None: {"cyclades.network.private":
+                              {"usage": 1, "pending": 0}}}),
+            ("user3", {None: {"cyclades.network.private":
+                              {"usage": 0, "pending": 0}}})]
+        stderr = StringIO()
+        chunks = list(reconcile.check_users_chunked(
+            stderr, ["cyclades.network.private"], db_holdings, qh_holdings,
+            chunk_size=2))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(chunks[0][0], [("user", "user2", None,
+                                         "cyclades.network.private", 0, 1)])
+        self.assertEqual(chunks[1][0], [("user", "user3", None,
+                                         "cyclades.network.private", 1, 0)])
+        unsorted = reversed(qh_holdings)
+        chunks = reconcile.check_users_chunked(
+            stderr, ["cyclades.network.private"], [], unsorted)
+        self.assertRaises(ValueError, list, chunks)
+
 
 @patch("synnefo.quotas.get_quotaholder_pending")
 class ResolvePendingTestCase(TestCase):
@@ -188,3 +241,99 @@ class GetCommissionInfoTest(TestCase):
         vm.save()
         commission = quotas.get_commission_info(vm, "REBOOT")
         self.assertEqual(None, commission)
+
+
+class FakeJobWaiter(object):
+    """JobWaiter that finishes the jobs in the order they were added."""
+    def __init__(self):
+        self.jobs = []
+        self.running = {}
+        self.max_running = {}
+
+    def add(self, backend, job_id, key=None):
+        self.jobs.append((backend, key))
+        self.running[backend] = self.running.get(backend, 0) + 1
+        self.max_running[backend] = max(self.max_running.get(backend, 0),
+                                        self.running[backend])
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def wait(self):
+        backend, key = self.jobs.pop(0)
+        self.running[backend] -= 1
+        return (key, "error" if key == 3 else "success", None)
+
+    def __iter__(self):
+        while self.jobs:
+            yield self.wait()
+
+    def close(self):
+        pass
+
+
+class ApplyVMActionsTest(TestCase):
+    @patch("synnefo.quotas.enforce.apply_to_vm")
+    @patch("synnefo.logic.backend.JobWaiter")
+    def test_window(self, job_waiter, apply_to_vm):
+        waiter = FakeJobWaiter()
+        job_waiter.return_value = waiter
+
+        def apply(action, vm_id, shutdown_timeout):
+            # VM 4 fails to apply the action and VM 5 needs no job
+            if vm_id == 4:
+                return None, None
+            job_id = None if vm_id == 5 else vm_id
+            return Mock(backend="backend%s" % (vm_id % 2)), job_id
+        apply_to_vm.side_effect = apply
+
+        actions = dict((vm_id, (None, "STARTED", vm_id % 2, "REMOVE"))
+                       for vm_id in range(1, 8))
+        opcount = {}
+        results = enforce._apply_vm_actions(actions, opcount, 2, None)
+        self.assertEqual(results, {1: "DONE", 2: "DONE", 3: "FAILED",
+                                   4: "FAILED", 5: "DONE", 6: "DONE",
+                                   7: "DONE"})
+        self.assertEqual(apply_to_vm.call_count, 7)
+        self.assertEqual(waiter.max_running, {"backend0": 2,
+                                              "backend1": 2})
+        self.assertEqual(opcount, {0: 0, 1: 0})
+
+    @patch("synnefo.quotas.enforce.apply_to_vm")
+    @patch("synnefo.logic.backend.JobWaiter")
+    def test_no_jobs(self, job_waiter, apply_to_vm):
+        job_waiter.return_value = FakeJobWaiter()
+        actions = {1: (None, "STARTED", 0, "REMOVE"),
+                   2: (None, "STARTED", 0, "REMOVE")}
+        # The backend already runs as many operations as allowed, and none
+        # of them is waited for here
+        opcount = {0: 1}
+        results = enforce._apply_vm_actions(actions, opcount, 1, None)
+        self.assertEqual(results, {1: "SKIPPED", 2: "SKIPPED"})
+        self.assertFalse(apply_to_vm.called)
+
+    def test_apply_to_vm(self):
+        vm = mfactory.VirtualMachineFactory(task_job_id=3)
+
+        def stop(vm, shutdown_timeout):
+            return vm
+
+        def destroy(vm, shutdown_timeout):
+            vm.task_job_id = 4
+            return vm
+        with patch.dict(enforce.VM_ACTION, {"SHUTDOWN": stop,
+                                            "REMOVE": destroy}):
+            # The job of an earlier action is not waited for
+            self.assertEqual(enforce.apply_to_vm("SHUTDOWN", vm.id, None),
+                             (vm, None))
+            self.assertEqual(enforce.apply_to_vm("REMOVE", vm.id, None),
+                             (vm, 4))
+
+    @patch("synnefo.quotas.enforce.apply_to_vm")
+    def test_dry_run(self, apply_to_vm):
+        actions = dict((vm_id, (None, "STARTED", vm_id % 2, "REMOVE"))
+                       for vm_id in range(1, 8))
+        log = enforce.perform_vm_actions(actions, {}, maxops=2)
+        self.assertEqual(len(log), 4)
+        self.assertEqual(sorted(entry[3] for entry in log), [0, 0, 1, 1])
+        self.assertFalse(apply_to_vm.called)
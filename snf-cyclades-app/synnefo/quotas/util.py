@@ -31,6 +31,9 @@
 # interpreted as representing official policies, either expressed
 # or implied, of GRNET S.A.
 
+import heapq
+from itertools import groupby, ifilter
+
 from django.db.models import Sum, Count, Q
 
 from synnefo.db.models import VirtualMachine, Network, IPAddress
@@ -46,128 +49,145 @@ GiB = 2 ** 30
 def get_db_holdings(user=None, project=None):
     """Get holdings from Cyclades DB."""
     holdings = QuotaDict()
+    for resources in _get_db_resources(("userid", "project"), user, project):
+        for (user, project), res in resources:
+            holdings[user][project].update(res)
+    return holdings
 
-    vms = VirtualMachine.objects.filter(deleted=False)
-    networks = Network.objects.filter(deleted=False)
-    floating_ips = IPAddress.objects.filter(deleted=False, floating_ip=True)
 
-    if user is not None:
-        vms = vms.filter(userid=user)
-        networks = networks.filter(userid=user)
-        floating_ips = floating_ips.filter(userid=user)
+def iter_db_holdings(user=None, project=None):
+    """Iterate over the holdings of Cyclades DB, ordered by user.
 
-    if project is not None:
-        vms = vms.filter(project=project)
-        networks = networks.filter(project=project)
-        floating_ips = floating_ips.filter(project=project)
+    Yield (user, holdings) pairs, where holdings are the holdings of the user
+    per project, as in get_db_holdings(). The resources are aggregated in the
+    DB and merged by user, so that the holdings of a single user are built
+    at a time.
 
-    # Get resources related with VMs
-    vm_resources = vms.values("userid", "project")\
-        .annotate(num=Count("id"),
-                  total_ram=Sum("flavor__ram"),
-                  total_cpu=Sum("flavor__cpu"),
-                  disk=Sum("flavor__disk"))
-
-    for vm_res in vm_resources.iterator():
-        user = vm_res['userid']
-        project = vm_res['project']
-        res = {"cyclades.vm": vm_res["num"],
-               "cyclades.total_cpu": vm_res["total_cpu"],
-               "cyclades.disk": vm_res["disk"] * GiB,
-               "cyclades.total_ram": vm_res["total_ram"] * MiB}
-        holdings[user][project] = res
-
-    vm_active_resources = vms.values("userid", "project")\
-        .filter(Q(operstate="STARTED") | Q(operstate="BUILD") |
-                Q(operstate="ERROR"))\
-        .annotate(ram=Sum("flavor__ram"),
-                  cpu=Sum("flavor__cpu"))
+    """
+    resources = _merge_db_resources(("userid", "project"), user=user,
+                                    project=project)
+    for user, group in groupby(resources, lambda res: res[0][0]):
+        holdings = defaultdict(dict)
+        for (_, project), res in group:
+            holdings[project].update(res)
+        yield user, dict(holdings)
 
-    for vm_res in vm_active_resources.iterator():
-        user = vm_res['userid']
-        project = vm_res['project']
-        holdings[user][project]["cyclades.cpu"] = vm_res["cpu"]
-        holdings[user][project]["cyclades.ram"] = vm_res["ram"] * MiB
 
-    # Get resources related with networks
-    net_resources = networks.values("userid", "project")\
-                            .annotate(num=Count("id"))
+def get_db_project_holdings(project=None):
+    """Get holdings from Cyclades DB."""
+    holdings = QuotaDict()
+    for resources in _get_db_resources(("project",), project=project):
+        for (project,), res in resources:
+            holdings[project].update(res)
+    return holdings
 
-    for net_res in net_resources.iterator():
-        user = net_res['userid']
-        if user is None:
-            continue
-        project = net_res['project']
-        holdings[user][project]["cyclades.network.private"] = net_res["num"]
 
-    floating_ips_resources = floating_ips.values("userid", "project")\
-                                         .annotate(num=Count("id"))
+def iter_db_project_holdings(project=None):
+    """Iterate over the project holdings of Cyclades DB, ordered by project.
 
-    for floating_ip_res in floating_ips_resources.iterator():
-        user = floating_ip_res["userid"]
-        project = floating_ip_res["project"]
-        holdings[user][project]["cyclades.floating_ip"] = \
-            floating_ip_res["num"]
+    Yield (project, holdings) pairs, as in iter_db_holdings().
 
-    return holdings
+    """
+    resources = _merge_db_resources(("project",), project=project)
+    for project, group in groupby(resources, lambda res: res[0][0]):
+        holdings = {}
+        for _, res in group:
+            holdings.update(res)
+        yield project, holdings
 
 
-def get_db_project_holdings(project=None):
-    """Get holdings from Cyclades DB."""
-    holdings = QuotaDict()
+def _merge_db_resources(keys, user=None, project=None):
+    """Merge the resources of Cyclades DB in a single stream.
+
+    Holdings without a holder cannot be reconciled and are skipped, since
+    they would break the ordering of the stream. The aggregated rows are
+    sorted in Python, since the order of the DB depends on its collation
+    and may not match the order of the Quotaholder holdings, e.g. for
+    mixed-case or non-ASCII holders.
+
+    """
+    resources = _get_db_resources(keys, user, project)
+    resources = [sorted(ifilter(lambda res: res[0][0] is not None, res))
+                 for res in resources]
+    return heapq.merge(*resources)
+
+
+def _get_db_resources(keys, user=None, project=None):
+    """Get the resources of Cyclades DB, aggregated by the given keys.
+
+    Return a list of iterators, one for each DB query, which yield
+    (key values, resources) pairs ordered by the key values.
 
+    """
     vms = VirtualMachine.objects.filter(deleted=False)
     networks = Network.objects.filter(deleted=False)
     floating_ips = IPAddress.objects.filter(deleted=False, floating_ip=True)
 
+    if user is not None:
+        vms = vms.filter(userid=user)
+        networks = networks.filter(userid=user)
+        floating_ips = floating_ips.filter(userid=user)
+
     if project is not None:
         vms = vms.filter(project=project)
         networks = networks.filter(project=project)
         floating_ips = floating_ips.filter(project=project)
 
     # Get resources related with VMs
-    vm_resources = vms.values("project")\
+    vm_resources = vms.values(*keys)\
         .annotate(num=Count("id"),
                   total_ram=Sum("flavor__ram"),
                   total_cpu=Sum("flavor__cpu"),
-                  disk=Sum("flavor__disk"))
-
-    for vm_res in vm_resources.iterator():
-        project = vm_res['project']
-        res = {"cyclades.vm": vm_res["num"],
-               "cyclades.total_cpu": vm_res["total_cpu"],
-               "cyclades.disk": vm_res["disk"] * GiB,
-               "cyclades.total_ram": vm_res["total_ram"] * MiB}
-        holdings[project] = res
+                  disk=Sum("flavor__disk"))\
+        .order_by(*keys)
 
-    vm_active_resources = vms.values("project")\
+    vm_active_resources = vms.values(*keys)\
         .filter(Q(operstate="STARTED") | Q(operstate="BUILD") |
                 Q(operstate="ERROR"))\
         .annotate(ram=Sum("flavor__ram"),
-                  cpu=Sum("flavor__cpu"))
-
-    for vm_res in vm_active_resources.iterator():
-        project = vm_res['project']
-        holdings[project]["cyclades.cpu"] = vm_res["cpu"]
-        holdings[project]["cyclades.ram"] = vm_res["ram"] * MiB
+                  cpu=Sum("flavor__cpu"))\
+        .order_by(*keys)
 
     # Get resources related with networks
-    net_resources = networks.values("project").annotate(num=Count("id"))
-
-    for net_res in net_resources.iterator():
-        project = net_res['project']
-        if project is None:
+    net_resources = networks.values(*keys)\
+                            .annotate(num=Count("id"))\
+                            .order_by(*keys)
+
+    floating_ips_resources = floating_ips.values(*keys)\
+                                         .annotate(num=Count("id"))\
+                                         .order_by(*keys)
+
+    def vm_res(res):
+        return {"cyclades.vm": res["num"],
+                "cyclades.total_cpu": res["total_cpu"],
+                "cyclades.disk": res["disk"] * GiB,
+                "cyclades.total_ram": res["total_ram"] * MiB}
+
+    def vm_active_res(res):
+        return {"cyclades.cpu": res["cpu"],
+                "cyclades.ram": res["ram"] * MiB}
+
+    def net_res(res):
+        return {"cyclades.network.private": res["num"]}
+
+    def floating_ip_res(res):
+        return {"cyclades.floating_ip": res["num"]}
+
+    return [_iter_db_resources(vm_resources, keys, vm_res),
+            _iter_db_resources(vm_active_resources, keys, vm_active_res),
+            # Public networks have no holder
+            _iter_db_resources(net_resources, keys, net_res,
+                               skip_no_holder=True),
+            _iter_db_resources(floating_ips_resources, keys,
+                               floating_ip_res)]
+
+
+def _iter_db_resources(queryset, keys, get_resources, skip_no_holder=False):
+    for res in queryset.iterator():
+        key_values = tuple(res[key] for key in keys)
+        if skip_no_holder and key_values[0] is None:
             continue
-        holdings[project]["cyclades.network.private"] = net_res["num"]
-
-    floating_ips_resources = floating_ips.values("project")\
-        .annotate(num=Count("id"))
-
-    for floating_ip_res in floating_ips_resources.iterator():
-        project = floating_ip_res["project"]
-        holdings[project]["cyclades.floating_ip"] = floating_ip_res["num"]
-
-    return holdings
+        yield key_values, get_resources(res)
 
 
 def get_quotaholder_holdings(user=None):
@@ -219,6 +239,29 @@ def get_qh_project_holdings(projects=None):
     return qs
 
 
+def iter_qh_users_holdings(users=None):
+    """Iterate over the Quotaholder holdings of users, ordered by user.
+
+    The holdings of all users are fetched one page at a time.
+
+    """
+    if users is None:
+        for user_holdings in Quotaholder.get().service_iter_quotas():
+            yield user_holdings
+        return
+    holdings = get_qh_users_holdings(users)
+    for user in sorted(holdings):
+        yield user, holdings[user]
+
+
+def iter_qh_project_holdings(projects=None):
+    """Iterate over the Quotaholder holdings of projects, ordered by project.
+    """
+    holdings = get_qh_project_holdings(projects)
+    for project in sorted(holdings):
+        yield project, holdings[project]
+
+
 def transform_quotas(quotas):
     d = {}
     for resource, counters in quotas.iteritems():
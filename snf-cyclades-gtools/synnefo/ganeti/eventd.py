@@ -52,6 +52,7 @@ sys.path.append(path)
 sys.path.insert(0, "/usr/share/ganeti")
 
 import json
+import time
 import logging
 import pyinotify
 import daemon
@@ -67,7 +68,13 @@ from ganeti.ssconf import SimpleStore
 
 
 from synnefo import settings
-from synnefo.lib.amqp import AMQPClient
+from synnefo.lib.amqp import AMQPPublisher
+from synnefo.lib.ordereddict import OrderedDict
+
+# Number of recently seen jobs whose state is kept in memory
+JOB_CACHE_SIZE = 1024
+# Number of seconds between logging the publishing statistics
+STATS_INTERVAL = 60
 
 
 def get_time_from_status(op, job):
@@ -171,6 +178,38 @@ def get_field(from_, field):
         None
 
 
+def get_op_states(data):
+    """Get the state of each opcode from a serialized job.
+
+    The state of an opcode consists of its status and the length of its log,
+    which are the only fields that change between subsequent writes of a job
+    file and affect the published message.
+
+    """
+    return [(op.get("status"), len(op.get("log") or []))
+            for op in data.get("ops", [])]
+
+
+def get_file_signature(st):
+    """Return the signature of a file, given the result of os.stat.
+
+    Ganeti replaces a job file by renaming a new file over it, so the inode
+    tells apart writes that the mtime can not, e.g. when they happen within
+    the resolution of the filesystem timestamps. The mtime is a float, with
+    the full resolution of the filesystem.
+
+    """
+    return (st.st_ino, st.st_mtime, st.st_size)
+
+
+def get_changed_ops(old_states, new_states):
+    """Return the indexes of opcodes whose state has changed."""
+    if old_states is None or len(old_states) != len(new_states):
+        return range(len(new_states))
+    return [i for i, (old, new) in enumerate(zip(old_states, new_states))
+            if old != new]
+
+
 class JobFileHandler(pyinotify.ProcessEvent):
     def __init__(self, logger, cluster_name):
         pyinotify.ProcessEvent.__init__(self)
@@ -178,8 +217,10 @@ class JobFileHandler(pyinotify.ProcessEvent):
         self.cluster_name = cluster_name
 
         # Set max_retries to 0 for unlimited retries.
-        self.client = AMQPClient(hosts=settings.AMQP_HOSTS, confirm_buffer=25,
-                                 max_retries=0, logger=logger)
+        self.client = AMQPPublisher(
+            hosts=settings.AMQP_HOSTS,
+            connections=settings.AMQP_PUBLISHER_CONNECTIONS,
+            confirm_buffer=25, max_retries=0, logger=logger)
 
         handler_logger.info("Attempting to connect to RabbitMQ hosts")
 
@@ -193,6 +234,27 @@ class JobFileHandler(pyinotify.ProcessEvent):
                             "CLUSTER": self.process_cluster_op}
                             # "GROUP": self.process_group_op}
 
+        # Last seen file signature and opcode states of recent jobs, used to
+        # skip job files and opcodes that have not changed since the last
+        # inotify event for the same job.
+        self.jobs = OrderedDict()
+        self.stats_time = time.time()
+        # Whether messages have been published without waiting for their
+        # confirmations
+        self.pending = False
+
+    def get_job_state(self, job_id):
+        try:
+            return self.jobs[job_id]
+        except KeyError:
+            return None, None
+
+    def set_job_state(self, job_id, signature, op_states):
+        self.jobs.pop(job_id, None)
+        self.jobs[job_id] = (signature, op_states)
+        while len(self.jobs) > JOB_CACHE_SIZE:
+            self.jobs.popitem(last=False)
+
     def process_IN_CLOSE_WRITE(self, event):
         self.process_IN_MOVED_TO(event)
 
@@ -203,16 +265,38 @@ class JobFileHandler(pyinotify.ProcessEvent):
             return
 
         try:
+            job_id = int(event.name[len("job-"):])
+        except ValueError:
+            self.logger.debug("Not a job file: %s" % event.path)
+            return
+
+        try:
+            st = os.stat(jobfile)
             data = utils.ReadFile(jobfile)
-        except IOError:
+        except (IOError, OSError):
+            return
+
+        # Skip repeated events for a job file that has not been modified
+        signature = get_file_signature(st)
+        old_signature, old_op_states = self.get_job_state(job_id)
+        if signature == old_signature:
+            self.logger.debug("Job file not modified: %s", jobfile)
             return
 
         data = serializer.LoadJson(data)
-        job = jqueue._QueuedJob.Restore(None, data, False, False)
 
-        job_id = int(job.id)
+        # Only restore the job if the state of some of its opcodes changed
+        op_states = get_op_states(data)
+        changed_ops = get_changed_ops(old_op_states, op_states)
+        if not changed_ops:
+            self.set_job_state(job_id, signature, op_states)
+            return
+
+        job = jqueue._QueuedJob.Restore(None, data, False, False)
 
-        for op in job.ops:
+        messages = []
+        for index in changed_ops:
+            op = job.ops[index]
             op_id = op.input.OP_ID
 
             msg = None
@@ -252,14 +336,38 @@ class JobFileHandler(pyinotify.ProcessEvent):
                 # so that the job can be retried if needed.
                 msg["job_fields"] = op.Serialize()["input"]
 
+            # Publish the messages of each instance or network over the same
+            # connection, in order to preserve their order
+            key = msg.get("instance", msg.get("network", routekey))
+
             msg = json.dumps(msg)
 
             self.logger.debug("Delivering msg: %s (key=%s)", msg, routekey)
-
-            # Send the message to RabbitMQ
-            self.client.basic_publish(settings.EXCHANGE_GANETI,
-                                      routekey,
-                                      msg)
+            messages.append((routekey, msg, key))
+
+        # Send all messages of the job to RabbitMQ. Their confirmations are
+        # collected by get_confirms, once for all jobs of an inotify batch.
+        if messages:
+            self.client.basic_publish_batch(settings.EXCHANGE_GANETI,
+                                            messages, wait=False)
+            self.pending = True
+
+        self.set_job_state(job_id, signature, op_states)
+
+    def get_confirms(self):
+        """Wait for the confirmations of all messages published so far."""
+        if self.pending:
+            self.client.get_confirms()
+            self.pending = False
+            self.log_stats()
+
+    def log_stats(self):
+        """Log the publishing statistics, every STATS_INTERVAL seconds."""
+        now = time.time()
+        if now - self.stats_time >= STATS_INTERVAL:
+            self.stats_time = now
+            self.logger.debug("Publish statistics: %s",
+                              self.client.get_stats())
 
     def process_instance_op(self, op, job_id):
         """ Process OP_INSTANCE_* opcodes.
@@ -408,6 +516,9 @@ def main():
 
     (opts, args) = parse_arguments(sys.argv[1:])
 
+    # Job file signatures need the sub-second part of the mtime
+    os.stat_float_times(True)
+
     # Initialize logger
     lvl = logging.DEBUG if opts.debug else logging.INFO
     logger = logging.getLogger("ganeti.eventd")
@@ -479,6 +590,8 @@ def main():
         while True:    # loop forever
             # process the queue of events as explained above
             notifier.process_events()
+            # wait for the confirmations of the processed events
+            handler.get_confirms()
             if notifier.check_events():
                 # read notified events and enqeue them
                 notifier.read_events()
@@ -37,8 +37,9 @@
 
 import sys
 import logging
-from synnefo.ganeti.eventd import get_instance_nics
-from mock import patch
+from synnefo.ganeti.eventd import (get_instance_nics, get_op_states,
+                                    get_changed_ops, get_file_signature)
+from mock import patch, Mock
 
 log = logging.getLogger()
 
@@ -101,5 +102,43 @@ class GanetiNICTestCase(unittest.TestCase):
         self.assertEqual(nics0, nics1)
 
 
+class JobOpStatesTestCase(unittest.TestCase):
+    def test_op_states(self):
+        data = {"id": "1",
+                "ops": [{"status": "success", "log": [[1, 2, "a", "b"]]},
+                        {"status": "running", "log": []},
+                        {"status": "queued"}]}
+        self.assertEqual(get_op_states(data),
+                         [("success", 1), ("running", 0), ("queued", 0)])
+
+    def test_new_job(self):
+        states = [("queued", 0), ("queued", 0)]
+        self.assertEqual(get_changed_ops(None, states), [0, 1])
+
+    def test_unchanged_job(self):
+        states = [("success", 2), ("running", 1)]
+        self.assertEqual(get_changed_ops(states, list(states)), [])
+
+    def test_changed_ops(self):
+        old = [("success", 2), ("running", 1), ("queued", 0)]
+        new = [("success", 2), ("running", 2), ("running", 0)]
+        self.assertEqual(get_changed_ops(old, new), [1, 2])
+
+    def test_file_signature(self):
+        st = Mock(st_ino=10, st_mtime=1392487853.123456, st_size=42)
+        # A file renamed over the job file, with the same mtime and size
+        renamed = Mock(st_ino=11, st_mtime=1392487853.123456, st_size=42)
+        self.assertNotEqual(get_file_signature(st),
+                            get_file_signature(renamed))
+        # A write within the same second
+        written = Mock(st_ino=10, st_mtime=1392487853.654321, st_size=42)
+        self.assertNotEqual(get_file_signature(st),
+                            get_file_signature(written))
+        self.assertEqual(get_file_signature(st),
+                         get_file_signature(Mock(st_ino=10,
+                                                 st_mtime=1392487853.123456,
+                                                 st_size=42)))
+
+
 if __name__ == '__main__':
     unittest.main()
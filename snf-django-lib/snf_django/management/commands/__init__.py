@@ -31,6 +31,8 @@
 # interpreted as representing official policies, either expressed
 # or implied, of GRNET S.A.
 
+import itertools
+
 from optparse import (make_option, OptionParser, OptionGroup,
                       TitledHelpFormatter)
 
@@ -130,6 +132,10 @@ class ListCommand(SynnefoCommand):
 
     * Pretty printing output to a nice table.
 
+    The objects are retrieved and printed in chunks of ``chunk_size``
+    objects, so the ``handle_db_objects`` and ``handle_output`` hooks are
+    called once for each chunk.
+
     """
 
     # The following fields must be handled in the ListCommand subclasses!
@@ -157,6 +163,10 @@ class ListCommand(SynnefoCommand):
     # Optimize DB queries
     prefetch_related = []
     select_related = []
+    # Number of objects to retrieve from the DB at once. Each chunk is
+    # fetched with an IN clause, which must stay below the 999 variables
+    # that SQLite allows in a query.
+    chunk_size = 500
 
     help = "Generic List Command"
     option_list = SynnefoCommand.option_list + (
@@ -189,6 +199,14 @@ class ListCommand(SynnefoCommand):
             action="store_false",
             default=True,
             help="Do not display headers"),
+        make_option(
+            "--stream",
+            dest="stream",
+            action="store_true",
+            default=False,
+            help="Print the results while they are retrieved. Column widths"
+                 " are computed from the first results. Output in csv and"
+                 " json format is always streamed"),
     )
 
     def __init__(self, *args, **kwargs):
@@ -307,18 +325,52 @@ class ListCommand(SynnefoCommand):
         if USER_EMAIL_FIELD in self.fields:
             if '_user_email' in self.object_class._meta.get_all_field_names():
                 raise RuntimeError("%s has already a 'user_mail' attribute")
-            uuids = [getattr(obj, self.user_uuid_field) for obj in objects]
-            ucache = UserCache(self.astakos_auth_url, self.astakos_token)
-            ucache.fetch_names(list(set(uuids)))
+            self.ucache = UserCache(self.astakos_auth_url, self.astakos_token)
+
+        fields = self.fields
+        chunks = (self.get_table(chunk, fields, **options)
+                  for chunk in self.iter_db_objects(objects))
+
+        # Print output
+        headers = fields
+        output_format = options["output_format"]
+        if output_format != "json" and not options["headers"]:
+            headers = None
+        if output_format == "pretty" and not options["stream"]:
+            table = [row for chunk in chunks for row in chunk]
+            utils.pprint_table(self.stdout, table, headers, output_format)
+        else:
+            utils.pprint_table_chunks(self.stdout, chunks, headers,
+                                      output_format)
+
+    def iter_db_objects(self, objects):
+        """Iterate over the DB objects in chunks of 'chunk_size' objects.
+
+        Only the primary keys of the results are fetched up front. The objects
+        of each chunk are then retrieved with a separate query, which also
+        prefetches their related objects.
+
+        """
+        pks = objects.values_list("pk", flat=True).iterator()
+        while True:
+            chunk_pks = list(itertools.islice(pks, self.chunk_size))
+            if not chunk_pks:
+                return
+            chunk = objects.in_bulk(chunk_pks)
+            yield [chunk[pk] for pk in chunk_pks if pk in chunk]
+
+    def get_table(self, objects, headers, **options):
+        if USER_EMAIL_FIELD in self.fields:
+            uuids = set(getattr(obj, self.user_uuid_field) for obj in objects)
+            uuids = [uuid for uuid in uuids if uuid not in self.ucache.users]
+            self.ucache.fetch_names(uuids)
             for obj in objects:
                 uuid = getattr(obj, self.user_uuid_field)
-                obj._user_email = ucache.get_name(uuid)
+                obj._user_email = self.ucache.get_name(uuid)
 
         # Special handling of DB results
-        objects = list(objects)
         self.handle_db_objects(objects, **options)
 
-        headers = self.fields
         columns = [self.FIELDS[key][0] for key in headers]
 
         table = []
@@ -337,12 +389,7 @@ class ListCommand(SynnefoCommand):
 
         # Special handle of output
         self.handle_output(table, headers)
-
-        # Print output
-        output_format = options["output_format"]
-        if output_format != "json" and not options["headers"]:
-            headers = None
-        utils.pprint_table(self.stdout, table, headers, output_format)
+        return table
 
     def handle_args(self, *args, **kwargs):
         pass
@@ -1,4 +1,6 @@
 import sys
+import json
+from StringIO import StringIO
 from snf_django.management import utils
 
 # Use backported unittest functionality if Python < 2.7
@@ -27,5 +29,43 @@ class ParseFiltersTestCase(unittest.TestCase):
         excludes = {"y": "4"}
         self.assertEqual(res, (filters, excludes))
 
+
+class PrintTableChunksTestCase(unittest.TestCase):
+    headers = ["id", "name"]
+    chunks = [[[1, "a"], [2, u"\u03b2"]], [], [[3, "long name"]]]
+
+    def _print(self, func, *args, **kwargs):
+        out = StringIO()
+        func(out, *args, **kwargs)
+        return out.getvalue()
+
+    def test_same_as_table(self):
+        table = [row for chunk in self.chunks for row in chunk]
+        for output_format in ["json", "csv"]:
+            expected = self._print(utils.pprint_table, table, self.headers,
+                                   output_format)
+            res = self._print(utils.pprint_table_chunks, iter(self.chunks),
+                              self.headers, output_format)
+            if output_format == "json":
+                expected, res = json.loads(expected), json.loads(res)
+            self.assertEqual(res, expected)
+        # Column widths are sampled from the first chunk
+        expected = self._print(utils.pprint_table, self.chunks[0],
+                               self.headers)
+        res = self._print(utils.pprint_table_chunks, iter(self.chunks),
+                          self.headers)
+        self.assertTrue(res.startswith(expected))
+        self.assertEqual(res[len(expected):], " 3  long name\n")
+
+    def test_empty(self):
+        res = self._print(utils.pprint_table_chunks, iter([]), self.headers,
+                          "json")
+        self.assertEqual(json.loads(res), [])
+        expected = self._print(utils.pprint_table, [], self.headers)
+        res = self._print(utils.pprint_table_chunks, iter([[]]),
+                          self.headers)
+        self.assertEqual(res, expected)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -165,6 +165,13 @@ def filter_object_results(results, filters):
     return results
 
 
+def stringnify(obj):
+    if isinstance(obj, (unicode, str)):
+        return udec(obj)
+    else:
+        return str(obj)
+
+
 def pprint_table(out, table, headers=None, output_format='pretty',
                  separator=None, vertical=False, title=None):
     """Print a pretty, aligned string representation of table.
@@ -179,12 +186,6 @@ def pprint_table(out, table, headers=None, output_format='pretty',
 
     sep = separator if separator else "  "
 
-    def stringnify(obj):
-        if isinstance(obj, (unicode, str)):
-            return udec(obj)
-        else:
-            return str(obj)
-
     if headers:
         headers = map(stringnify, headers)
     table = [map(stringnify, row) for row in table]
@@ -234,3 +235,61 @@ def pprint_table(out, table, headers=None, output_format='pretty',
                 out.write(line + "\n")
     else:
         raise ValueError("Unknown output format '%s'" % output_format)
+
+
+def pprint_table_chunks(out, chunks, headers=None, output_format='pretty',
+                        separator=None):
+    """Print a table that is given as an iterable of chunks of rows.
+
+    Each chunk is written as soon as it is produced, so the whole table is
+    never kept in memory. In 'pretty' format, the column widths are computed
+    from the headers and the first chunk, and values of later chunks that do
+    not fit are not truncated.
+    """
+
+    if headers:
+        assert(isinstance(headers, (list, tuple))), "Invalid headers type"
+        headers = map(stringnify, headers)
+
+    sep = separator if separator else "  "
+    chunks = ([map(stringnify, row) for row in chunk] for chunk in chunks)
+
+    if output_format == "json":
+        assert(headers is not None), "json output format requires headers"
+        out.write("[")
+        first = True
+        for chunk in chunks:
+            for row in chunk:
+                entry = json.dumps(dict(zip(headers, row)), indent=4)
+                out.write("\n" if first else ",\n")
+                out.write("\n".join("    " + l for l in entry.split("\n")))
+                first = False
+        out.write("]\n" if first else "\n]\n")
+    elif output_format == "csv":
+        cw = csv.writer(out)
+        if headers:
+            cw.writerow(map(uenc, headers))
+        for chunk in chunks:
+            cw.writerows(map(functools.partial(map, uenc), chunk))
+    elif output_format == "pretty":
+        widths = None
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if widths is None:
+                # Sample the column widths from the first chunk
+                columns = [headers] + chunk if headers else chunk
+                widths = [max(map(len, col)) for col in zip(*(columns))]
+                if headers:
+                    t_length = sum(widths) + len(sep) * (len(widths) - 1)
+                    line = sep.join(uenc(v.rjust(w))
+                                    for v, w in zip(headers, widths))
+                    out.write(line + "\n")
+                    out.write("-" * t_length + "\n")
+            for row in chunk:
+                line = sep.join(uenc(v.rjust(w)) for v, w in zip(row, widths))
+                out.write(line + "\n")
+        if widths is None and headers:
+            pprint_table(out, [], headers, output_format, separator)
+    else:
+        raise ValueError("Unknown output format '%s'" % output_format)
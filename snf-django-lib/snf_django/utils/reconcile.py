@@ -117,6 +117,91 @@ def check_users(stderr, resources, db_usage, qh_usage):
     return unsynced, pending_exists, unknown_exists
 
 
+def merge_holdings(db_holdings, qh_holdings):
+    """Merge-join two iterables of (holder, usage) pairs sorted by holder.
+
+    Yield (holder, db_usage, qh_usage) tuples, in holder order, where the
+    usage of the side that has no entry for the holder is None. Raise
+    ValueError if any of the iterables is not sorted, since a wrong order
+    would show up as missing holdings.
+
+    """
+    db_holdings = _check_sorted(db_holdings)
+    qh_holdings = _check_sorted(qh_holdings)
+    db = next(db_holdings, None)
+    qh = next(qh_holdings, None)
+    while db is not None or qh is not None:
+        if qh is None or (db is not None and db[0] < qh[0]):
+            yield db[0], db[1], None
+            db = next(db_holdings, None)
+        elif db is None or qh[0] < db[0]:
+            yield qh[0], None, qh[1]
+            qh = next(qh_holdings, None)
+        else:
+            yield db[0], db[1], qh[1]
+            db = next(db_holdings, None)
+            qh = next(qh_holdings, None)
+
+
+def _check_sorted(holdings):
+    previous = None
+    for holder, usage in holdings:
+        if previous is not None and holder <= previous:
+            raise ValueError("Holdings are not sorted by holder: '%s' after"
+                             " '%s'" % (holder, previous))
+        previous = holder
+        yield holder, usage
+
+
+def chunk_holdings(db_holdings, qh_holdings, chunk_size=1000):
+    """Split two sorted iterables of (holder, usage) pairs in chunks.
+
+    Yield pairs of (db_usage, qh_usage) dicts that contain the usage of the
+    same chunk_size holders, as found on each side.
+
+    """
+    db_chunk, qh_chunk = {}, {}
+    count = 0
+    for holder, db_usage, qh_usage in merge_holdings(db_holdings,
+                                                     qh_holdings):
+        if db_usage is not None:
+            db_chunk[holder] = db_usage
+        if qh_usage is not None:
+            qh_chunk[holder] = qh_usage
+        count += 1
+        if count >= chunk_size:
+            yield db_chunk, qh_chunk
+            db_chunk, qh_chunk = {}, {}
+            count = 0
+    if count:
+        yield db_chunk, qh_chunk
+
+
+def check_users_chunked(stderr, resources, db_usage, qh_usage,
+                        chunk_size=1000):
+    """Check users usage in chunks.
+
+    Like check_users(), but db_usage and qh_usage are iterables of
+    (user, usage) pairs sorted by user. Yield the result of check_users() for
+    each chunk of chunk_size users, so that unsynced holdings can be fixed
+    while the rest of the holdings are still being read.
+
+    """
+    for db_chunk, qh_chunk in chunk_holdings(db_usage, qh_usage, chunk_size):
+        yield check_users(stderr, resources, db_chunk, qh_chunk)
+
+
+def check_projects_chunked(stderr, resources, db_usage, qh_usage,
+                           chunk_size=1000):
+    """Check projects usage in chunks.
+
+    Like check_users_chunked(), for iterables of (project, usage) pairs.
+
+    """
+    for db_chunk, qh_chunk in chunk_holdings(db_usage, qh_usage, chunk_size):
+        yield check_projects(stderr, resources, db_chunk, qh_chunk)
+
+
 def create_user_provisions(provision_list):
     provisions = {}
     for _, holder, source, resource, db_value, qh_value in provision_list:
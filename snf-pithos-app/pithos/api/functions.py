@@ -1451,9 +1451,10 @@ def object_update(request, v_account, v_container, v_object):
                     if bl == request.backend.block_size:
                         hashmap[bi] = src_hashmap[sbi]
                     else:
-                        data = request.backend.get_block(src_hashmap[sbi])
+                        data = request.backend.get_block(src_hashmap[sbi],
+                                                         0, bl)
                         hashmap[bi] = request.backend.update_block(
-                            hashmap[bi], data[:bl], 0)
+                            hashmap[bi], data, 0)
                 else:
                     hashmap.append(src_hashmap[sbi])
                 offset += bl
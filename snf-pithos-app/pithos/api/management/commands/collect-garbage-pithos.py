@@ -0,0 +1,85 @@
+# Copyright 2012, 2013 GRNET S.A. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+#   1. Redistributions of source code must retain the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer.
+#
+#   2. Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials
+#      provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY GRNET S.A. ``AS IS'' AND ANY EXPRESS
+# OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL GRNET S.A OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+# USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED
+# AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and
+# documentation are those of the authors and should not be
+# interpreted as representing official policies, either expressed
+# or implied, of GRNET S.A.
+
+from django.core.management.base import NoArgsCommand, CommandError
+
+from optparse import make_option
+
+from pithos.api.util import get_backend
+
+
+class Command(NoArgsCommand):
+    help = """Remove the maps and blocks that are no longer in use.
+
+    Mark the maps referenced by any object version, in any cluster, and the
+    blocks they contain, and remove every other map and block from the
+    block storage. Maps and blocks modified in the grace period are kept,
+    so that the command can run while uploads are in progress.
+
+    """
+    option_list = NoArgsCommand.option_list + (
+        make_option("--grace-period",
+                    dest="grace_period",
+                    default=86400,
+                    type="int",
+                    help="Keep maps and blocks modified in the last"
+                         " GRACE_PERIOD seconds (default: 86400)"),
+        make_option("--dry-run",
+                    dest="dry_run",
+                    default=False,
+                    action="store_true",
+                    help="Only count the maps and blocks to remove"),
+    )
+
+    def handle_noargs(self, **options):
+        if options["grace_period"] < 0:
+            raise CommandError("The grace period must not be negative")
+
+        backend = get_backend()
+        try:
+            backend.pre_exec()
+            maps, blocks = backend.collect_garbage(
+                options["grace_period"], dry_run=options["dry_run"])
+        except BaseException as e:
+            backend.post_exec(False)
+            raise CommandError(e)
+        else:
+            backend.post_exec(True)
+        finally:
+            backend.close()
+
+        if options["dry_run"]:
+            msg = "Would remove %s maps and %s blocks.\n"
+        else:
+            msg = "Removed %s maps and %s blocks.\n"
+        self.stdout.write(msg % (maps, blocks))
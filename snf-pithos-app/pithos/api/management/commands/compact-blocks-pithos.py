@@ -0,0 +1,77 @@
+# Copyright 2012, 2013 GRNET S.A. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+#   1. Redistributions of source code must retain the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer.
+#
+#   2. Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials
+#      provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY GRNET S.A. ``AS IS'' AND ANY EXPRESS
+# OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL GRNET S.A OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+# USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED
+# AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and
+# documentation are those of the authors and should not be
+# interpreted as representing official policies, either expressed
+# or implied, of GRNET S.A.
+
+from django.core.management.base import NoArgsCommand, CommandError
+
+from optparse import make_option
+
+from pithos.api.util import get_backend
+
+
+class Command(NoArgsCommand):
+    help = """Reclaim the space of removed blocks in segment files.
+
+    Only for the 'pithos.backends.lib.packfiler' block module. Copy the
+    blocks still in use out of the segment files with enough unused space,
+    and delete these files. Segment files written by Pithos servers that
+    are still running are skipped, so restart them to compact everything.
+    Segment files written by other hosts sharing the block path are skipped
+    too, so run this command on each host.
+
+    """
+    option_list = NoArgsCommand.option_list + (
+        make_option("--min-garbage",
+                    dest="min_garbage",
+                    default=0.5,
+                    type="float",
+                    help="Compact segment files where at least this"
+                         " fraction of the space is unused (default: 0.5)"),
+    )
+
+    def handle_noargs(self, **options):
+        min_garbage = options["min_garbage"]
+        if not 0 < min_garbage <= 1:
+            raise CommandError("--min-garbage must be in (0, 1]")
+
+        backend = get_backend()
+        try:
+            if not hasattr(backend.store, "compact"):
+                module = backend.block_module.__name__
+                raise CommandError("Block module '%s' does not support"
+                                   " compaction" % module)
+            segments, size = backend.store.compact(min_garbage)
+        finally:
+            backend.close()
+
+        self.stdout.write("Deleted %s segment files, reclaimed %s bytes.\n"
+                          % (segments, size))
@@ -68,7 +68,13 @@ class Command(NoArgsCommand):
                     default=False,
                     action="store_true",
                     help="Override Astakos quotas. Force Astakos to impose "
-                         "the Pithos quota, independently of their value.")
+                         "the Pithos quota, independently of their value."),
+        make_option("--chunk-size",
+                    dest="chunk_size",
+                    default=1000,
+                    type="int",
+                    help="Number of holders to check and fix at a time "
+                         "(default: 1000)"),
     )
 
     def handle_noargs(self, **options):
@@ -77,23 +83,31 @@ class Command(NoArgsCommand):
             backend.pre_exec()
             userid = options['userid']
             project = options['project']
+            chunk_size = options['chunk_size']
+
+            # Get holding from Pithos DB, sorted by holder
+            db_usage = backend.node.node_account_usage_iter(userid, project)
+            db_project_usage = backend.node.node_project_usage_iter(project)
+
+            if userid:
+                db_usage = list(db_usage)
+                users = set(user for user, _ in db_usage)
+                if userid not in users:
+                    if backend._lookup_account(userid) is None:
+                        write("User '%s' does not exist in DB!\n" % userid)
+                        return
 
-            # Get holding from Pithos DB
-            db_usage = backend.node.node_account_usage(userid, project)
-            db_project_usage = backend.node.node_project_usage(project)
-
-            users = set(db_usage.keys())
-            if userid and userid not in users:
-                if backend._lookup_account(userid) is None:
-                    write("User '%s' does not exist in DB!\n" % userid)
+            # Get holding from Quotaholder, one page at a time
+            if userid:
+                try:
+                    qh_result = sorted_items(
+                        backend.astakosclient.service_get_quotas(userid))
+                except NotFound:
+                    write("User '%s' does not exist in Quotaholder!\n" %
+                          userid)
                     return
-
-            # Get holding from Quotaholder
-            try:
-                qh_result = backend.astakosclient.service_get_quotas(userid)
-            except NotFound:
-                write("User '%s' does not exist in Quotaholder!\n" % userid)
-                return
+            else:
+                qh_result = backend.astakosclient.service_iter_quotas()
 
             try:
                 qh_project_result = \
@@ -101,30 +115,42 @@ class Command(NoArgsCommand):
             except NotFound:
                 write("Project '%s' does not exist in Quotaholder!\n" %
                       project)
+                qh_project_result = {}
 
-            unsynced_users, users_pending, users_unknown =\
-                reconcile.check_users(self.stderr, RESOURCES,
-                                      db_usage, qh_result)
+            user_chunks = reconcile.check_users_chunked(
+                self.stderr, RESOURCES, db_usage, qh_result,
+                chunk_size=chunk_size)
 
-            unsynced_projects, projects_pending, projects_unknown =\
-            reconcile.check_projects(self.stderr, RESOURCES,
-                                     db_project_usage, qh_project_result)
-            pending_exists = users_pending or projects_pending
-            unknown_exists = users_unknown or projects_unknown
+            project_chunks = reconcile.check_projects_chunked(
+                self.stderr, RESOURCES, db_project_usage,
+                sorted_items(qh_project_result), chunk_size=chunk_size)
 
             headers = ("Type", "Holder", "Source", "Resource",
                        "Database", "Quotaholder")
-            unsynced = unsynced_users + unsynced_projects
-            if unsynced:
-                utils.pprint_table(self.stdout, unsynced, headers)
-                if options["fix"]:
+            unsynced_exists = pending_exists = unknown_exists = False
+            fixed = False
+            for holder_type, chunks in (("user", user_chunks),
+                                        ("project", project_chunks)):
+                for unsynced, pending, unknown in chunks:
+                    pending_exists = pending_exists or pending
+                    unknown_exists = unknown_exists or unknown
+                    if not unsynced:
+                        continue
+                    unsynced_exists = True
+                    utils.pprint_table(self.stdout, unsynced, headers)
+                    if not options["fix"]:
+                        continue
+                    if holder_type == "user":
+                        user_provisions = reconcile.create_user_provisions(
+                            unsynced)
+                        project_provisions = {}
+                    else:
+                        user_provisions = {}
+                        project_provisions = \
+                            reconcile.create_project_provisions(unsynced)
                     force = options["force"]
                     name = ("client: reconcile-resources-pithos, time: %s"
                             % datetime.now())
-                    user_provisions = reconcile.create_user_provisions(
-                        unsynced_users)
-                    project_provisions = reconcile.create_project_provisions(
-                        unsynced_projects)
                     try:
                         backend.astakosclient.issue_commission_generic(
                             user_provisions, project_provisions, name=name,
@@ -133,12 +159,15 @@ class Command(NoArgsCommand):
                         write("Reconciling failed because a limit has been "
                               "reached. Use --force to ignore the check.\n")
                         return
-                    write("Fixed unsynced resources\n")
+                    fixed = True
+
+            if fixed:
+                write("Fixed unsynced resources\n")
 
             if pending_exists:
                 write("Found pending commissions. Run 'snf-manage"
                       " reconcile-commissions-pithos'\n")
-            elif not (unsynced or unknown_exists):
+            elif not (unsynced_exists or unknown_exists):
                 write("Everything in sync.\n")
         except BaseException as e:
             backend.post_exec(False)
@@ -147,3 +176,9 @@ class Command(NoArgsCommand):
             backend.post_exec(True)
         finally:
             backend.close()
+
+
+def sorted_items(holdings):
+    """Iterate over (holder, holdings) pairs, sorted by holder."""
+    for holder in sorted(holdings):
+        yield holder, holdings[holder]
@@ -136,6 +136,20 @@ BACKEND_BLOCK_MODULE = getattr(
 BACKEND_BLOCK_PATH = getattr(
     settings, 'PITHOS_BACKEND_BLOCK_PATH', '/tmp/pithos-data/')
 BACKEND_BLOCK_UMASK = getattr(settings, 'PITHOS_BACKEND_BLOCK_UMASK', 0o022)
+# Size of the segment files of the 'pithos.backends.lib.packfiler' module,
+# which packs blocks in large files instead of a file per block. A block path
+# shared between hosts, e.g. over NFS, must support POSIX file locks.
+BACKEND_BLOCK_SEGMENT_SIZE = getattr(
+    settings, 'PITHOS_BACKEND_BLOCK_SEGMENT_SIZE', 1024 ** 3)
+# Compress the blocks of the 'pithos.backends.lib.hashfiler' module with
+# this method ('zlib', or 'lz4' if installed). Incompressible blocks are
+# stored raw. Blocks are readable whatever the setting.
+BACKEND_BLOCK_COMPRESSION = getattr(
+    settings, 'PITHOS_BACKEND_BLOCK_COMPRESSION', None)
+# Also keep the data of objects up to this size in the DB, so that they
+# are read without going to the block storage (0 to disable).
+BACKEND_INLINE_THRESHOLD = getattr(
+    settings, 'PITHOS_BACKEND_INLINE_THRESHOLD', 0)
 
 # Queue for billing.
 BACKEND_QUEUE_MODULE = getattr(settings, 'PITHOS_BACKEND_QUEUE_MODULE', None)
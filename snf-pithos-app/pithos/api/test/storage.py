@@ -0,0 +1,800 @@
+# Copyright 2013 GRNET S.A. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+#   1. Redistributions of source code must retain the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer.
+#
+#   2. Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials
+#      provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY GRNET S.A. ``AS IS'' AND ANY EXPRESS
+# OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL GRNET S.A OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+# USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED
+# AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and
+# documentation are those of the authors and should not be
+# interpreted as representing official policies, either expressed
+# or implied, of GRNET S.A.
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from binascii import hexlify
+from errno import EACCES, EIO, ENOENT
+from hashlib import sha256
+from random import random
+from threading import Lock, Thread
+from time import sleep, time
+from types import ModuleType
+
+from mock import Mock, patch
+
+from pithos.backends.modular import ModularBackend
+from pithos.backends.lib.hashfiler.compression import (
+    COMPRESSORS, SUFFIXES, compress_block, decompress_block)
+from pithos.backends.lib.hashfiler.fileblocker import FileBlocker
+from pithos.backends.lib.hashfiler.refset import ReferenceSet
+from pithos.backends.lib.hashfiler.store import Store
+from pithos.backends.lib.packfiler.store import Store as PackStore
+
+
+class ReferenceSetTest(unittest.TestCase):
+    def test_members(self):
+        refs = ReferenceSet(1000)
+        hashes = [sha256(str(i)).digest() for i in xrange(1000)]
+        for h in hashes:
+            refs.add(h)
+        for h in hashes:
+            self.assertTrue(h in refs)
+
+    def test_false_positives(self):
+        refs = ReferenceSet(1000)
+        for i in xrange(1000):
+            refs.add(sha256(str(i)).digest())
+        others = [sha256("x%d" % i).digest() for i in xrange(10000)]
+        positives = len([h for h in others if h in refs])
+        # The expected rate is 0.1%
+        self.assertTrue(positives < 50)
+
+    def test_empty(self):
+        refs = ReferenceSet(0)
+        self.assertFalse(sha256("").digest() in refs)
+        refs.add(sha256("").digest())
+        self.assertTrue(sha256("").digest() in refs)
+
+
+class GarbageCollectionTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = Store(path=self.path, block_size=16,
+                           hash_algorithm='sha256', umask=None,
+                           blockpool=None, mappool=None)
+        self.blocker = self.store.blocker
+        self.mapper = self.store.mapper
+
+        # One object version, with two blocks
+        self.blocks = [self.store.block_put("block %d" % i) for i in (1, 2)]
+        self.map = sha256("map").digest()
+        self.store.map_put(self.map, self.blocks)
+        # Garbage, left by deleted versions
+        self.old_block = self.store.block_put("old block")
+        self.old_map = sha256("old map").digest()
+        self.store.map_put(self.old_map, [self.old_block])
+
+        # Everything was written two days ago
+        for h in self.blocks + [self.old_block]:
+            self._age(self.blocker.fblocker._rear_block_name(h))
+        for h in (self.map, self.old_map):
+            self._age(self.mapper.fmap._rear_map_name(h))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _age(self, name, seconds=172800):
+        t = time() - seconds
+        os.utime(name, (t, t))
+
+    def _collect(self, grace_period=86400, dry_run=False):
+        return self.store.collect_garbage([self.map], 1, 2, grace_period,
+                                          dry_run=dry_run)
+
+    def _block_exists(self, h):
+        return self.blocker.fblocker.block_mtime(h) is not None
+
+    def _map_exists(self, h):
+        return self.mapper.fmap.map_mtime(h) is not None
+
+    def test_collect(self):
+        self.assertEqual(self._collect(), (1, 1))
+        self.assertTrue(self._map_exists(self.map))
+        self.assertFalse(self._map_exists(self.old_map))
+        for h in self.blocks:
+            self.assertTrue(self._block_exists(h))
+        self.assertFalse(self._block_exists(self.old_block))
+        self.assertEqual(self.store.map_get(self.map), self.blocks)
+        # Nothing left to collect
+        self.assertEqual(self._collect(), (0, 0))
+
+    def test_grace_period(self):
+        # Written after the deadline
+        new_block = self.store.block_put("new block")
+        self.assertEqual(self._collect(), (1, 1))
+        self.assertTrue(self._block_exists(new_block))
+        # With a longer grace period, the old entries are kept too
+        new_map = sha256("new map").digest()
+        self.store.map_put(new_map, [new_block])
+        self._age(self.mapper.fmap._rear_map_name(new_map))
+        self.assertEqual(self._collect(grace_period=259200), (0, 0))
+        self.assertTrue(self._map_exists(new_map))
+
+    def test_dry_run(self):
+        self.assertEqual(self._collect(dry_run=True), (1, 1))
+        self.assertTrue(self._map_exists(self.old_map))
+        self.assertTrue(self._block_exists(self.old_block))
+        self.assertEqual(self._collect(), (1, 1))
+
+    def test_reuse(self):
+        # Checking for an existing block, e.g. to dedupe an upload, touches
+        # it, so that it survives until the new map refers to it.
+        self.assertEqual(self.store.block_search([self.old_block]), [])
+        self.assertEqual(self._collect(), (1, 0))
+        self.assertTrue(self._block_exists(self.old_block))
+
+    def test_reuse_untouchable(self):
+        # Failing to touch an existing entry, e.g. for lack of permission,
+        # does not make it missing; only ENOENT does.
+        def utime(name, times):
+            raise OSError(EACCES, os.strerror(EACCES))
+        fblocker = 'pithos.backends.lib.hashfiler.fileblocker.utime'
+        fmapper = 'pithos.backends.lib.hashfiler.filemapper.utime'
+        with patch(fblocker, utime):
+            self.assertEqual(self.store.block_search(self.blocks), [])
+            missing = self.blocker.fblocker.block_stor(["block 1",
+                                                        "no block"])[1]
+            self.assertEqual(missing, [1])
+        with patch(fmapper, utime):
+            self.assertTrue(self.mapper.fmap._check_rear_map(self.map))
+            self.assertFalse(self.mapper.fmap._check_rear_map(
+                sha256("no map").digest()))
+
+    def test_rados_mirror(self):
+        rblocker = self.blocker.rblocker = Mock()
+        rmap = self.mapper.rmap = Mock()
+        self.assertEqual(self._collect(dry_run=True), (1, 1))
+        self.assertFalse(rblocker.block_remove.called)
+        self.assertFalse(rmap.map_remove.called)
+
+        self.assertEqual(self._collect(), (1, 1))
+        rblocker.block_remove.assert_called_once_with(self.old_block)
+        rmap.map_remove.assert_called_once_with(self.old_map)
+        # Objects only in RADOS are never swept
+        self.assertEqual(rblocker.method_calls,
+                         [('block_remove', (self.old_block,), {})])
+        self.assertEqual(rmap.method_calls,
+                         [('map_remove', (self.old_map,), {})])
+
+
+class PackStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = PackStore(path=self.path, block_size=16,
+                               hash_algorithm='sha256', umask=None,
+                               blockpool=None, mappool=None)
+        self.blocker = self.store.blocker.fblocker
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _segments(self):
+        return sorted(f for f in os.listdir(os.path.join(self.path, 'packs'))
+                      if f.endswith('.pack'))
+
+    def _fork(self, func):
+        """Run func in a child process, which then waits to be told to
+           exit. Return a function that ends the process.
+        """
+        done_r, done_w = os.pipe()
+        exit_r, exit_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(done_r)
+                os.close(exit_w)
+                func()
+                os.write(done_w, "x")
+                os.read(exit_r, 1)
+            finally:
+                os._exit(0)
+        os.close(done_w)
+        os.close(exit_r)
+        self.assertEqual(os.read(done_r, 1), "x")
+        os.close(done_r)
+
+        def end():
+            os.close(exit_w)
+            os.waitpid(pid, 0)
+        return end
+
+    def _dead_pid(self):
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0)
+        os.waitpid(pid, 0)
+        return pid
+
+    def test_round_trip(self):
+        data = ["block %d" % i for i in xrange(10)] + ["padded\x00\x00", ""]
+        hashes, missing = self.store.blocker.block_stor(data)
+        self.assertEqual(missing, range(len(data)))
+        self.assertEqual(self.store.block_search(hashes), [])
+        hashes, missing = self.store.blocker.block_stor(data)
+        self.assertEqual(missing, [])
+
+        blocks = self.store.blocker.block_retr(hashes)
+        self.assertEqual(blocks, [d.ljust(16, '\x00') for d in data])
+        self.assertEqual(self.store.block_get_range(hashes[1], 2, 3), "ock")
+        self.assertEqual(self.store.block_get_range(hashes[1], 6, 20),
+                         "1" + "\x00" * 9)
+        self.assertEqual(self.store.block_get_range("x" * 32, 0, 4), None)
+
+        # A new blocker reads the existing segments
+        store = PackStore(path=self.path, block_size=16,
+                          hash_algorithm='sha256', umask=None,
+                          blockpool=None, mappool=None)
+        self.assertEqual(store.block_get(hashes[3]), data[3].ljust(16, '\x00'))
+
+    def test_collect_and_compact(self):
+        used = [self.store.block_put("used %d" % i) for i in xrange(4)]
+        unused = [self.store.block_put("unused %d" % i) for i in xrange(4)]
+        maphash = sha256("map").digest()
+        self.store.map_put(maphash, used)
+        with self.blocker.lock:
+            conn = self.blocker._connect()
+            with conn:
+                conn.execute("UPDATE blocks SET mtime = ?",
+                             (time() - 172800,))
+
+        self.assertEqual(
+            self.store.collect_garbage([maphash], 1, 4, 86400), (0, 4))
+        for h in unused:
+            self.assertEqual(self.store.block_get(h), None)
+        self.assertEqual(len(self._segments()), 1)
+
+        # The segment of this process is still in use
+        self.assertEqual(self.store.compact(), (0, 0))
+        # Once the process that wrote it exits, it is compacted
+        with self.blocker.lock:
+            conn = self.blocker._connect()
+            with conn:
+                conn.execute("UPDATE segments SET pid = ?",
+                             (self._dead_pid(),))
+        segments = self._segments()
+        deleted, reclaimed = self.store.compact()
+        self.assertEqual(deleted, 1)
+        self.assertEqual(reclaimed, sum(len("unused %d" % i)
+                                        for i in xrange(4)))
+        self.assertFalse(set(segments) & set(self._segments()))
+        for i, h in enumerate(used):
+            self.assertEqual(self.store.block_get(h),
+                             ("used %d" % i).ljust(16, '\x00'))
+
+    def test_compact_skips_live_writers(self):
+        def write():
+            self.blocker.block_stor(["child block"])
+
+        end = self._fork(write)
+        try:
+            self.blocker.block_remove(self.blocker.block_hash("child block"))
+            self.assertEqual(self.store.compact(min_garbage=0.1), (0, 0))
+            self.assertEqual(len(self._segments()), 1)
+        finally:
+            end()
+        self.assertEqual(self.store.compact(min_garbage=0.1),
+                         (1, len("child block")))
+        self.assertEqual(self._segments(), [])
+
+    def test_compact_skips_other_hosts(self):
+        h = self.store.block_put("remote block")
+        self.blocker.block_remove(h)
+        with self.blocker.lock:
+            conn = self.blocker._connect()
+            with conn:
+                conn.execute("UPDATE segments SET host = ?, pid = ?",
+                             ("other-" + self.blocker.host,
+                              self._dead_pid()))
+        self.assertEqual(self.store.compact(min_garbage=0.1), (0, 0))
+        self.assertEqual(len(self._segments()), 1)
+
+    def test_sync_before_index(self):
+        synced = []
+
+        def fsync(fd):
+            # Nothing is indexed yet when the data is synced
+            rows = self.blocker.conn.execute(
+                "SELECT COUNT(*) FROM blocks").fetchone()[0]
+            synced.append((fd, rows))
+
+        with patch('pithos.backends.lib.packfiler.packblocker.fsync', fsync):
+            self.store.blocker.block_stor(["block 1", "block 2"])
+            self.store.blocker.block_stor(["block 1"])
+        self.assertEqual(synced, [(self.blocker.segment[1], 0)])
+        self.assertEqual(self.blocker.conn.execute(
+            "PRAGMA journal_mode").fetchone()[0], "delete")
+
+
+def import_rados_modules():
+    """Import the RADOS block modules, with a stand-in for the rados
+       bindings if they are not installed.
+    """
+    rados = ModuleType('rados')
+    rados.Rados = None
+    rados.ObjectNotFound = type('ObjectNotFound', (Exception,), {})
+    modules = {}
+    if 'rados' not in sys.modules:
+        try:
+            __import__('rados')
+        except ImportError:
+            modules['rados'] = rados
+    with patch.dict(sys.modules, modules):
+        from pithos.backends.lib.hashfiler import context_object
+        from pithos.backends.lib.hashfiler import radosblocker
+    return context_object, radosblocker
+
+
+class FakeCompletion(object):
+    def __init__(self, ret):
+        self.ret = ret
+
+    def get_return_value(self):
+        return self.ret
+
+
+class FakeIoctx(object):
+    """RADOS I/O context keeping objects in memory. Asynchronous operations
+       complete in other threads, in random order.
+    """
+
+    def __init__(self, not_found):
+        self.not_found = not_found
+        self.objects = {}
+        self.errors = {}
+        self.lock = Lock()
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _start(self, op, name, func, nargs, oncomplete):
+        with self.lock:
+            self.calls.append((op, name))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        def run():
+            sleep(random() * 0.005)
+            if name in self.errors:
+                ret, args = self.errors[name], (None,) * nargs
+            else:
+                ret, args = func()
+            with self.lock:
+                self.in_flight -= 1
+            oncomplete(FakeCompletion(ret), *args)
+        Thread(target=run).start()
+        return object()
+
+    def aio_read(self, name, length, offset, oncomplete):
+        def read():
+            if name not in self.objects:
+                return -ENOENT, (None,)
+            data = self.objects[name][offset:offset + length]
+            return len(data), (data,)
+        return self._start('read', name, read, 1, oncomplete)
+
+    def aio_write_full(self, name, data, oncomplete):
+        def write():
+            self.objects[name] = data
+            return 0, ()
+        return self._start('write', name, write, 0, oncomplete)
+
+    def read(self, name, length, offset=0):
+        if name not in self.objects:
+            raise self.not_found(name)
+        return self.objects[name][offset:offset + length]
+
+
+class StatFakeIoctx(FakeIoctx):
+    def aio_stat(self, name, oncomplete):
+        def stat():
+            if name not in self.objects:
+                return -ENOENT, (None, None)
+            return 0, (len(self.objects[name]), None)
+        return self._start('stat', name, stat, 2, oncomplete)
+
+
+class AioMapTest(unittest.TestCase):
+    def setUp(self):
+        self.context_object, radosblocker = import_rados_modules()
+        self.ioctx = FakeIoctx(radosblocker.ObjectNotFound)
+
+    def test_window(self):
+        names = ["object %d" % i for i in xrange(100)]
+        for name in names[::2]:
+            self.ioctx.objects[name] = name.upper()
+        start = lambda name, cb: self.ioctx.aio_read(name, 100, 0, cb)
+        results = self.context_object.aio_map(start, names, 8)
+        self.assertTrue(self.ioctx.max_in_flight <= 8)
+        self.assertEqual(self.ioctx.in_flight, 0)
+        # Results are in the order of the items
+        for i, name in enumerate(names):
+            if i % 2:
+                self.assertEqual(results[i], (-ENOENT, (None,)))
+            else:
+                self.assertEqual(results[i], (len(name), (name.upper(),)))
+
+    def test_start_error(self):
+        def start(i, cb):
+            if i == 5:
+                raise ValueError(i)
+            return self.ioctx.aio_write_full(str(i), "data", cb)
+        self.assertRaises(ValueError, self.context_object.aio_map,
+                          start, range(10), 2)
+
+    def test_check(self):
+        aio_check = self.context_object.aio_check
+        self.assertTrue(aio_check(0))
+        self.assertTrue(aio_check(10))
+        self.assertFalse(aio_check(-ENOENT))
+        try:
+            aio_check(-EIO)
+        except IOError as e:
+            self.assertEqual(e.errno, EIO)
+        else:
+            self.fail("IOError not raised")
+
+
+class RadosBlockerTest(unittest.TestCase):
+    ioctx_class = StatFakeIoctx
+    probe = 'stat'
+
+    def setUp(self):
+        context_object, radosblocker = import_rados_modules()
+        self.ioctx = self.ioctx_class(radosblocker.ObjectNotFound)
+        RadosBlocker = radosblocker.RadosBlocker
+        patcher = patch.object(RadosBlocker, 'rados_ctx', self.ioctx)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.blocker = RadosBlocker(blocksize=16, blockpath=None,
+                                    hashtype='sha256', blockpool='blocks')
+        self.blocker.aio_window = 4
+
+    def test_stor_retr(self):
+        data = ["block %d" % i for i in xrange(20)]
+        data += [data[3], data[3] + "\x00\x00", "", data[0]]
+        hashes, missing = self.blocker.block_stor(data)
+        self.assertEqual(missing, range(len(data)))
+        self.assertTrue(self.ioctx.max_in_flight <= 4)
+        # Duplicate blocks are checked and written once
+        writes = [name for op, name in self.ioctx.calls if op == 'write']
+        self.assertEqual(sorted(writes), sorted(set(map(hexlify, hashes))))
+        probes = [name for op, name in self.ioctx.calls if op == self.probe]
+        self.assertEqual(sorted(probes), sorted(writes))
+
+        blocks = self.blocker.block_retr(hashes)
+        self.assertEqual(blocks, [d.ljust(16, '\x00') for d in data])
+        self.assertEqual(self.blocker.block_retr_range(hashes[1], 2, 20),
+                         "ock 1" + "\x00" * 9)
+
+        hashes, missing = self.blocker.block_stor(data[:5])
+        self.assertEqual(missing, [])
+
+    def test_missing(self):
+        hashes, missing = self.blocker.block_stor(["a", "b"])
+        absent = [sha256(str(i)).digest() for i in xrange(3)]
+        self.assertEqual(
+            self.blocker.block_ping(absent[:2] + hashes + absent + hashes),
+            absent)
+        # Retrieval stops at the first missing block
+        blocks = self.blocker.block_retr(hashes + absent[:1] + hashes)
+        self.assertEqual(blocks, ["a".ljust(16, '\x00'),
+                                  "b".ljust(16, '\x00')])
+        self.assertEqual(self.blocker.block_retr_range(absent[0], 0, 4),
+                         None)
+
+    def test_errors(self):
+        hashes, missing = self.blocker.block_stor(["a", "b"])
+        self.ioctx.errors[hexlify(hashes[1])] = -EIO
+        self.assertRaises(IOError, self.blocker.block_ping, hashes)
+        self.assertRaises(IOError, self.blocker.block_retr, hashes)
+        self.assertRaises(IOError, self.blocker.block_stor, ["b"])
+        self.assertEqual(self.blocker.block_retr(hashes[:1]),
+                         ["a".ljust(16, '\x00')])
+
+
+class OldRadosBlockerTest(RadosBlockerTest):
+    """Bindings without aio_stat, where existence is probed with reads."""
+
+    ioctx_class = FakeIoctx
+    probe = 'read'
+
+
+class InlineDataTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.backend = ModularBackend(
+            db_connection='sqlite:///%s/db' % self.path,
+            block_path=os.path.join(self.path, 'data'),
+            block_size=64, hash_algorithm='sha256', inline_threshold=32)
+        self.backend.pre_exec()
+        self.backend.put_account('user', 'user', policy={'quota': '0'})
+        self.backend.put_container('user', 'user', 'c')
+
+    def tearDown(self):
+        self.backend.post_exec(True)
+        self.backend.close()
+        shutil.rmtree(self.path)
+
+    def _put(self, name, data):
+        block = self.backend.put_block(data)
+        self.backend.update_object_hashmap(
+            'user', 'user', 'c', name, len(data), 'text/plain', [block],
+            'checksum', 'pithos')
+        return block
+
+    def _inline(self, name):
+        meta = self.backend.get_object_meta('user', 'user', 'c', name,
+                                            'pithos')
+        return self.backend.inline_data.get(meta['hash'])
+
+    def _count(self):
+        r = self.backend.inline_data.conn.execute(
+            "SELECT COUNT(*) FROM inline_data")
+        count = r.fetchone()[0]
+        r.close()
+        return count
+
+    def _get_hashmap(self, name):
+        """Return the hashmap of an object, failing if the map is read."""
+
+        self.backend.inline_blocks.clear()
+        with patch.object(self.backend.store, 'map_get',
+                          side_effect=AssertionError("map read")):
+            return self.backend.get_object_hashmap('user', 'user', 'c', name)
+
+    def test_threshold(self):
+        small = self._put('small', "hello world")
+        self._put('big', "x" * 33)
+        self.assertEqual(self._inline('small'), (small, "hello world"))
+        self.assertEqual(self._inline('big'), None)
+
+        self.assertRaises(AssertionError, self._get_hashmap, 'big')
+        self.assertEqual(self._get_hashmap('small'), (11, [small]))
+
+        # Reads of the block are served from memory
+        with patch.object(self.backend.store, 'block_get_range',
+                          side_effect=AssertionError("block read")):
+            self.assertEqual(self.backend.get_block(small, 6, 5), "world")
+            self.assertEqual(self.backend.get_block(small),
+                             "hello world".ljust(64, '\x00'))
+
+    def test_disabled(self):
+        self.backend.inline_threshold = 0
+        self._put('small', "hello world")
+        self.assertEqual(self._count(), 0)
+        self.assertRaises(AssertionError, self._get_hashmap, 'small')
+
+    def test_copy_move(self):
+        block = self._put('o', "hello world")
+        self.backend.copy_object('user', 'user', 'c', 'o', 'user', 'c',
+                                 'copy', 'text/plain', 'pithos')
+        self.backend.move_object('user', 'user', 'c', 'copy', 'user', 'c',
+                                 'moved', 'text/plain', 'pithos')
+        # The versions share the row
+        self.assertEqual(self._count(), 1)
+        self.assertEqual(self._get_hashmap('moved'), (11, [block]))
+        self.assertEqual(self._get_hashmap('o'), (11, [block]))
+
+    def test_collect_garbage(self):
+        self._put('o', "hello world")
+        self._put('p', "other")
+        self.backend.delete_object('user', 'user', 'c', 'p',
+                                   until=time() + 60)
+        self.assertEqual(self._count(), 2)
+        self.backend.collect_garbage(0, dry_run=True)
+        self.assertEqual(self._count(), 2)
+        self.backend.collect_garbage(0)
+        self.assertEqual(self._count(), 1)
+        self.assertEqual(self._inline('o')[1], "hello world")
+
+    def test_cache_size(self):
+        with patch('pithos.backends.modular.INLINE_CACHE_SIZE', 10):
+            cache = self.backend._cache_inline_block
+            cache("a", "1234")
+            cache("b", "1234")
+            cache("a", "1234")
+            cache("c", "1234")
+            # The least recently used block is evicted
+            self.assertEqual(self.backend.inline_blocks.keys(), ["a", "c"])
+            self.assertEqual(self.backend.inline_blocks_size, 8)
+            # Blocks larger than the cache are not kept
+            cache("d", "12345678901")
+            self.assertEqual(self.backend.inline_blocks.keys(), ["a", "c"])
+            cache("a", "123456789")
+            self.assertEqual(self.backend.inline_blocks.keys(), ["a"])
+            self.assertEqual(self.backend.inline_blocks_size, 9)
+
+
+class DomainObjectsTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.backend = ModularBackend(
+            db_connection='sqlite:///%s/db' % self.path,
+            block_path=os.path.join(self.path, 'data'),
+            block_size=64, hash_algorithm='sha256')
+        self.backend.pre_exec()
+        self.backend.put_account('user', 'user', policy={'quota': '0'})
+        self.backend.put_container('user', 'user', 'images')
+        self._put('o1', 10, {'plankton:name': 'image 1',
+                             'plankton:status': 'AVAILABLE'})
+        self._put('o2', 20, {'plankton:name': 'a>=b',
+                             'plankton:status': 'AVAILABLE'})
+        self._put('o3', 30, {'plankton:name': 'x',
+                             'plankton:status': 'DELETED'})
+
+    def tearDown(self):
+        self.backend.post_exec(True)
+        self.backend.close()
+        shutil.rmtree(self.path)
+
+    def _put(self, name, size, meta):
+        block = self.backend.put_block("x" * size)
+        self.backend.update_object_hashmap(
+            'user', 'user', 'images', name, size, 'application/octet-stream',
+            [block], 'checksum', 'plankton', meta)
+
+    def _list(self, filterq=None, sizeq=None):
+        objects = self.backend.get_domain_objects(
+            'plankton', 'user', filterq=filterq, sizeq=sizeq)
+        return sorted(path.rsplit('/', 1)[1] for path, _, _ in objects)
+
+    def test_filters(self):
+        self.assertEqual(self._list(), ['o1', 'o2', 'o3'])
+        self.assertEqual(self._list(['plankton:status=AVAILABLE']),
+                         ['o1', 'o2'])
+        self.assertEqual(self._list(['plankton:status!=AVAILABLE']), ['o3'])
+        self.assertEqual(self._list(['!plankton:status']), [])
+        self.assertEqual(self._list(['plankton:status',
+                                     'plankton:name<b']), ['o2'])
+        # Values may contain spaces and operators
+        self.assertEqual(self._list(['plankton:name=image 1']), ['o1'])
+        self.assertEqual(self._list(['plankton:name=a>=b']), ['o2'])
+        self.assertEqual(self._list(['plankton:name>=a>=b',
+                                     'plankton:status=AVAILABLE']),
+                         ['o1', 'o2'])
+
+    def test_size(self):
+        self.assertEqual(self._list(sizeq=(20, None)), ['o2', 'o3'])
+        # The upper limit is excluded
+        self.assertEqual(self._list(sizeq=(None, 30)), ['o1', 'o2'])
+        self.assertEqual(self._list(['plankton:status=AVAILABLE'],
+                                    sizeq=(15, None)), ['o2'])
+
+    def test_pushed_down(self):
+        # Only the matching objects are read from the DB
+        object_list = self.backend.node.domain_object_list
+        rows = []
+
+        def domain_object_list(*args, **kwargs):
+            rows.extend(object_list(*args, **kwargs))
+            return rows
+        with patch.object(self.backend.node, 'domain_object_list',
+                          domain_object_list):
+            self._list(['plankton:name=image 1'], sizeq=(5, None))
+        self.assertEqual([path for path, _, _ in rows], ['user/images/o1'])
+
+    def test_latest_serial(self):
+        serial = self.backend.get_latest_serial()
+        self._list()
+        self.assertEqual(self.backend.get_latest_serial(), serial)
+        # Metadata changes create new versions
+        self.backend.update_object_meta('user', 'user', 'images', 'o1',
+                                        'plankton',
+                                        {'plankton:status': 'DELETED'})
+        self.assertTrue(self.backend.get_latest_serial() > serial)
+
+
+class CompressionTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.compressible = "hello world " * 20
+        self.incompressible = os.urandom(200)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _blocker(self, compression=None):
+        return FileBlocker(blocksize=256, blockpath=self.path,
+                           hashtype='sha256', compression=compression)
+
+    def _files(self, blocker, h):
+        """Return the suffixes of the files of a block."""
+        dirname, prefix = os.path.split(blocker._rear_block_name(h))
+        return sorted(f[len(prefix):] for f in os.listdir(dirname)
+                      if f.startswith(prefix))
+
+    def test_round_trip(self):
+        for method in COMPRESSORS:
+            suffix, data = compress_block(method, self.compressible)
+            self.assertEqual(suffix, SUFFIXES[method])
+            self.assertTrue(len(data) < len(self.compressible))
+            self.assertEqual(decompress_block(method, data),
+                             self.compressible)
+        self.assertRaises(RuntimeError, decompress_block, 'unknown', 'data')
+
+    def test_incompressible(self):
+        self.assertEqual(compress_block('zlib', self.incompressible),
+                         ('', self.incompressible))
+        # Large blocks are judged by a sample of their start
+        with patch('pithos.backends.lib.hashfiler.compression.SAMPLE_SIZE',
+                   100):
+            data = self.incompressible[:100] + self.compressible
+            self.assertEqual(compress_block('zlib', data), ('', data))
+            data = self.compressible + self.incompressible
+            self.assertEqual(compress_block('zlib', data)[0], '.z')
+
+    def test_blocker(self):
+        blocker = self._blocker('zlib')
+        blocks = [self.compressible, self.incompressible]
+        hashes, missing = blocker.block_stor(blocks)
+        self.assertEqual(missing, [0, 1])
+        # Incompressible blocks are stored raw
+        self.assertEqual(self._files(blocker, hashes[0]), ['.z'])
+        self.assertEqual(self._files(blocker, hashes[1]), [''])
+        self.assertEqual(blocker.block_stor(blocks)[1], [])
+        self.assertEqual(blocker.block_ping(hashes), [])
+        self.assertEqual(blocker.block_retr(hashes),
+                         [b.ljust(256, '\x00') for b in blocks])
+
+    def test_mixed(self):
+        # Blocks written with and without compression are read by any
+        # blocker, whatever its compression method
+        raw, _ = self._blocker().block_stor([self.compressible])
+        compressed, _ = self._blocker('zlib').block_stor(
+            ["other " + self.compressible])
+        for blocker in (self._blocker(), self._blocker('zlib')):
+            self.assertEqual(blocker.block_ping(raw + compressed), [])
+            self.assertEqual(
+                [b.rstrip('\x00') for b in
+                 blocker.block_retr(raw + compressed)],
+                [self.compressible, "other " + self.compressible])
+        self.assertEqual(self._files(self._blocker(), raw[0]), [''])
+        self.assertEqual(self._files(self._blocker(), compressed[0]), ['.z'])
+
+    def test_range(self):
+        blocker = self._blocker('zlib')
+        hashes, _ = blocker.block_stor([self.compressible,
+                                        self.incompressible])
+        for h, data in zip(hashes, [self.compressible, self.incompressible]):
+            self.assertEqual(blocker.block_retr_range(h, 6, 5), data[6:11])
+            self.assertEqual(blocker.block_retr_range(h, 0, 256),
+                             data.ljust(256, '\x00'))
+            # Reads past the data are padded, up to the block size
+            self.assertEqual(blocker.block_retr_range(h, 190, 100),
+                             data[190:].ljust(66, '\x00'))
+        self.assertEqual(blocker.block_retr_range('\x00' * 32, 0, 10), None)
@@ -41,3 +41,4 @@ from pithos.api.test.views import *
 from pithos.api.test.unicode import *
 from pithos.api.test.listing import *
 from pithos.api.test.top_level import *
+from pithos.api.test.storage import *
@@ -54,6 +54,9 @@ from snf_django.lib.api import faults, utils
 from pithos.api.settings import (BACKEND_DB_MODULE, BACKEND_DB_CONNECTION,
                                  BACKEND_BLOCK_MODULE, BACKEND_BLOCK_PATH,
                                  BACKEND_BLOCK_UMASK,
+                                 BACKEND_BLOCK_SEGMENT_SIZE,
+                                 BACKEND_BLOCK_COMPRESSION,
+                                 BACKEND_INLINE_THRESHOLD,
                                  BACKEND_QUEUE_MODULE, BACKEND_QUEUE_HOSTS,
                                  BACKEND_QUEUE_EXCHANGE,
                                  ASTAKOSCLIENT_POOLSIZE,
@@ -844,7 +847,6 @@ class ObjectWrapper(object):
         self.file_index = 0
         self.block_index = 0
         self.block_hash = -1
-        self.block = ''
 
         self.range_index = -1
         self.offset, self.length = self.ranges[0]
@@ -863,23 +865,19 @@ class ObjectWrapper(object):
 
             # Get the block for the current position.
             self.block_index = int(self.offset / self.backend.block_size)
-            if self.block_hash != \
-                    self.hashmaps[self.file_index][self.block_index]:
-                self.block_hash = self.hashmaps[
-                    self.file_index][self.block_index]
-                try:
-                    self.block = self.backend.get_block(self.block_hash)
-                except ItemNotExists:
-                    raise faults.ItemNotFound('Block does not exist')
-
-            # Get the data from the block.
+            self.block_hash = self.hashmaps[self.file_index][self.block_index]
+
+            # Get the data from the block, reading only the requested part.
             bo = self.offset % self.backend.block_size
             bs = self.backend.block_size
             if (self.block_index == len(self.hashmaps[self.file_index]) - 1 and
                     self.sizes[self.file_index] % self.backend.block_size):
                 bs = self.sizes[self.file_index] % self.backend.block_size
             bl = min(self.length, bs - bo)
-            data = self.block[bo:bo + bl]
+            try:
+                data = self.backend.get_block(self.block_hash, bo, bl)
+            except ItemNotExists:
+                raise faults.ItemNotFound('Block does not exist')
             self.offset += bl
             self.length -= bl
             return data
@@ -995,10 +993,8 @@ def hashmap_md5(backend, hashmap, size):
     md5 = hashlib.md5()
     bs = backend.block_size
     for bi, hash in enumerate(hashmap):
-        data = backend.get_block(hash)  # Blocks come in padded.
-        if bi == len(hashmap) - 1:
-            data = data[:size % bs]
-        md5.update(data)
+        # Blocks come in padded, so read only the object's bytes.
+        md5.update(backend.get_block(hash, 0, min(bs, size - bi * bs)))
     return md5.hexdigest().lower()
 
 
@@ -1019,6 +1015,8 @@ if RADOS_STORAGE:
 else:
     BLOCK_PARAMS = {'mappool': None,
                     'blockpool': None, }
+BLOCK_PARAMS['segment_size'] = BACKEND_BLOCK_SEGMENT_SIZE
+BLOCK_PARAMS['compression'] = BACKEND_BLOCK_COMPRESSION
 
 BACKEND_KWARGS = dict(
     db_module=BACKEND_DB_MODULE,
@@ -1040,7 +1038,8 @@ BACKEND_KWARGS = dict(
     public_url_alphabet=PUBLIC_URL_ALPHABET,
     account_quota_policy=BACKEND_ACCOUNT_QUOTA,
     container_quota_policy=BACKEND_CONTAINER_QUOTA,
-    container_versioning_policy=BACKEND_VERSIONING)
+    container_versioning_policy=BACKEND_VERSIONING,
+    inline_threshold=BACKEND_INLINE_THRESHOLD)
 
 _pithos_backend_pool = PithosBackendPool(size=BACKEND_POOL_SIZE,
                                          **BACKEND_KWARGS)
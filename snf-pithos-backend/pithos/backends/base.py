@@ -673,9 +673,12 @@ class BaseBackend(object):
         """
         return None
 
-    def get_block(self, hash):
+    def get_block(self, hash, offset=0, length=None):
         """Return a block's data.
 
+        If offset or length are given, return only that part of the
+        block, padded with zeros up to length within the block size.
+
         Raises:
             ItemNotExists: Block does not exist
         """
@@ -693,9 +696,24 @@ class BaseBackend(object):
         """
         return 0
 
-    def get_domain_objects(self, domain, user=None):
+    def get_domain_objects(self, domain, user=None, filterq=None,
+                           sizeq=None):
         """Return a list of tuples for objects under the domain.
 
         Parameters:
             'user': return only objects accessible to the user.
+
+            'filterq': list of metadata filter terms, evaluated on the
+                       metadata of the domain (as in list_objects)
+
+            'sizeq': (min, max) tuple to return only objects whose size is
+                     in the range
         """
+
+    def get_latest_serial(self):
+        """Return the serial of the latest version of any object.
+
+        Every change of an object or of its metadata creates a new version,
+        so a different serial means that some object has changed.
+        """
+        return 0
@@ -34,8 +34,10 @@
 import re
 
 
+# The key ends at the first operator and the rest of the term is the value,
+# which may contain spaces or operators itself.
 _regexfilter = re.compile(
-    '(!?)\s*(\S+?)\s*(?:(=|!=|<=|>=|<|>)\s*(\S*?)\s*)?$', re.UNICODE)
+    r'(!?)\s*(\S+?)\s*(?:(=|!=|<=|>=|<|>)(.*))?$', re.UNICODE | re.DOTALL)
 
 
 def parse_filters(terms):
@@ -48,6 +50,8 @@ def parse_filters(terms):
         if m is None:
             continue
         neg, key, op, value = m.groups()
+        if value is not None:
+            value = value.strip()
         if neg:
             excluded.append(key)
         elif op:
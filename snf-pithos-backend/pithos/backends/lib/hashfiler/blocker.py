@@ -47,9 +47,11 @@ def union(a, b):
 class Blocker(object):
     """Blocker.
        Required constructor parameters: blocksize, blockpath, hashtype.
-       Optional blockpool.
+       Optional blockpool, compression.
     """
 
+    file_blocker = FileBlocker
+
     def __init__(self, **params):
         self.rblocker = None
         try:
@@ -59,7 +61,7 @@ class Blocker(object):
         except KeyError:
             pass
 
-        self.fblocker = FileBlocker(**params)
+        self.fblocker = self.file_blocker(**params)
         self.hashlen = self.fblocker.hashlen
         self.blocksize = params['blocksize']
 
@@ -81,6 +83,12 @@ class Blocker(object):
         """Retrieve blocks from storage by their hashes."""
         return self.fblocker.block_retr(hashes)
 
+    def block_retr_range(self, blkhash, offset, length):
+        """Retrieve up to length bytes of a block, starting at offset.
+           Return None if the block does not exist.
+        """
+        return self.fblocker.block_retr_range(blkhash, offset, length)
+
     def block_stor(self, blocklist):
         """Store a bunch of blocks and return (hashes, missing).
            Hashes is a list of the hashes of the blocks,
@@ -120,3 +128,24 @@ class Blocker(object):
             r_hash, r_existed = self.rblocker.block_stor((newblock,))
 
         return f_hash, 1 if r_existed and f_existed else 0
+
+    def block_sweep(self, referenced, deadline, dry_run=False):
+        """Remove the blocks that are not in referenced and have not been
+           modified since deadline. Return the number of removed blocks.
+
+           RADOS copies are removed together with their file copy, which is
+           the one touched when a block is reused. Blocks stored only in
+           RADOS are never removed, since nothing refreshes their mtime.
+        """
+        fblocker = self.fblocker
+        rblocker = self.rblocker
+        removed = 0
+        for h, mtime in fblocker.block_iter():
+            if mtime >= deadline or h in referenced:
+                continue
+            removed += 1
+            if not dry_run:
+                fblocker.block_remove(h)
+                if rblocker:
+                    rblocker.block_remove(h)
+        return removed
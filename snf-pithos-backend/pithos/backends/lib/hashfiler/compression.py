@@ -0,0 +1,86 @@
+# Copyright 2013 GRNET S.A. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+#   1. Redistributions of source code must retain the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer.
+#
+#   2. Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials
+#      provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY GRNET S.A. ``AS IS'' AND ANY EXPRESS
+# OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL GRNET S.A OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+# USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED
+# AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and
+# documentation are those of the authors and should not be
+# interpreted as representing official policies, either expressed
+# or implied, of GRNET S.A.
+
+import zlib
+
+try:
+    from lz4.block import compress as lz4_compress
+    from lz4.block import decompress as lz4_decompress
+except ImportError:
+    try:
+        from lz4 import compress as lz4_compress
+        from lz4 import uncompress as lz4_decompress
+    except ImportError:
+        lz4_compress = lz4_decompress = None
+
+# The suffix of the files of blocks stored with each compression method.
+# It does not depend on the available libraries, so that every stored
+# block can be found.
+SUFFIXES = {'zlib': '.z', 'lz4': '.lz4'}
+
+COMPRESSORS = {'zlib': (lambda data: zlib.compress(data, 1),
+                        zlib.decompress)}
+if lz4_compress is not None:
+    COMPRESSORS['lz4'] = (lz4_compress, lz4_decompress)
+
+# Blocks that do not shrink below this ratio are stored raw.
+MAX_RATIO = 0.9
+# Blocks larger than this are only compressed if a sample of that size
+# compresses well, to avoid compressing whole incompressible blocks.
+SAMPLE_SIZE = 64 * 1024
+
+
+def compress_block(method, data):
+    """Compress a block with the given method, if that is worth it.
+       Return the suffix of the block file and the data to store,
+       with an empty suffix for raw data.
+    """
+    compress = COMPRESSORS[method][0]
+    if len(data) > SAMPLE_SIZE:
+        sample = data[:SAMPLE_SIZE]
+        if len(compress(sample)) > MAX_RATIO * SAMPLE_SIZE:
+            return '', data
+    compressed = compress(data)
+    if len(compressed) > MAX_RATIO * len(data):
+        return '', data
+    return SUFFIXES[method], compressed
+
+
+def decompress_block(method, data):
+    """Decompress a block stored with the given method."""
+    try:
+        decompress = COMPRESSORS[method][1]
+    except KeyError:
+        raise RuntimeError("Compression method '%s' is not available" %
+                           (method,))
+    return decompress(data)
@@ -195,3 +195,15 @@ class ContextFile(object):
 
     def sync_read_chunks(self, chunksize, nr, offset=0):
         return file_sync_read_chunks(self.fdesc, chunksize, nr, offset)
+
+    def sync_read_range(self, offset, size):
+        """Read up to size bytes at offset."""
+        fdesc = self.fdesc
+        fdesc.seek(offset)
+        data = ''
+        while len(data) < size:
+            s = fdesc.read(size - len(data))
+            if not s:
+                break
+            data += s
+        return data
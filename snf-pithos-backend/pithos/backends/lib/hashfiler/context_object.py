@@ -31,7 +31,9 @@
 # interpreted as representing official policies, either expressed
 # or implied, of GRNET S.A.
 
-from os import SEEK_CUR, SEEK_SET
+from os import SEEK_CUR, SEEK_SET, strerror
+from errno import ENOENT
+from threading import Semaphore
 from rados import ObjectNotFound
 
 _zeros = ''
@@ -103,6 +105,47 @@ def file_sync_read_chunks(radosobject, chunksize, nr, offset=0):
         nr -= 1
 
 
+def aio_map(start, items, window):
+    """Run an asynchronous RADOS operation on each item, with at most
+       window operations in flight, and return the results in order.
+       start(item, oncomplete) must start the operation on item, and
+       return its completion. Each result is a pair of the return value
+       of the operation and the extra arguments passed to oncomplete.
+    """
+    results = [None] * len(items)
+    completions = []
+    slots = Semaphore(window)
+
+    def callback(i):
+        def oncomplete(completion, *args):
+            results[i] = (completion.get_return_value(), args)
+            slots.release()
+        return oncomplete
+
+    for i, item in enumerate(items):
+        slots.acquire()
+        try:
+            completions.append(start(item, callback(i)))
+        except:
+            slots.release()
+            raise
+    # Wait for the operations still in flight
+    for i in xrange(window):
+        slots.acquire()
+    return results
+
+
+def aio_check(ret):
+    """Return False if an operation failed because the object does not
+       exist, raise IOError if it failed otherwise, else return True.
+    """
+    if ret >= 0:
+        return True
+    if ret == -ENOENT:
+        return False
+    raise IOError(-ret, strerror(-ret))
+
+
 class RadosObject(object):
     __slots__ = ("name", "ioctx", "offset")
 
@@ -31,23 +31,28 @@
 # interpreted as representing official policies, either expressed
 # or implied, of GRNET S.A.
 
-from os import makedirs
-from os.path import isdir, realpath, exists, join
+from os import makedirs, walk, remove, utime
+from os.path import isdir, realpath, exists, join, getmtime
 from hashlib import new as newhasher
-from binascii import hexlify
+from binascii import hexlify, unhexlify
+from errno import ENOENT
 
 from context_file import ContextFile, file_sync_read_chunks
+from compression import (SUFFIXES, COMPRESSORS, compress_block,
+                         decompress_block)
 from os import O_RDONLY, O_WRONLY
 
 
 class FileBlocker(object):
     """Blocker.
        Required constructor parameters: blocksize, blockpath, hashtype.
+       Optional compression.
     """
 
     blocksize = None
     blockpath = None
     hashtype = None
+    compression = None
 
     def __init__(self, **params):
         blocksize = params['blocksize']
@@ -70,34 +75,84 @@ class FileBlocker(object):
         hasher.update("")
         emptyhash = hasher.digest()
 
+        compression = params.get('compression')
+        if compression and compression not in COMPRESSORS:
+            msg = "Variable compression '%s' is not available"
+            raise ValueError(msg % (compression,))
+
+        # Blocks are stored raw or compressed, in files with the suffix of
+        # the compression method. Look for the most likely file first.
+        variants = [('', None)]
+        variants.extend((suffix, method)
+                        for method, suffix in sorted(SUFFIXES.items())
+                        if method != compression)
+        if compression:
+            variants.insert(0, (SUFFIXES[compression], compression))
+
         self.blocksize = blocksize
         self.blockpath = blockpath
         self.hashtype = hashtype
         self.hashlen = len(emptyhash)
         self.emptyhash = emptyhash
+        self.compression = compression
+        self.variants = variants
 
     def _pad(self, block):
         return block + ('\x00' * (self.blocksize - len(block)))
 
-    def _read_rear_block(self, blkhash):
+    def _read_rear_block(self, blkhash, suffix=''):
         filename = hexlify(blkhash)
         dir = join(self.blockpath, filename[0:2], filename[2:4], filename[4:6])
-        name = join(dir, filename)
+        name = join(dir, filename + suffix)
         return ContextFile(name, O_RDONLY)
 
-    def _write_rear_block(self, blkhash):
+    def _write_rear_block(self, blkhash, suffix=''):
         filename = hexlify(blkhash)
         dir = join(self.blockpath, filename[0:2], filename[2:4], filename[4:6])
         if not exists(dir):
             makedirs(dir)
-        name = join(dir, filename)
+        name = join(dir, filename + suffix)
         return ContextFile(name, O_WRONLY)
 
     def _check_rear_block(self, blkhash):
+        name = self._rear_block_name(blkhash)
+        # Touch existing blocks, so that garbage collection
+        # does not remove the blocks that are being reused.
+        for suffix, method in self.variants:
+            try:
+                utime(name + suffix, None)
+                return True
+            except OSError as e:
+                # The block may exist but not be ours to touch, e.g. on a
+                # root-squashed NFS export
+                if e.errno != ENOENT and exists(name + suffix):
+                    return True
+        return False
+
+    def _read_block(self, blkhash):
+        """Return the uncompressed data of a block, or None if missing."""
+        for suffix, method in self.variants:
+            try:
+                with self._read_rear_block(blkhash, suffix) as rbl:
+                    data = rbl.sync_read(self.blocksize)
+            except IOError as e:
+                if e.errno != ENOENT:
+                    raise
+                continue
+            if method is not None:
+                data = decompress_block(method, data)
+            return data
+        return None
+
+    def _compress(self, block):
+        if not self.compression:
+            return '', block
+        return compress_block(self.compression, block)
+
+    def _rear_block_name(self, blkhash):
         filename = hexlify(blkhash)
         dir = join(self.blockpath, filename[0:2], filename[2:4], filename[4:6])
-        name = join(dir, filename)
-        return exists(name)
+        return join(dir, filename)
 
     def block_hash(self, data):
         """Hash a block of data"""
@@ -123,23 +178,42 @@ class FileBlocker(object):
         blocksize = self.blocksize
         blocks = []
         append = blocks.append
-        block = None
 
         for h in hashes:
             if h == self.emptyhash:
                 append(self._pad(''))
                 continue
-            with self._read_rear_block(h) as rbl:
-                if not rbl:
-                    break
-                for block in rbl.sync_read_chunks(blocksize, 1, 0):
-                    break  # there should be just one block there
+            block = self._read_block(h)
             if not block:
                 break
-            append(self._pad(block))
+            append(self._pad(block[:blocksize]))
 
         return blocks
 
+    def block_retr_range(self, blkhash, offset, length):
+        """Retrieve up to length bytes of a block, starting at offset,
+           without reading the rest of the block.
+           Return None if the block does not exist.
+        """
+        length = max(0, min(length, self.blocksize - offset))
+        if blkhash == self.emptyhash:
+            return '\x00' * length
+        for suffix, method in self.variants:
+            try:
+                with self._read_rear_block(blkhash, suffix) as rbl:
+                    if method is None:
+                        data = rbl.sync_read_range(offset, length)
+                    else:
+                        data = decompress_block(
+                            method, rbl.sync_read(self.blocksize))
+                        data = data[offset:offset + length]
+            except IOError as e:
+                if e.errno != ENOENT:
+                    raise
+                continue
+            return data + '\x00' * (length - len(data))
+        return None
+
     def block_stor(self, blocklist):
         """Store a bunch of blocks and return (hashes, missing).
            Hashes is a list of the hashes of the blocks,
@@ -151,8 +225,9 @@ class FileBlocker(object):
         missing = [i for i, h in enumerate(hashlist) if not
                    self._check_rear_block(h)]
         for i in missing:
-            with self._write_rear_block(hashlist[i]) as rbl:
-                rbl.sync_write(blocklist[i])  # XXX: verify?
+            suffix, data = self._compress(blocklist[i])
+            with self._write_rear_block(hashlist[i], suffix) as rbl:
+                rbl.sync_write(data)  # XXX: verify?
 
         return hashlist, missing
 
@@ -180,6 +255,41 @@ class FileBlocker(object):
         h, a = self.block_stor((newblock,))
         return h[0], 1 if a else 0
 
+    def block_iter(self):
+        """Iterate over the stored blocks, yielding (hash, mtime) pairs."""
+        hexlen = self.hashlen * 2
+        suffixes = SUFFIXES.values()
+        for dirpath, dirnames, filenames in walk(self.blockpath):
+            for filename in filenames:
+                if (len(filename) != hexlen and
+                        filename[hexlen:] not in suffixes):
+                    continue
+                try:
+                    blkhash = unhexlify(filename[:hexlen])
+                    mtime = getmtime(join(dirpath, filename))
+                except (TypeError, OSError):
+                    continue
+                yield blkhash, mtime
+
+    def block_mtime(self, blkhash):
+        """Return the modification time of a block, or None if missing."""
+        name = self._rear_block_name(blkhash)
+        for suffix, method in self.variants:
+            try:
+                return getmtime(name + suffix)
+            except OSError:
+                pass
+        return None
+
+    def block_remove(self, blkhash):
+        """Remove a block from storage."""
+        name = self._rear_block_name(blkhash)
+        for suffix, method in self.variants:
+            try:
+                remove(name + suffix)
+            except OSError:
+                pass
+
     def block_hash_file(self, openfile):
         """Return the list of hashes (hashes map)
            for the blocks in a buffered file.
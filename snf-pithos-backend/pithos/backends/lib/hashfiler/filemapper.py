@@ -31,9 +31,10 @@
 # interpreted as representing official policies, either expressed
 # or implied, of GRNET S.A.
 
-from os import makedirs
-from os.path import isdir, realpath, exists, join
-from binascii import hexlify
+from os import makedirs, walk, remove, utime
+from os.path import isdir, realpath, exists, join, getmtime
+from binascii import hexlify, unhexlify
+from errno import ENOENT
 
 from context_file import ContextFile
 from os import O_RDONLY, O_WRONLY
@@ -77,7 +78,20 @@ class FileMapper(object):
         filename = hexlify(maphash)
         dir = join(self.mappath, filename[0:2], filename[2:4], filename[4:6])
         name = join(dir, filename)
-        return exists(name)
+        # Touch existing maps, so that garbage collection
+        # does not remove the maps that are being reused.
+        try:
+            utime(name, None)
+            return True
+        except OSError as e:
+            # The map may exist but not be ours to touch, e.g. on a
+            # root-squashed NFS export
+            return e.errno != ENOENT and exists(name)
+
+    def _rear_map_name(self, maphash):
+        filename = hexlify(maphash)
+        dir = join(self.mappath, filename[0:2], filename[2:4], filename[4:6])
+        return join(dir, filename)
 
     def map_retr(self, maphash, blkoff=0, nr=100000000000000):
         """Return as a list, part of the hashes map of an object
@@ -99,3 +113,31 @@ class FileMapper(object):
             return
         with self._write_rear_map(maphash) as rmap:
             rmap.sync_write_chunks(namelen, blkoff, hashes, None)
+
+    def map_iter(self):
+        """Iterate over the stored maps, yielding (hash, mtime) pairs."""
+        hexlen = self.namelen * 2
+        for dirpath, dirnames, filenames in walk(self.mappath):
+            for filename in filenames:
+                if len(filename) != hexlen:
+                    continue
+                try:
+                    maphash = unhexlify(filename)
+                    mtime = getmtime(join(dirpath, filename))
+                except (TypeError, OSError):
+                    continue
+                yield maphash, mtime
+
+    def map_mtime(self, maphash):
+        """Return the modification time of a map, or None if missing."""
+        try:
+            return getmtime(self._rear_map_name(maphash))
+        except OSError:
+            return None
+
+    def map_remove(self, maphash):
+        """Remove a map from storage."""
+        try:
+            remove(self._rear_map_name(maphash))
+        except OSError:
+            pass
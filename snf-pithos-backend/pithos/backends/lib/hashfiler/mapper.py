@@ -63,3 +63,23 @@ class Mapper(object):
         if self.rmap:
             self.rmap.map_stor(maphash, hashes, blkoff)
         self.fmap.map_stor(maphash, hashes, blkoff)
+
+    def map_sweep(self, referenced, deadline, dry_run=False):
+        """Remove the maps that are not in referenced and have not been
+           modified since deadline. Return the number of removed maps.
+
+           RADOS copies are removed together with their file copy; maps
+           stored only in RADOS are never removed.
+        """
+        fmap = self.fmap
+        rmap = self.rmap
+        removed = 0
+        for h, mtime in fmap.map_iter():
+            if mtime >= deadline or h in referenced:
+                continue
+            removed += 1
+            if not dry_run:
+                fmap.map_remove(h)
+                if rmap:
+                    rmap.map_remove(h)
+        return removed
@@ -35,16 +35,31 @@ from hashlib import new as newhasher
 from binascii import hexlify
 from rados import *
 
-from context_object import RadosObject, file_sync_read_chunks
+from context_object import file_sync_read_chunks, aio_map, aio_check
 
 CEPH_CONF_FILE = "/etc/ceph/ceph.conf"
 
 
+def unique(hashes):
+    """Return the distinct hashes, in the order they first appear."""
+    seen = set()
+    result = []
+    for h in hashes:
+        if h not in seen:
+            seen.add(h)
+            result.append(h)
+    return result
+
+
 class RadosBlocker(object):
     """Blocker.
        Required constructor parameters: blocksize, blockpath, hashtype.
+
+       Blocks are checked, read and written with asynchronous RADOS
+       operations, up to aio_window of them in flight at a time.
     """
 
+    aio_window = 32
     blocksize = None
     blockpool = None
     hashtype = None
@@ -83,17 +98,16 @@ class RadosBlocker(object):
     def _pad(self, block):
         return block + ('\x00' * (self.blocksize - len(block)))
 
-    def _get_rear_block(self, blkhash):
-        name = hexlify(blkhash)
-        return RadosObject(name, self.ioctx)
-
-    def _check_rear_block(self, blkhash):
-        filename = hexlify(blkhash)
-        try:
-            self.ioctx.stat(filename)
-            return True
-        except ObjectNotFound:
-            return False
+    def _check_rear_blocks(self, hashes):
+        """Return whether each of the given blocks exists."""
+        ioctx = self.ioctx
+        if hasattr(ioctx, 'aio_stat'):
+            start = lambda h, cb: ioctx.aio_stat(hexlify(h), cb)
+        else:
+            # Older librados bindings can only probe with a read
+            start = lambda h, cb: ioctx.aio_read(hexlify(h), 1, 0, cb)
+        results = aio_map(start, hashes, self.aio_window)
+        return [aio_check(ret) for ret, args in results]
 
     def block_hash(self, data):
         """Hash a block of data"""
@@ -105,37 +119,45 @@ class RadosBlocker(object):
         """Check hashes for existence and
            return those missing from block storage.
         """
-        notfound = []
-        append = notfound.append
-
-        for h in hashes:
-            if h not in notfound and not self._check_rear_block(h):
-                append(h)
-
-        return notfound
+        hashes = unique(hashes)
+        exists = self._check_rear_blocks(hashes)
+        return [h for h, e in zip(hashes, exists) if not e]
 
     def block_retr(self, hashes):
         """Retrieve blocks from storage by their hashes."""
         blocksize = self.blocksize
         blocks = []
         append = blocks.append
-        block = None
+        ioctx = self.ioctx
 
+        to_read = unique(h for h in hashes if h != self.emptyhash)
+        start = lambda h, cb: ioctx.aio_read(hexlify(h), blocksize, 0, cb)
+        results = dict(zip(to_read, aio_map(start, to_read, self.aio_window)))
         for h in hashes:
             if h == self.emptyhash:
                 append(self._pad(''))
                 continue
-            with self._get_rear_block(h) as rbl:
-                if not rbl:
-                    break
-                for block in rbl.sync_read_chunks(blocksize, 1, 0):
-                    break  # there should be just one block there
-            if not block:
+            ret, (block,) = results[h]
+            if not aio_check(ret) or not block:
                 break
             append(self._pad(block))
 
         return blocks
 
+    def block_retr_range(self, blkhash, offset, length):
+        """Retrieve up to length bytes of a block, starting at offset,
+           without reading the rest of the block.
+           Return None if the block does not exist.
+        """
+        length = max(0, min(length, self.blocksize - offset))
+        if blkhash == self.emptyhash:
+            return '\x00' * length
+        try:
+            data = self.ioctx.read(hexlify(blkhash), length, offset)
+        except ObjectNotFound:
+            return None
+        return data + '\x00' * (length - len(data))
+
     def block_stor(self, blocklist):
         """Store a bunch of blocks and return (hashes, missing).
            Hashes is a list of the hashes of the blocks,
@@ -144,11 +166,16 @@ class RadosBlocker(object):
         """
         block_hash = self.block_hash
         hashlist = [block_hash(b) for b in blocklist]
-        missing = [i for i, h in enumerate(hashlist) if not
-                   self._check_rear_block(h)]
-        for i in missing:
-            with self._get_rear_block(hashlist[i]) as rbl:
-                rbl.sync_write(blocklist[i])  # XXX: verify?
+        to_check = unique(hashlist)
+        exists = dict(zip(to_check, self._check_rear_blocks(to_check)))
+        missing = [i for i, h in enumerate(hashlist) if not exists[h]]
+        # Write each missing block once
+        blocks = dict(zip(hashlist, blocklist))
+        to_write = unique(hashlist[i] for i in missing)
+        ioctx = self.ioctx
+        start = lambda h, cb: ioctx.aio_write_full(hexlify(h), blocks[h], cb)
+        for ret, args in aio_map(start, to_write, self.aio_window):
+            aio_check(ret)  # XXX: verify?
 
         return hashlist, missing
 
@@ -190,6 +217,13 @@ class RadosBlocker(object):
 
         return hashes
 
+    def block_remove(self, blkhash):
+        """Remove a block from storage."""
+        try:
+            self.ioctx.remove_object(hexlify(blkhash))
+        except ObjectNotFound:
+            pass
+
     def block_stor_file(self, radosobject):
         """Read blocks from buffered file object and store them. Return:
            (bytes read, list of hashes, list of hashes that were missing)
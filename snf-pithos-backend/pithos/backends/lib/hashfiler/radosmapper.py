@@ -83,17 +83,36 @@ class RadosMapper(object):
            By default, return the whole hashes map.
         """
         namelen = self.namelen
-        hashes = ()
+        name = hexlify(maphash)
+        try:
+            size, mtime = self.ioctx.stat(name)
+        except ObjectNotFound:
+            return ()
 
-        with self._get_rear_map(maphash, 0) as rmap:
-            if rmap:
-                hashes = list(rmap.sync_read_chunks(namelen, nr, blkoff))
-        return hashes
+        # Read the whole range with one operation, instead of one per hash
+        offset = blkoff * namelen
+        length = min(size - offset, nr * namelen)
+        if length <= 0:
+            return []
+        with self._get_rear_map(maphash) as rmap:
+            rmap.seek(offset)
+            data = rmap.sync_read(length)
+        return [data[i:i + namelen] for i in xrange(0, len(data), namelen)]
 
     def map_stor(self, maphash, hashes=(), blkoff=0):
         """Store hashes in the given hashes map."""
         namelen = self.namelen
         if self._check_rear_map(maphash):
             return
+        if blkoff == 0:
+            self.ioctx.write_full(hexlify(maphash), ''.join(hashes))
+            return
         with self._get_rear_map(maphash) as rmap:
             rmap.sync_write_chunks(namelen, blkoff, hashes, None)
+
+    def map_remove(self, maphash):
+        """Remove a map from storage."""
+        try:
+            self.ioctx.remove_object(hexlify(maphash))
+        except ObjectNotFound:
+            pass
@@ -0,0 +1,71 @@
+# Copyright 2013 GRNET S.A. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+#   1. Redistributions of source code must retain the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer.
+#
+#   2. Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials
+#      provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY GRNET S.A. ``AS IS'' AND ANY EXPRESS
+# OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL GRNET S.A OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+# USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED
+# AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and
+# documentation are those of the authors and should not be
+# interpreted as representing official policies, either expressed
+# or implied, of GRNET S.A.
+
+from hashlib import md5
+from math import log
+from struct import unpack
+
+
+class ReferenceSet(object):
+    """A compact set of hashes, used to mark the maps and blocks in use.
+
+    It is a Bloom filter sized for 'capacity' hashes, which takes about
+    1.8 bytes per hash for the default error rate of 0.1%, independently of
+    the hash length. Lookups may give false positives, so that some garbage
+    is kept until a later collection, but never false negatives.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        nbits = int(-capacity * log(error_rate) / log(2) ** 2) + 1
+        self.nbits = nbits
+        self.nprobes = max(1, int(round(float(nbits) / capacity * log(2))))
+        self.bits = bytearray((nbits + 7) // 8)
+
+    def _probes(self, h):
+        a, b = unpack('<QQ', md5(h).digest())
+        nbits = self.nbits
+        for i in xrange(self.nprobes):
+            yield (a + i * b) % nbits
+
+    def add(self, h):
+        bits = self.bits
+        for i in self._probes(h):
+            bits[i >> 3] |= 1 << (i & 7)
+
+    def __contains__(self, h):
+        bits = self.bits
+        for i in self._probes(h):
+            if not bits[i >> 3] & (1 << (i & 7)):
+                return False
+        return True
@@ -32,15 +32,19 @@
 # or implied, of GRNET S.A.
 
 import os
+from errno import ENOENT
+from time import time
 
 from blocker import Blocker
 from mapper import Mapper
+from refset import ReferenceSet
 
 
 class Store(object):
     """Store.
        Required constructor parameters: path, block_size, hash_algorithm,
        umask, blockpool, mappool.
+       Optional compression.
     """
 
     def __init__(self, **params):
@@ -54,16 +58,20 @@ class Store(object):
         if not os.path.isdir(path):
             raise RuntimeError("Cannot open path '%s'" % (path,))
 
-        p = {'blocksize': params['block_size'],
-             'blockpath': os.path.join(path + '/blocks'),
-             'hashtype': params['hash_algorithm'],
-             'blockpool': params['blockpool']}
-        self.blocker = Blocker(**p)
+        self.blocker = self._blocker(path, params)
         p = {'mappath': os.path.join(path + '/maps'),
              'namelen': self.blocker.hashlen,
              'mappool': params['mappool']}
         self.mapper = Mapper(**p)
 
+    def _blocker(self, path, params):
+        p = {'blocksize': params['block_size'],
+             'blockpath': os.path.join(path + '/blocks'),
+             'hashtype': params['hash_algorithm'],
+             'blockpool': params['blockpool'],
+             'compression': params.get('compression')}
+        return Blocker(**p)
+
     def map_get(self, name):
         return self.mapper.map_retr(name)
 
@@ -79,6 +87,9 @@ class Store(object):
             return None
         return blocks[0]
 
+    def block_get_range(self, hash, offset, length):
+        return self.blocker.block_retr_range(hash, offset, length)
+
     def block_put(self, data):
         hashes, absent = self.blocker.block_stor((data,))
         return hashes[0]
@@ -89,3 +100,38 @@ class Store(object):
 
     def block_search(self, map):
         return self.blocker.block_ping(map)
+
+    def collect_garbage(self, maps, nr_maps, nr_blocks, grace_period,
+                        dry_run=False, chunk_size=10000):
+        """Remove the maps and blocks that are no longer in use.
+
+        Mark the maps yielded by 'maps' and the blocks they contain, in a
+        ReferenceSet sized for 'nr_maps' + 'nr_blocks' hashes, and then
+        sweep every other map and block not modified for 'grace_period'
+        seconds. Maps and blocks are touched when reused, so the grace
+        period protects uploads running concurrently with the collection.
+        Return (number of removed maps, number of removed blocks).
+        """
+        deadline = time() - grace_period
+        referenced = ReferenceSet(nr_maps + nr_blocks)
+        map_retr = self.mapper.map_retr
+        for maphash in maps:
+            referenced.add(maphash)
+            blkoff = 0
+            while True:
+                try:
+                    hashes = map_retr(maphash, blkoff, chunk_size)
+                except IOError as e:
+                    if e.errno != ENOENT:
+                        raise
+                    break
+                for h in hashes:
+                    referenced.add(h)
+                if len(hashes) < chunk_size:
+                    break
+                blkoff += chunk_size
+
+        removed_maps = self.mapper.map_sweep(referenced, deadline, dry_run)
+        removed_blocks = self.blocker.block_sweep(referenced, deadline,
+                                                  dry_run)
+        return removed_maps, removed_blocks
@@ -0,0 +1,374 @@
+# Copyright 2013 GRNET S.A. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+#   1. Redistributions of source code must retain the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer.
+#
+#   2. Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials
+#      provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY GRNET S.A. ``AS IS'' AND ANY EXPRESS
+# OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL GRNET S.A OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+# USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED
+# AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and
+# documentation are those of the authors and should not be
+# interpreted as representing official policies, either expressed
+# or implied, of GRNET S.A.
+
+import sqlite3
+
+from errno import EPERM
+from os import (getpid, kill, open as os_open, write, fsync, close, remove,
+                O_RDONLY, O_WRONLY, O_CREAT, O_EXCL, O_APPEND)
+from os.path import join, getsize
+from mmap import mmap, ACCESS_READ
+from collections import OrderedDict
+from socket import gethostname
+from threading import RLock
+from time import time
+
+from pithos.backends.lib.hashfiler.blocker import Blocker as HashBlocker
+from pithos.backends.lib.hashfiler.fileblocker import FileBlocker
+
+DEFAULT_SEGMENT_SIZE = 1 << 30
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS segments (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           host TEXT,
+           pid INTEGER)""",
+    """CREATE TABLE IF NOT EXISTS blocks (
+           hash BLOB PRIMARY KEY,
+           segment INTEGER NOT NULL,
+           offset INTEGER NOT NULL,
+           length INTEGER NOT NULL,
+           mtime REAL NOT NULL)""",
+    """CREATE INDEX IF NOT EXISTS blocks_segment ON blocks (segment)""",
+)
+
+
+def _process_exists(pid):
+    try:
+        kill(pid, 0)
+    except OSError as e:
+        return e.errno == EPERM
+    return True
+
+
+class PackBlocker(FileBlocker):
+    """Blocker that appends blocks to large segment files.
+       Required constructor parameters: blocksize, blockpath, hashtype.
+       Optional segment_size.
+
+       An SQLite index in blockpath maps the hash of each block to the
+       segment, offset and length of its data, and segments are read
+       through memory maps. Each blocker appends to a segment of its own,
+       so writers need no locking. Space taken by removed or duplicate
+       blocks is reclaimed by compact().
+
+       The blockpath may be shared between hosts, e.g. over NFS, if it
+       supports POSIX file locks. The index uses a rollback journal, since
+       SQLite's WAL mode needs shared memory that does not work across
+       hosts.
+    """
+
+    # Existing blocks are touched when reused, for garbage collection,
+    # at most once in this many seconds.
+    touch_interval = 600
+    max_maps = 64
+    batch_size = 1000
+
+    def __init__(self, **params):
+        super(PackBlocker, self).__init__(**params)
+        self.segment_size = params.get('segment_size') or DEFAULT_SEGMENT_SIZE
+        self.lock = RLock()
+        self.host = gethostname()
+        self.pid = None
+        self.conn = None
+        self.segment = None
+        self.maps = OrderedDict()
+        self._connect()
+
+    def _connect(self):
+        pid = getpid()
+        if self.pid == pid:
+            return self.conn
+
+        # Do not share the connection or the segment with a parent process
+        self.pid = pid
+        self.segment = None
+        self.maps = OrderedDict()
+        conn = sqlite3.connect(join(self.blockpath, 'index.db'), timeout=60,
+                               check_same_thread=False)
+        # Also switch indexes created in WAL mode back to a rollback journal
+        conn.execute("PRAGMA journal_mode=DELETE")
+        with conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+        self.conn = conn
+        return conn
+
+    def _segment_path(self, segment):
+        return join(self.blockpath, '%08d.pack' % segment)
+
+    def _sync_segment(self):
+        """Flush the data appended to the current segment to disk."""
+        segment = self.segment
+        if segment is not None and segment[3]:
+            fsync(segment[1])
+            segment[3] = False
+
+    def _close_segment(self):
+        if self.segment is not None:
+            self._sync_segment()
+            close(self.segment[1])
+            self.segment = None
+
+    def _append(self, data):
+        """Append data to the current segment and return its location."""
+        segment = self.segment
+        if segment is None or segment[2] >= self.segment_size:
+            self._close_segment()
+            with self.conn:
+                cur = self.conn.execute(
+                    "INSERT INTO segments (host, pid) VALUES (?, ?)",
+                    (self.host, self.pid))
+            sid = cur.lastrowid
+            fd = os_open(self._segment_path(sid),
+                         O_WRONLY | O_CREAT | O_EXCL | O_APPEND, 0666)
+            # Segment ID, file descriptor, size and whether it needs fsync
+            segment = self.segment = [sid, fd, 0, False]
+
+        sid, fd, offset = segment[:3]
+        written = 0
+        while written < len(data):
+            written += write(fd, buffer(data, written))
+        segment[2] += written
+        segment[3] = True
+        return sid, offset
+
+    def _unmap(self, segment):
+        m = self.maps.pop(segment, None)
+        if m is not None:
+            m.close()
+
+    def _read(self, segment, offset, length):
+        if not length:
+            return ''
+        m = self.maps.pop(segment, None)
+        if m is None or len(m) < offset + length:
+            # Segments only grow, so remap them when needed
+            if m is not None:
+                m.close()
+            fd = os_open(self._segment_path(segment), O_RDONLY)
+            try:
+                m = mmap(fd, 0, access=ACCESS_READ)
+            finally:
+                close(fd)
+        self.maps[segment] = m
+        if len(self.maps) > self.max_maps:
+            self.maps.popitem(last=False)[1].close()
+        return m[offset:offset + length]
+
+    def _check_rear_block(self, blkhash):
+        row = self.conn.execute("SELECT mtime FROM blocks WHERE hash = ?",
+                                (buffer(blkhash),)).fetchone()
+        if row is None:
+            return False
+        now = time()
+        if row[0] < now - self.touch_interval:
+            with self.conn:
+                self.conn.execute("UPDATE blocks SET mtime = ? WHERE hash = ?",
+                                  (now, buffer(blkhash)))
+        return True
+
+    def block_ping(self, hashes):
+        """Check hashes for existence and
+           return those missing from block storage.
+        """
+        with self.lock:
+            self._connect()
+            return super(PackBlocker, self).block_ping(hashes)
+
+    def block_retr(self, hashes):
+        """Retrieve blocks from storage by their hashes."""
+        blocks = []
+        append = blocks.append
+
+        with self.lock:
+            conn = self._connect()
+            for h in hashes:
+                if h == self.emptyhash:
+                    append(self._pad(''))
+                    continue
+                row = conn.execute(
+                    "SELECT segment, offset, length FROM blocks"
+                    " WHERE hash = ?", (buffer(h),)).fetchone()
+                if row is None:
+                    break
+                append(self._pad(self._read(*row)))
+
+        return blocks
+
+    def block_retr_range(self, blkhash, offset, length):
+        """Retrieve up to length bytes of a block, starting at offset,
+           without reading the rest of the block.
+           Return None if the block does not exist.
+        """
+        length = max(0, min(length, self.blocksize - offset))
+        if blkhash == self.emptyhash:
+            return '\x00' * length
+        with self.lock:
+            row = self._connect().execute(
+                "SELECT segment, offset, length FROM blocks"
+                " WHERE hash = ?", (buffer(blkhash),)).fetchone()
+            if row is None:
+                return None
+            segment, start, stored = row
+            size = max(0, min(length, stored - offset))
+            data = self._read(segment, start + offset, size)
+        return data + '\x00' * (length - len(data))
+
+    def block_stor(self, blocklist):
+        """Store a bunch of blocks and return (hashes, missing).
+           Hashes is a list of the hashes of the blocks,
+           missing is a list of indices in that list indicating
+           which blocks were missing from the store.
+        """
+        block_hash = self.block_hash
+        hashlist = [block_hash(b) for b in blocklist]
+        with self.lock:
+            conn = self._connect()
+            missing = [i for i, h in enumerate(hashlist) if not
+                       self._check_rear_block(h)]
+            now = time()
+            rows = {}
+            for i in missing:
+                h = hashlist[i]
+                if h in rows:
+                    continue
+                # Padding is not part of the hash, so do not store it
+                data = blocklist[i].rstrip('\x00')
+                segment, offset = self._append(data)
+                rows[h] = (buffer(h), segment, offset, len(data), now)
+            # Index only blocks whose data is on disk
+            self._sync_segment()
+            with conn:
+                # Concurrent writers may store the same block; only one copy
+                # is indexed and the others are reclaimed by compact().
+                conn.executemany("INSERT OR IGNORE INTO blocks"
+                                 " VALUES (?, ?, ?, ?, ?)", rows.values())
+
+        return hashlist, missing
+
+    def block_iter(self):
+        """Iterate over the stored blocks, yielding (hash, mtime) pairs."""
+        last = buffer('')
+        while True:
+            with self.lock:
+                rows = self._connect().execute(
+                    "SELECT hash, mtime FROM blocks WHERE hash > ?"
+                    " ORDER BY hash LIMIT ?", (last, self.batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for h, mtime in rows:
+                yield str(h), mtime
+            last = rows[-1][0]
+
+    def block_mtime(self, blkhash):
+        """Return the modification time of a block, or None if missing."""
+        with self.lock:
+            row = self._connect().execute(
+                "SELECT mtime FROM blocks WHERE hash = ?",
+                (buffer(blkhash),)).fetchone()
+        return row[0] if row else None
+
+    def block_remove(self, blkhash):
+        """Remove a block from the index. Its data is reclaimed by compact().
+        """
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM blocks WHERE hash = ?",
+                             (buffer(blkhash),))
+
+    def compact(self, min_garbage=0.5):
+        """Copy the live blocks of the segments where at least min_garbage
+           of the space is unused to new segments, and delete them.
+           Segments written by processes that are still running, this one
+           included, are skipped, since their last blocks may not be indexed
+           yet. So are segments written by other hosts sharing the
+           blockpath, whose processes cannot be checked from here.
+           Return (number of deleted segments, bytes reclaimed).
+        """
+        deleted = 0
+        reclaimed = 0
+        with self.lock:
+            conn = self._connect()
+            live = dict(conn.execute(
+                "SELECT segment, SUM(length) FROM blocks GROUP BY segment"))
+            segments = [sid for sid, host, pid in conn.execute(
+                        "SELECT id, host, pid FROM segments ORDER BY id")
+                        if host == self.host and not _process_exists(pid)]
+            # Copy the blocks to new segments only
+            self._close_segment()
+            for sid in segments:
+                path = self._segment_path(sid)
+                try:
+                    size = getsize(path)
+                except OSError:
+                    size = 0
+                garbage = size - live.get(sid, 0)
+                if size and garbage < min_garbage * size:
+                    continue
+
+                updates = []
+                rows = conn.execute(
+                    "SELECT hash, offset, length FROM blocks"
+                    " WHERE segment = ?", (sid,)).fetchall()
+                for h, offset, length in rows:
+                    data = self._read(sid, offset, length)
+                    segment, new_offset = self._append(data)
+                    updates.append((segment, new_offset, h))
+                self._sync_segment()
+                with conn:
+                    conn.executemany("UPDATE blocks SET segment = ?,"
+                                     " offset = ? WHERE hash = ?", updates)
+                    conn.execute("DELETE FROM segments WHERE id = ?", (sid,))
+                self._unmap(sid)
+                try:
+                    remove(path)
+                except OSError:
+                    pass
+                deleted += 1
+                reclaimed += garbage
+        return deleted, reclaimed
+
+
+class Blocker(HashBlocker):
+    """Blocker keeping blocks in segment files.
+       Required constructor parameters: blocksize, blockpath, hashtype.
+       Optional blockpool, segment_size.
+    """
+
+    file_blocker = PackBlocker
+
+    def compact(self, min_garbage=0.5):
+        return self.fblocker.compact(min_garbage)
@@ -0,0 +1,59 @@
+# Copyright 2013 GRNET S.A. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+#   1. Redistributions of source code must retain the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer.
+#
+#   2. Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials
+#      provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY GRNET S.A. ``AS IS'' AND ANY EXPRESS
+# OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL GRNET S.A OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+# USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED
+# AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and
+# documentation are those of the authors and should not be
+# interpreted as representing official policies, either expressed
+# or implied, of GRNET S.A.
+
+import os
+
+from pithos.backends.lib.hashfiler.store import Store as HashStore
+
+from packblocker import Blocker
+
+
+class Store(HashStore):
+    """Store keeping blocks in large segment files instead of a file per
+       block. Maps are stored as in hashfiler.
+       Required constructor parameters: path, block_size, hash_algorithm,
+       umask, blockpool, mappool.
+       Optional segment_size.
+    """
+
+    def _blocker(self, path, params):
+        p = {'blocksize': params['block_size'],
+             'blockpath': os.path.join(path + '/packs'),
+             'hashtype': params['hash_algorithm'],
+             'blockpool': params['blockpool'],
+             'segment_size': params.get('segment_size')}
+        return Blocker(**p)
+
+    def compact(self, min_garbage=0.5):
+        """Reclaim the space of removed blocks. See PackBlocker.compact()."""
+        return self.blocker.compact(min_garbage)
@@ -37,9 +37,10 @@ from node import (Node, ROOTNODE, SERIAL, NODE, HASH, SIZE, TYPE, MTIME, MUSER,
 from permissions import Permissions, READ, WRITE
 from config import Config
 from quotaholder_serials import QuotaholderSerial
+from inline_data import InlineData
 
 __all__ = ["DBWrapper",
            "Node", "ROOTNODE", "NODE", "SERIAL", "HASH", "SIZE", "TYPE",
            "MTIME", "MUSER", "UUID", "CHECKSUM", "CLUSTER", "MATCH_PREFIX",
            "MATCH_EXACT", "Permissions", "READ", "WRITE", "Config",
-           "QuotaholderSerial"]
+           "QuotaholderSerial", "InlineData"]
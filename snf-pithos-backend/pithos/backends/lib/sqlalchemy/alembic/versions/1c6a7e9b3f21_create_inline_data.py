@@ -0,0 +1,32 @@
+"""create inline_data
+
+Revision ID: 1c6a7e9b3f21
+Revises: 4451e165da19
+Create Date: 2014-03-10 12:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1c6a7e9b3f21'
+down_revision = '4451e165da19'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    connection = op.get_bind()
+    # The backend creates the table on first use.
+    if connection.dialect.has_table(connection, 'inline_data'):
+        return
+    op.create_table('inline_data',
+                    sa.Column('hash', sa.String(256), nullable=False),
+                    sa.Column('block', sa.String(256), nullable=False),
+                    sa.Column('data', sa.LargeBinary, nullable=False),
+                    mysql_engine='InnoDB')
+    op.create_index('idx_inline_data_hash', 'inline_data', ['hash'])
+
+
+def downgrade():
+    op.drop_index('idx_inline_data_hash', tablename='inline_data')
+    op.drop_table('inline_data')
@@ -0,0 +1,106 @@
+# Copyright 2013 GRNET S.A. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+#   1. Redistributions of source code must retain the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer.
+#
+#   2. Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials
+#      provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY GRNET S.A. ``AS IS'' AND ANY EXPRESS
+# OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL GRNET S.A OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+# USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED
+# AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and
+# documentation are those of the authors and should not be
+# interpreted as representing official policies, either expressed
+# or implied, of GRNET S.A.
+
+from sqlalchemy import Table, Column, MetaData, Index
+from sqlalchemy.types import String, LargeBinary
+from sqlalchemy.sql import select, exists, table, column
+from sqlalchemy.exc import NoSuchTableError
+
+from dbworker import DBWorker
+
+
+def create_tables(engine):
+    metadata = MetaData()
+    columns = []
+    columns.append(Column('hash', String(256), nullable=False))
+    columns.append(Column('block', String(256), nullable=False))
+    columns.append(Column('data', LargeBinary, nullable=False))
+    inline_data = Table('inline_data', metadata, *columns,
+                        mysql_engine='InnoDB')
+    Index('idx_inline_data_hash', inline_data.c.hash)
+
+    metadata.create_all(engine)
+    return metadata.sorted_tables
+
+
+class InlineData(DBWorker):
+    """InlineData keeps the data of small objects, by the hash of their map,
+       so that they can be read without going to the block storage.
+    """
+
+    def __init__(self, **params):
+        DBWorker.__init__(self, **params)
+        try:
+            metadata = MetaData(self.engine)
+            self.inline_data = Table('inline_data', metadata, autoload=True)
+        except NoSuchTableError:
+            tables = create_tables(self.engine)
+            map(lambda t: self.__setattr__(t.name, t), tables)
+
+    def get(self, hash):
+        """Return the (block hash, data) of a map hash, or None."""
+
+        s = select([self.inline_data.c.block, self.inline_data.c.data])
+        s = s.where(self.inline_data.c.hash == hash)
+        s = s.limit(1)
+        r = self.conn.execute(s)
+        row = r.fetchone()
+        r.close()
+        if row is None:
+            return None
+        return str(row[0]), str(row[1])
+
+    def put(self, hash, block, data):
+        """Store the data of the single block of a map.
+
+        The hash is not unique, so that concurrent puts do not abort the
+        transaction; the duplicates are harmless.
+        """
+
+        s = self.inline_data.insert()
+        r = self.conn.execute(s, hash=hash, block=block, data=data)
+        r.close()
+
+    def delete_unreferenced(self):
+        """Delete the data of maps that no version refers to and return the
+        number of deleted entries.
+        """
+
+        versions = table('versions', column('hash'))
+        s = self.inline_data.delete().where(
+            ~exists([versions.c.hash],
+                    versions.c.hash == self.inline_data.c.hash))
+        r = self.conn.execute(s)
+        count = r.rowcount
+        r.close()
+        return count
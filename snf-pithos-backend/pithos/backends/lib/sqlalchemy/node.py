@@ -34,7 +34,6 @@
 from time import time
 from operator import itemgetter
 from itertools import groupby
-from collections import defaultdict
 
 from sqlalchemy import (Table, Integer, BigInteger, DECIMAL, Boolean,
                         Column, String, MetaData, ForeignKey)
@@ -93,6 +92,17 @@ def strprevling(prefix):
         s += unichr(c - 1) + unichr(0xffff)
     return s
 
+
+def _fetch_rows(result, batch_size):
+    """Iterate over the rows of a result, fetching batch_size rows at a time.
+    """
+    while True:
+        rows = result.fetchmany(batch_size)
+        if not rows:
+            return
+        for row in rows:
+            yield row
+
 _propnames = {
     'serial': 0,
     'node': 1,
@@ -511,6 +521,17 @@ class Node(DBWorker):
         cluster -- list current, history or deleted usage (default 0: normal)
         """
 
+        return dict(self.node_account_usage_iter(account, project, cluster))
+
+    def node_account_usage_iter(self, account=None, project=None, cluster=0,
+                                batch_size=1000):
+        """Iterate over the project usage of accounts, ordered by account.
+
+        Yield (account, {project: {resource: usage}}) pairs. Rows are streamed
+        from the DB in batches of batch_size, so that only the usage of a
+        single account is kept in memory.
+        """
+
         n1 = self.nodes.alias('n1')
         n2 = self.nodes.alias('n2')
         n3 = self.nodes.alias('n3')
@@ -530,13 +551,16 @@ class Node(DBWorker):
             s = s.where(n3.c.path == account)
         if project:
             s = s.where(self.policy.c.value == project)
-        r = self.conn.execute(s)
-        rows = r.fetchall()
-        r.close()
-        d = defaultdict(dict)
-        for account, project, usage in rows:
-            d[account][project][DEFAULT_DISKSPACE_RESOURCE] = usage
-        return d
+        s = s.order_by(n3.c.path)
+        r = self.conn.execution_options(stream_results=True).execute(s)
+        try:
+            rows = _fetch_rows(r, batch_size)
+            for account, group in groupby(rows, itemgetter(0)):
+                yield account, dict(
+                    (project, {DEFAULT_DISKSPACE_RESOURCE: usage})
+                    for _, project, usage in group)
+        finally:
+            r.close()
 
     def node_project_usage(self, project=None, cluster=0):
         """Return a dict of dicts with the project usage for a specific account.
@@ -546,6 +570,16 @@ class Node(DBWorker):
         cluster -- list current, history or deleted usage (default 0: normal)
         """
 
+        return dict(self.node_project_usage_iter(project, cluster))
+
+    def node_project_usage_iter(self, project=None, cluster=0,
+                                batch_size=1000):
+        """Iterate over the usage of projects, ordered by project.
+
+        Yield (project, {resource: usage}) pairs, streaming the rows from the
+        DB in batches of batch_size.
+        """
+
         n1 = self.nodes.alias('n1')
         n2 = self.nodes.alias('n2')
         n3 = self.nodes.alias('n3')
@@ -563,13 +597,40 @@ class Node(DBWorker):
         s = s.group_by(self.policy.c.value)
         if project:
             s = s.where(self.policy.c.value == project)
+        s = s.order_by(self.policy.c.value)
+        r = self.conn.execution_options(stream_results=True).execute(s)
+        try:
+            for project, usage in _fetch_rows(r, batch_size):
+                yield project, {DEFAULT_DISKSPACE_RESOURCE: usage}
+        finally:
+            r.close()
+
+    def version_hashes_count(self):
+        """Return the number of versions and the sum of their sizes."""
+
+        s = select([func.count(self.versions.c.serial),
+                    func.sum(self.versions.c.size)])
         r = self.conn.execute(s)
-        rows = r.fetchall()
+        count, size = r.fetchone()
         r.close()
-        d = defaultdict(dict)
-        for project, usage in rows:
-            d[project][DEFAULT_DISKSPACE_RESOURCE] = usage
-        return d
+        return count, int(size or 0)
+
+    def version_hashes_iter(self, batch_size=1000):
+        """Iterate over the distinct hashes of all versions.
+
+        Rows are streamed from the DB in batches of batch_size, in any
+        cluster, since the maps of history and deleted versions are still
+        in use.
+        """
+
+        s = select([self.versions.c.hash]).distinct()
+        r = self.conn.execution_options(stream_results=True).execute(s)
+        try:
+            for hash, in _fetch_rows(r, batch_size):
+                if hash:
+                    yield hash
+        finally:
+            r.close()
 
     def policy_get(self, node):
         s = select([self.policy.c.key, self.policy.c.value],
@@ -1279,6 +1340,15 @@ class Node(DBWorker):
 
         return matches, prefixes
 
+    def latest_serial(self):
+        """Return the serial of the latest version of any node."""
+
+        s = select([func.max(self.versions.c.serial)])
+        r = self.conn.execute(s)
+        serial = r.fetchone()[0]
+        r.close()
+        return serial
+
     def latest_uuid(self, uuid, cluster):
         """Return the latest version of the given uuid and cluster.
 
@@ -1302,9 +1372,15 @@ class Node(DBWorker):
         r.close()
         return l
 
-    def domain_object_list(self, domain, paths, cluster=None):
+    def domain_object_list(self, domain, paths, cluster=None, filterq=None,
+                           sizeq=None):
         """Return a list of (path, property list, attribute dictionary)
            for the objects in the specific domain and cluster.
+
+           If filterq is given, return only the objects whose attributes in
+           the domain match the filter terms, as in latest_version_list.
+           If sizeq is given, return only the objects whose size is in the
+           (min, max) range.
         """
 
         v = self.versions.alias('v')
@@ -1323,6 +1399,34 @@ class Node(DBWorker):
         if paths:
             s = s.where(n.c.path.in_(paths))
 
+        if sizeq and len(sizeq) == 2:
+            if sizeq[0]:
+                s = s.where(v.c.size >= sizeq[0])
+            if sizeq[1]:
+                s = s.where(v.c.size < sizeq[1])
+
+        if filterq:
+            included, excluded, opers = parse_filters(filterq)
+            attrs = self.attributes
+
+            def attr_exists(*conditions):
+                subs = select([1])
+                subs = subs.where(attrs.c.serial == v.c.serial).correlate(v)
+                subs = subs.where(attrs.c.domain == domain)
+                for c in conditions:
+                    subs = subs.where(c)
+                return exists(subs)
+
+            if included:
+                s = s.where(attr_exists(
+                    or_(*[attrs.c.key.op('=')(x) for x in included])))
+            if excluded:
+                s = s.where(not_(attr_exists(
+                    or_(*[attrs.c.key.op('=')(x) for x in excluded]))))
+            for k, o, val in opers:
+                s = s.where(attr_exists(attrs.c.key.op('=')(k),
+                                        attrs.c.value.op(o)(val)))
+
         r = self.conn.execute(s)
         rows = r.fetchall()
         r.close()
@@ -258,7 +258,8 @@ class Permissions(XFeatures, Groups, Public, Node):
                                 self.nodes.c.node.in_(container_nodes))
             s = select([self.nodes.c.path], condition)
             r = self.conn.execute(s)
-            l += [row[0] for row in r.fetchall() if row[0] not in l]
+            seen = set(l)
+            l += [row[0] for row in r.fetchall() if row[0] not in seen]
             r.close()
         return l
 
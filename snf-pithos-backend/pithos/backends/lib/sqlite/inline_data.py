@@ -0,0 +1,76 @@
+# Copyright 2013 GRNET S.A. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+#   1. Redistributions of source code must retain the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer.
+#
+#   2. Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials
+#      provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY GRNET S.A. ``AS IS'' AND ANY EXPRESS
+# OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL GRNET S.A OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+# USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED
+# AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and
+# documentation are those of the authors and should not be
+# interpreted as representing official policies, either expressed
+# or implied, of GRNET S.A.
+
+from dbworker import DBWorker
+
+
+class InlineData(DBWorker):
+    """InlineData keeps the data of small objects, by the hash of their map,
+       so that they can be read without going to the block storage.
+    """
+
+    def __init__(self, **params):
+        DBWorker.__init__(self, **params)
+        execute = self.execute
+
+        execute(""" create table if not exists inline_data
+                          ( hash  text not null,
+                            block text not null,
+                            data  blob not null ) """)
+        execute(""" create index if not exists idx_inline_data_hash
+                    on inline_data(hash) """)
+
+    def get(self, hash):
+        """Return the (block hash, data) of a map hash, or None."""
+
+        q = "select block, data from inline_data where hash = ? limit 1"
+        self.execute(q, (hash,))
+        row = self.fetchone()
+        if row is None:
+            return None
+        return str(row[0]), str(row[1])
+
+    def put(self, hash, block, data):
+        """Store the data of the single block of a map."""
+
+        q = "insert into inline_data (hash, block, data) values (?, ?, ?)"
+        self.execute(q, (hash, block, buffer(data)))
+
+    def delete_unreferenced(self):
+        """Delete the data of maps that no version refers to and return the
+        number of deleted entries.
+        """
+
+        q = ("delete from inline_data where not exists "
+             "(select 1 from versions where versions.hash = inline_data.hash)")
+        return self.execute(q).rowcount
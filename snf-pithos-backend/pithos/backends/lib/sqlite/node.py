@@ -1097,6 +1097,12 @@ class Node(DBWorker):
 
         return matches, prefixes
 
+    def latest_serial(self):
+        """Return the serial of the latest version of any node."""
+
+        self.execute("select max(serial) from versions")
+        return self.fetchone()[0]
+
     def latest_uuid(self, uuid, cluster):
         """Return the latest version of the given uuid and cluster.
 
@@ -1120,9 +1126,15 @@ class Node(DBWorker):
         self.execute(q, args)
         return self.fetchone()
 
-    def domain_object_list(self, domain, paths, cluster=None):
+    def domain_object_list(self, domain, paths, cluster=None, filterq=None,
+                           sizeq=None):
         """Return a list of (path, property list, attribute dictionary)
            for the objects in the specific domain and cluster.
+
+           If filterq is given, return only the objects whose attributes in
+           the domain match the filter terms, as in latest_version_list.
+           If sizeq is given, return only the objects whose size is in the
+           (min, max) range.
         """
 
         q = ("select n.path, v.serial, v.node, v.hash, "
@@ -1139,6 +1151,14 @@ class Node(DBWorker):
         if cluster is not None:
             q += "and v.cluster = ?"
             args += [cluster]
+        subq, subargs = self._construct_size(sizeq)
+        if subq is not None:
+            q += subq
+            args += subargs
+        subq, subargs = self._construct_filters(domain, filterq)
+        if subq is not None:
+            q += subq
+            args += subargs
 
         self.execute(q, args)
         rows = self.fetchall()
@@ -242,7 +242,8 @@ class Permissions(XFeatures, Groups, Public, Node):
                 q += ("or node in (%s)" % select_containers)
                 args += [node]
             self.execute(q, args)
-            l += [r[0] for r in self.fetchall() if r[0] not in l]
+            seen = set(l)
+            l += [r[0] for r in self.fetchall() if r[0] not in seen]
         return l
 
     def access_list_shared(self, prefix=''):
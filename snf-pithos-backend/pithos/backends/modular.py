@@ -37,7 +37,7 @@ import logging
 import hashlib
 import binascii
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from functools import wraps, partial
 from traceback import format_exc
 
@@ -109,6 +109,10 @@ DEFAULT_PUBLIC_URL_ALPHABET = ('0123456789'
                                'abcdefghijklmnopqrstuvwxyz'
                                'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
 DEFAULT_PUBLIC_URL_SECURITY = 16
+DEFAULT_INLINE_THRESHOLD = 0
+
+# Total size of the small objects, read from the DB, to keep in memory
+INLINE_CACHE_SIZE = 4 * 1024 * 1024
 
 QUEUE_MESSAGE_KEY_PREFIX = 'pithos.%s'
 QUEUE_CLIENT_ID = 'pithos'
@@ -232,7 +236,8 @@ class ModularBackend(BaseBackend):
                  public_url_alphabet=None,
                  account_quota_policy=None,
                  container_quota_policy=None,
-                 container_versioning_policy=None):
+                 container_versioning_policy=None,
+                 inline_threshold=None):
         db_module = db_module or DEFAULT_DB_MODULE
         db_connection = db_connection or DEFAULT_DB_CONNECTION
         block_module = block_module or DEFAULT_BLOCK_MODULE
@@ -265,6 +270,11 @@ class ModularBackend(BaseBackend):
         self.hash_algorithm = hash_algorithm
         self.block_size = block_size
         self.free_versioning = free_versioning
+        # Objects up to this size are also kept in the DB
+        self.inline_threshold = min(
+            inline_threshold or DEFAULT_INLINE_THRESHOLD, block_size)
+        self.inline_blocks = OrderedDict()
+        self.inline_blocks_size = 0
 
         def load_module(m):
             __import__(m)
@@ -276,6 +286,7 @@ class ModularBackend(BaseBackend):
         self.permissions = self.db_module.Permissions(**params)
         self.config = self.db_module.Config(**params)
         self.commission_serials = self.db_module.QuotaholderSerial(**params)
+        self.inline_data = self.db_module.InlineData(**params)
         for x in ['READ', 'WRITE']:
             setattr(self, x, getattr(self.db_module, x))
         self.node = self.db_module.Node(**params)
@@ -1104,9 +1115,37 @@ class ModularBackend(BaseBackend):
         props = self._get_version(node, version)
         if props[self.HASH] is None:
             return 0, ()
+        if 0 < props[self.SIZE] <= self.inline_threshold:
+            inline = self.inline_data.get(props[self.HASH])
+            if inline is not None:
+                block, data = inline
+                self._cache_inline_block(block, data)
+                return props[self.SIZE], [block]
         hashmap = self.store.map_get(self._unhexlify_hash(props[self.HASH]))
         return props[self.SIZE], [binascii.hexlify(x) for x in hashmap]
 
+    def _cache_inline_block(self, block, data):
+        # Blocks are content addressed, so the cache is never stale.
+        cache = self.inline_blocks
+        old = cache.pop(block, None)
+        if old is not None:
+            self.inline_blocks_size -= len(old)
+        if len(data) > INLINE_CACHE_SIZE:
+            return
+        cache[block] = data
+        self.inline_blocks_size += len(data)
+        while self.inline_blocks_size > INLINE_CACHE_SIZE:
+            self.inline_blocks_size -= len(cache.popitem(last=False)[1])
+
+    def _put_inline_data(self, hash, block, size):
+        """Keep the data of a small object in the DB, by its map hash."""
+
+        if self.inline_data.get(hash) is not None:
+            return
+        data = self.store.block_get_range(self._unhexlify_hash(block), 0, size)
+        if data is not None:
+            self.inline_data.put(hash, block, data)
+
     def _update_object_hash(self, user, account, container, name, size, type,
                             hash, checksum, domain, meta, replace_meta,
                             permissions, src_node=None, src_version_id=None,
@@ -1204,6 +1243,8 @@ class ModularBackend(BaseBackend):
             user, account, container, name, size, type, hexlified, checksum,
             domain, meta, replace_meta, permissions)
         self.store.map_put(hash, map)
+        if 0 < size <= self.inline_threshold:
+            self._put_inline_data(hexlified, hashmap[0], size)
         return dest_version_id, hexlified
 
     @debug_method
@@ -1495,12 +1536,29 @@ class ModularBackend(BaseBackend):
         self._can_read_object(user, account, container, name)
         return (account, container, name)
 
-    def get_block(self, hash):
-        """Return a block's data."""
-
-        logger.debug("get_block: %s", hash)
-        block = self.store.block_get(self._unhexlify_hash(hash))
-        if not block:
+    def get_block(self, hash, offset=0, length=None):
+        """Return a block's data, or length bytes of it from offset."""
+
+        logger.debug("get_block: %s %s %s", hash, offset, length)
+        data = self.inline_blocks.get(hash)
+        if data is not None:
+            if length is None:
+                length = self.block_size - offset
+            length = max(0, min(length, self.block_size - offset))
+            data = data[offset:offset + length]
+            return data + '\x00' * (length - len(data))
+
+        if offset == 0 and length is None:
+            block = self.store.block_get(self._unhexlify_hash(hash))
+            if not block:
+                raise ItemNotExists('Block does not exist')
+            return block
+
+        if length is None:
+            length = self.block_size - offset
+        block = self.store.block_get_range(self._unhexlify_hash(hash),
+                                           offset, length)
+        if block is None:
             raise ItemNotExists('Block does not exist')
         return block
 
@@ -1519,6 +1577,27 @@ class ModularBackend(BaseBackend):
         h = self.store.block_update(self._unhexlify_hash(hash), offset, data)
         return binascii.hexlify(h)
 
+    def collect_garbage(self, grace_period, dry_run=False):
+        """Remove the maps and blocks that no version refers to.
+
+        Only maps and blocks that have not been modified for grace_period
+        seconds are removed. Return (removed maps, removed blocks).
+        """
+
+        nr_maps, size = self.node.version_hashes_count()
+        nr_blocks = nr_maps + size // self.block_size
+        maps = (self._unhexlify_hash(h)
+                for h in self.node.version_hashes_iter())
+        removed = self.store.collect_garbage(maps, nr_maps, nr_blocks,
+                                             grace_period, dry_run=dry_run)
+        if not dry_run:
+            deleted = self.inline_data.delete_unreferenced()
+            logger.info("collect_garbage: deleted %s inline objects",
+                        deleted)
+        logger.info("collect_garbage: removed %s maps and %s blocks%s",
+                    removed[0], removed[1], " (dry run)" if dry_run else "")
+        return removed
+
     # Path functions.
 
     def _generate_uuid(self):
@@ -2003,18 +2082,29 @@ class ModularBackend(BaseBackend):
 
     @debug_method
     @backend_method
-    def get_domain_objects(self, domain, user=None):
+    def get_domain_objects(self, domain, user=None, filterq=None,
+                           sizeq=None):
         allowed_paths = self.permissions.access_list_paths(
             user, include_owned=user is not None, include_containers=False)
         if not allowed_paths:
             return []
         obj_list = self.node.domain_object_list(
-            domain, allowed_paths, CLUSTER_NORMAL)
+            domain, allowed_paths, CLUSTER_NORMAL, filterq=filterq,
+            sizeq=sizeq)
+        paths = [path for path, _, _ in obj_list]
+        access = (paths and
+                  self.permissions.access_check_bulk(paths, user)) or {}
         return [(path,
                  self._build_metadata(props, user_defined_meta),
-                 self.permissions.access_get(path)) for
+                 self.permissions.access_get_for_bulk(access[path])[0]
+                 if path in access else {}) for
                 path, props, user_defined_meta in obj_list]
 
+    @debug_method
+    @backend_method
+    def get_latest_serial(self):
+        return self.node.latest_serial()
+
     # util functions
 
     def _build_metadata(self, props, user_defined=None,
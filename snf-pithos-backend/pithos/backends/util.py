@@ -53,7 +53,8 @@ class PithosBackendPool(ObjectPool):
                  public_url_alphabet=None,
                  account_quota_policy=None,
                  container_quota_policy=None,
-                 container_versioning_policy=None):
+                 container_versioning_policy=None,
+                 inline_threshold=None):
         super(PithosBackendPool, self).__init__(size=size)
         self.db_module = db_module
         self.db_connection = db_connection
@@ -75,6 +76,7 @@ class PithosBackendPool(ObjectPool):
         self.account_quota_policy = account_quota_policy
         self.container_quota_policy = container_quota_policy
         self.container_versioning_policy = container_versioning_policy
+        self.inline_threshold = inline_threshold
 
     def _pool_create(self):
         backend = connect_backend(
@@ -97,7 +99,8 @@ class PithosBackendPool(ObjectPool):
             public_url_alphabet=self.public_url_alphabet,
             account_quota_policy=self.account_quota_policy,
             container_quota_policy=self.container_quota_policy,
-            container_versioning_policy=self.container_versioning_policy)
+            container_versioning_policy=self.container_versioning_policy,
+            inline_threshold=self.inline_threshold)
 
         backend._real_close = backend.close
         backend.close = instancemethod(_pooled_backend_close, backend,
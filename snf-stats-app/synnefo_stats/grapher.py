@@ -32,6 +32,7 @@
 # or implied, of GRNET S.A.
 
 from django.http import HttpResponse
+from django.utils import simplejson as json
 
 import gd
 import os
@@ -48,6 +49,7 @@ from synnefo_stats import settings
 
 from synnefo.util.text import uenc
 from snf_django.lib.api import faults, api_method
+from snf_django.lib.api.utils import get_request_dict
 
 from logging import getLogger
 log = getLogger(__name__)
@@ -232,6 +234,76 @@ def draw_net_ts_w(fname, outfname):
     return read_file(outfname)
 
 
+def fetch_series(fname, start, end):
+    """Fetch the AVERAGE consolidated series of an RRD file.
+
+    Returns a tuple of (first timestamp, step, data source names, rows) or
+    None if the RRD file can not be read.
+
+    """
+    try:
+        (first, _, step), names, rows = rrdtool.fetch(fname, "AVERAGE",
+                                                      "-s", start, "-e", end)
+    except rrdtool.error:
+        return None
+    return first, step, list(names), rows
+
+
+def _average(column):
+    values = [v for v in column if v is not None]
+    if not values:
+        return None
+    return sum(values) / len(values)
+
+
+def downsample(first, step, rows, points):
+    """Downsample RRD rows to at most `points` rows.
+
+    Consecutive rows are grouped in equally sized buckets and every data
+    source is averaged over the bucket, ignoring unknown (None) values. The
+    aggregation is done column-wise on the transposed bucket, so each bucket
+    costs one pass per data source. Returns the new step and the list of
+    (timestamp, values) tuples.
+
+    """
+    if points <= 0 or len(rows) <= points:
+        return step, [(first + i * step, list(row))
+                      for i, row in enumerate(rows)]
+
+    factor = -(-len(rows) // points)
+    series = []
+    for i in xrange(0, len(rows), factor):
+        bucket = rows[i:i + factor]
+        series.append((first + i * step,
+                       [_average(column) for column in zip(*bucket)]))
+    return step * factor, series
+
+
+def get_cpu_data(fname, start, end, points):
+    fname = os.path.join(fname, "cpu", "virt_cpu_total.rrd")
+    return get_series_data(fname, start, end, points)
+
+
+def get_net_data(fname, start, end, points):
+    fname = os.path.join(fname, "interface", "if_octets-eth0.rrd")
+    return get_series_data(fname, start, end, points)
+
+
+def get_series_data(fname, start, end, points):
+    result = fetch_series(fname, start, end)
+    if result is None:
+        return None
+    first, step, names, rows = result
+    step, series = downsample(first, step, rows, points)
+    return {"step": step,
+            "sources": names,
+            "values": series}
+
+
+available_data_types = {'cpu': get_cpu_data,
+                        'net': get_net_data}
+
+
 def decrypt(secret):
     # Make sure key is 32 bytes long
     key = sha256(settings.STATS_SECRET_KEY).digest()
@@ -265,3 +337,87 @@ def grapher(request, graph_type, hostname):
     response.override_serialization = True
 
     return response
+
+
+def get_data_request(request):
+    """Extract the parameters of a stats data request.
+
+    Parameters can be given either as query arguments of a GET request (with
+    comma separated lists) or as a JSON body of a POST request, which is the
+    only option for large lists of instances.
+
+    """
+    if request.method == "GET":
+        params = request.GET
+        hosts = params.get("hosts", "")
+        hosts = [h for h in hosts.split(",") if h]
+        types = params.get("types", ",".join(available_data_types.keys()))
+        types = [t for t in types.split(",") if t]
+    elif request.method == "POST":
+        params = get_request_dict(request)
+        if not isinstance(params, dict):
+            raise faults.BadRequest("Malformed request")
+        hosts = params.get("hosts", [])
+        types = params.get("types", available_data_types.keys())
+        if not isinstance(hosts, list) or not isinstance(types, list):
+            raise faults.BadRequest("Malformed request")
+        if not all(isinstance(x, basestring) for x in hosts + types):
+            raise faults.BadRequest("Malformed request")
+    else:
+        raise faults.NotAllowed("Method not allowed",
+                                allowed_methods=["GET", "POST"])
+
+    if not hosts:
+        raise faults.BadRequest("No instances specified")
+    if len(hosts) > settings.DATA_MAX_HOSTS:
+        raise faults.BadRequest("Too many instances. Limit is %s" %
+                                settings.DATA_MAX_HOSTS)
+    for t in types:
+        if t not in available_data_types:
+            raise faults.BadRequest("Invalid data type '%s'" % t)
+
+    try:
+        points = int(params.get("points", settings.DATA_DEFAULT_POINTS))
+    except (ValueError, TypeError):
+        raise faults.BadRequest("Invalid 'points' value")
+    if points <= 0 or points > settings.DATA_MAX_POINTS:
+        raise faults.BadRequest("Invalid 'points' value. Limit is %s" %
+                                settings.DATA_MAX_POINTS)
+
+    start = str(params.get("start", "-1d"))
+    end = str(params.get("end", "-20s"))
+
+    return hosts, types, start, end, points
+
+
+@api_method(token_required=False, user_required=False, format_allowed=False,
+            logger=log)
+def data(request):
+    """Return CPU and network time series for one or more instances.
+
+    The result is a JSON object mapping each encrypted hostname, as given by
+    the client, to an object with one time series per requested data type.
+    Unknown instances map to null and instances whose hostname can not be
+    decrypted map to an error object, without failing the whole request.
+
+    """
+    hosts, types, start, end, points = get_data_request(request)
+
+    result = {}
+    for secret in hosts:
+        try:
+            hostname = decrypt(uenc(secret))
+        except (TypeError, ValueError):
+            log.debug("Invalid encrypted hostname '%s'", secret)
+            result[secret] = {"error": "Invalid instance"}
+            continue
+        fname = uenc(os.path.join(settings.RRD_PREFIX, hostname))
+        if not hostname or not os.path.isdir(fname):
+            result[secret] = None
+            continue
+        result[secret] = dict((t, available_data_types[t](fname, start, end,
+                                                          points))
+                              for t in types)
+
+    return HttpResponse(json.dumps({"data": result}), status=200,
+                        content_type="application/json")
@@ -19,3 +19,8 @@ FONT = getattr(settings, 'FONT',
 # Bar settings
 BAR_BORDER_COLOR = getattr(settings, 'BAR_BORDER_COLOR', (0x5c, 0xa1, 0xc0))
 BAR_BG_COLOR = getattr(settings, 'BAR_BG_COLOR', (0xea, 0xea, 0xea))
+
+# Data API settings
+DATA_MAX_HOSTS = getattr(settings, 'DATA_MAX_HOSTS', 1000)
+DATA_MAX_POINTS = getattr(settings, 'DATA_MAX_POINTS', 1000)
+DATA_DEFAULT_POINTS = getattr(settings, 'DATA_DEFAULT_POINTS', 100)
@@ -37,12 +37,13 @@ from snf_django.lib.api.utils import prefix_pattern
 from snf_django.lib.api import api_endpoint_not_found
 
 from synnefo_stats.stats_settings import BASE_PATH
-from synnefo_stats.grapher import grapher
+from synnefo_stats.grapher import grapher, data
 
 graph_types_re = '((cpu|net)-(bar|(ts(-w)?)))'
 stats_v1_patterns = patterns(
     '',
     (r'^(?P<graph_type>%s)/(?P<hostname>[^ /]+)$' % graph_types_re, grapher),
+    (r'^data/?$', data),
 )
 
 stats_patterns = patterns(